@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+"""Performance framework for fractal generation.
+
+mallib: common library for mal projects
+@author: Paweł Sobkowiak
+@contact: pawel.sobkowiak@gmail.com
+Copyright © 2011 Paweł Sobkowiak
+
+"""
+
+import copy
+import json
+from optparse import OptionParser
+import sys
+import time
+import tracemalloc
+
+from .fractal import HexFractalGenerator, SquareDiamondFractalGenerator
+from .fractal_array import (
+    ArrayHexFractalGenerator,
+    ArraySquareDiamondFractalGenerator,
+)
+
+# engine -> {shape: generator class}
+ENGINES = {
+    'dict': {
+        'square': SquareDiamondFractalGenerator,
+        'hex': HexFractalGenerator,
+    },
+    'array': {
+        'square': ArraySquareDiamondFractalGenerator,
+        'hex': ArrayHexFractalGenerator,
+    },
+}
+MODES = {
+    'wraped': {'wraped': True, 'island': False},
+    'flat': {'wraped': False, 'island': False},
+    'island': {'wraped': True, 'island': True},
+}
+TRANSFORMS = {
+    'transform': lambda generator: generator.transform(0, 100),
+    'linear_transform': lambda generator: generator.linear_transform(2, 10),
+    'power_transform': lambda generator: generator.power_transform(
+        1.5, 100, True, True
+    ),
+    'statistics': lambda generator: (
+        generator.reset_statistics(),
+        generator.statistics(),
+    ),
+}
+
+
+def measure(function, repetitions, setup=None):
+    """Returns best wall time and peak traced memory of function() runs
+
+    With setup every run gets a fresh function(setup()) - setup is
+    called outside of the measured time and memory.
+    """
+    best = None
+    for index in range(repetitions):
+        args = () if setup is None else (setup(),)
+        t0 = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    args = () if setup is None else (setup(),)
+    tracemalloc.start()
+    try:
+        result = function(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak, result
+
+
+def count_points(generator):
+    if hasattr(generator, '_values'):
+        return int(generator._values().size)
+    return sum(1 for point in generator._point_iterator())
+
+
+def run_suite(
+    engine,
+    sizes,
+    repetitions,
+    shapes=('square', 'hex'),
+    modes=tuple(MODES),
+    transforms=tuple(TRANSFORMS),
+):
+    """Measures generation and transforms - returns list of result dicts"""
+    results = []
+    for shape in shapes:
+        cls = ENGINES[engine][shape]
+        for size in sizes:
+            for mode in modes:
+
+                def generate():
+                    return cls(size, 0.8, 1, **MODES[mode])
+
+                elapsed, peak, generator = measure(generate, repetitions)
+                points = count_points(generator)
+                results.append(
+                    _result(
+                        engine,
+                        shape,
+                        size,
+                        mode,
+                        'generate',
+                        elapsed,
+                        peak,
+                        points,
+                    )
+                )
+                for name in transforms:
+                    # every run transforms its own copy of generated data
+                    elapsed, peak, _ = measure(
+                        TRANSFORMS[name],
+                        repetitions,
+                        lambda: copy.deepcopy(generator),
+                    )
+                    results.append(
+                        _result(
+                            engine,
+                            shape,
+                            size,
+                            mode,
+                            name,
+                            elapsed,
+                            peak,
+                            points,
+                        )
+                    )
+    return results
+
+
+def _result(engine, shape, size, mode, operation, elapsed, peak, points):
+    return {
+        'name': '%s/%s/%i/%s/%s' % (engine, shape, size, mode, operation),
+        'seconds': elapsed,
+        'peak_bytes': peak,
+        'points': points,
+        'points_per_second': points / elapsed if elapsed else None,
+    }
+
+
+def compare(results, baseline):
+    """Adds speedup against baseline results (matched by name without engine)"""
+    reference = {result['name'].split('/', 1)[1]: result for result in baseline}
+    for result in results:
+        previous = reference.get(result['name'].split('/', 1)[1])
+        if previous is not None:
+            result['speedup'] = (
+                previous['seconds'] / result['seconds']
+                if result['seconds']
+                else None
+            )
+            result['memory_ratio'] = (
+                result['peak_bytes'] / previous['peak_bytes']
+                if previous['peak_bytes']
+                else None
+            )
+    return results
+
+
+def generate(size, workers, seed=0):
+    t0 = time.time()
+    ArraySquareDiamondFractalGenerator(size, 0.8, seed, workers=workers)
+    return time.time() - t0
+
+
+def thread_scaling(size, repetitions, max_threads):
+    """Measures speedup of array diamond-square with more and more threads"""
+    threads = 1
+    single = None
+    while threads <= max_threads:
+        best = min(generate(size, threads) for index in range(repetitions))
+        if single is None:
+            single = best
+        points = (2**size + 1) ** 2
+        print(
+            'threads=%i : %.3fs %.0f points/s speedup=%.2f'
+            % (threads, best, points / best, single / best)
+        )
+        threads *= 2
+
+
+def main(engine, sizes, repetitions, baseline=None, output=None, threads=0):
+    if threads:
+        thread_scaling(max(sizes), repetitions, threads)
+        return
+    results = run_suite(engine, sizes, repetitions)
+    if baseline == 'dict':
+        # the current engine measured right now
+        compare(results, run_suite('dict', sizes, repetitions))
+    elif baseline:
+        with open(baseline) as fp:
+            compare(results, json.load(fp))
+    text = json.dumps(results, indent=1)
+    if output:
+        with open(output, 'w') as fp:
+            fp.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    usage = "Usage: _fractal_performance.py [options]\n" + __doc__
+    parser = OptionParser(usage=usage)
+    parser.add_option(
+        "-e",
+        "--engine",
+        type="str",
+        dest="engine",
+        help="measured engine {}".format(list(ENGINES.keys())),
+        default="dict",
+    )
+    parser.add_option(
+        "-r",
+        "--repetitions",
+        type="int",
+        dest="repetitions",
+        help="how many times repeat the measurement",
+        default=3,
+    )
+    parser.add_option(
+        "-s",
+        "--sizes",
+        type="str",
+        dest="sizes",
+        help="comma separated sizes of generated maps (width is 2**SIZE + 1)",
+        default="5,7,9",
+    )
+    parser.add_option(
+        "-b",
+        "--baseline",
+        type="str",
+        dest="baseline",
+        help="JSON results to compare with, "
+        "or 'dict' to measure the dict engine",
+        default=None,
+    )
+    parser.add_option(
+        "-o",
+        "--output",
+        type="str",
+        dest="output",
+        help="write JSON results to file instead of stdout",
+        default=None,
+    )
+    parser.add_option(
+        "-t",
+        "--threads",
+        type="int",
+        dest="threads",
+        help="measure scaling of array generation with up to THREADS threads",
+        default=0,
+    )
+    options, args = parser.parse_args()
+    if options.engine not in ENGINES:
+        print("Incorrect engine.")
+        parser.print_help()
+        sys.exit(1)
+    sizes = [int(size) for size in options.sizes.split(',')]
+    main(
+        options.engine,
+        sizes,
+        options.repetitions,
+        options.baseline,
+        options.output,
+        options.threads,
+    )
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+"""Thermal and hydraulic erosion of heightmap arrays.
+
+mallib: common library for mal projects
+@author: Paweł Sobkowiak
+@contact: pawel.sobkowiak@gmail.com
+Copyright © 2011 Paweł Sobkowiak
+
+"""
+
+import numpy
+
+from .grain import CounterGrain
+from .hydrology import DISTANCES, OFFSETS, _core, _shifted
+
+# grain stream of rain - iteration is added to it
+RAIN_STREAM = 64
+RAIN_RESOLUTION = 1 << 20
+
+
+def _spread(excess, moved, wraped):
+    """Change of cells when moved amount leaves them split by excess"""
+    total = excess.sum(axis=0)
+    share = numpy.divide(
+        moved, total, out=numpy.zeros_like(moved), where=total > 0
+    )
+    change = -numpy.where(total > 0, moved, 0)
+    for k, (dx, dy) in enumerate(OFFSETS):
+        change += _shifted(excess[k] * share, -dx, -dy, wraped, 0)
+    return change
+
+
+def _excess(values, wraped, threshold=0.0):
+    """(8, x, y) array of drops to neighbours over threshold * distance"""
+    excess = numpy.empty((len(OFFSETS),) + values.shape)
+    for k, (dx, dy) in enumerate(OFFSETS):
+        excess[k] = (
+            values
+            - _shifted(values, dx, dy, wraped, numpy.inf)
+            - threshold * DISTANCES[k]
+        )
+    return numpy.maximum(excess, 0, out=excess)
+
+
+def _thermal(heights, rows, wraped, iterations, talus, rate):
+    for iteration in range(iterations):
+        excess = _excess(heights, wraped, talus)
+        heights += _spread(excess, rate * excess.max(axis=0) / 2, wraped)
+    return heights
+
+
+def _hydraulic(
+    heights,
+    rows,
+    wraped,
+    iterations,
+    grain,
+    rain,
+    solubility,
+    evaporation,
+    capacity,
+):
+    water = numpy.zeros_like(heights)
+    sediment = numpy.zeros_like(heights)
+    xs = numpy.repeat(rows, heights.shape[1]).reshape(heights.shape)
+    ys = numpy.broadcast_to(numpy.arange(heights.shape[1]), heights.shape)
+    for iteration in range(iterations):
+        # rain - random but independent of order of processing
+        drops = grain.values(
+            xs.ravel(),
+            ys.ravel(),
+            0,
+            RAIN_RESOLUTION - 1,
+            RAIN_STREAM + iteration,
+        )
+        water += rain * 2 * drops.reshape(heights.shape) / RAIN_RESOLUTION
+        dissolved = solubility * water
+        heights -= dissolved
+        sediment += dissolved
+        # water runs down the surface carrying sediment
+        excess = _excess(heights + water, wraped)
+        moved = numpy.minimum(water, excess.max(axis=0) / 2)
+        carried = numpy.divide(
+            sediment * moved,
+            water,
+            out=numpy.zeros_like(water),
+            where=water > 0,
+        )
+        water += _spread(excess, moved, wraped)
+        sediment += _spread(excess, carried, wraped)
+        # evaporation - sediment over capacity of water is deposited
+        water *= 1 - evaporation
+        deposited = numpy.maximum(sediment - capacity * water, 0)
+        heights += deposited
+        sediment -= deposited
+    heights += sediment
+    return heights
+
+
+def _run(stage, heights, halo, wraped, chunk_rows, out):
+    """Runs stage(band, rows, wraped) over map, returns out.
+
+    Wraped maps repeat with period width - 1 (see sampling.sample), so
+    stage runs without their last row and column, which get copies of
+    the first ones.
+    """
+    heights = numpy.asarray(heights)
+    if out is None:
+        out = numpy.empty(heights.shape, dtype=numpy.float64)
+    if not wraped:
+        return _run_bands(stage, heights, halo, False, chunk_rows, out)
+    _run_bands(stage, _core(heights), halo, True, chunk_rows, _core(out))
+    out[-1, :-1] = out[0, :-1]
+    out[:, -1] = out[:, 0]
+    return out
+
+
+def _run_bands(stage, heights, halo, wraped, chunk_rows, out):
+    """Runs stage over whole map or over bands of chunk_rows rows.
+
+    Cells depend on cells at most halo rows away, so band extended
+    by halo rows on both sides gives exact values of its middle rows.
+    """
+    width = heights.shape[0]
+    if chunk_rows is None or chunk_rows + 2 * halo >= width:
+        out[...] = stage(
+            heights.astype(numpy.float64), numpy.arange(width), wraped
+        )
+        return out
+    for start in range(0, width, chunk_rows):
+        stop = min(start + chunk_rows, width)
+        if wraped:
+            rows = numpy.arange(start - halo, stop + halo) % width
+            first = halo
+        else:
+            rows = numpy.arange(max(0, start - halo), min(width, stop + halo))
+            first = start - rows[0]
+        band = stage(heights[rows].astype(numpy.float64), rows, (False, wraped))
+        out[start:stop] = band[first : first + stop - start]
+    return out
+
+
+def thermal_erosion(
+    heights,
+    talus,
+    iterations=50,
+    rate=0.5,
+    wraped=False,
+    chunk_rows=None,
+    out=None,
+):
+    """Returns float64 heights after thermal erosion.
+
+    In every iteration material slides from cells steeper than talus
+    (height difference per cell) to lower neighbours - rate of the excess
+    of the steepest slope, split by their excess. chunk_rows processes map
+    in bands of rows (extended by 2 * iterations rows), the result is the
+    same as for the whole map at once. Bands limit temporary arrays of
+    erosion, heights and out (in memory unless given, eg. memory mapped)
+    are still whole maps. Wraped maps repeat with period width - 1.
+    """
+
+    def stage(band, rows, wrap):
+        return _thermal(band, rows, wrap, iterations, talus, rate)
+
+    return _run(stage, heights, 2 * iterations, wraped, chunk_rows, out)
+
+
+def hydraulic_erosion(
+    heights,
+    iterations=50,
+    seed=0,
+    rain=1.0,
+    solubility=0.1,
+    evaporation=0.5,
+    capacity=0.1,
+    wraped=False,
+    chunk_rows=None,
+    out=None,
+):
+    """Returns float64 heights after grid based hydraulic erosion.
+
+    Every iteration random rain (mean rain per cell, hashed from seed,
+    point and iteration) dissolves solubility of water amount of terrain,
+    water runs down the surface carrying sediment, evaporation part of
+    water dries and sediment over capacity per water unit is deposited.
+    Remaining sediment is deposited at the end. chunk_rows - see
+    thermal_erosion.
+    """
+    grain = CounterGrain(seed)
+
+    def stage(band, rows, wrap):
+        return _hydraulic(
+            band,
+            rows,
+            wrap,
+            iterations,
+            grain,
+            rain,
+            solubility,
+            evaporation,
+            capacity,
+        )
+
+    return _run(stage, heights, 2 * iterations, wraped, chunk_rows, out)
+
+
+def erode(
+    generator,
+    talus=None,
+    thermal=0,
+    hydraulic=0,
+    seed=None,
+    chunk_rows=None,
+    **options
+):
+    """Erodes heightmap of square array generator in place.
+
+    Runs thermal iterations of thermal_erosion (with talus) and then
+    hydraulic iterations of hydraulic_erosion with options, seeded by
+    generator seed unless seed is given.
+    """
+    values = generator._float_values()
+    if thermal:
+        values = thermal_erosion(
+            values,
+            talus,
+            thermal,
+            wraped=generator.wraped,
+            chunk_rows=chunk_rows,
+        )
+    if hydraulic:
+        seed = generator.seed if seed is None else seed
+        values = hydraulic_erosion(
+            values,
+            hydraulic,
+            seed,
+            wraped=generator.wraped,
+            chunk_rows=chunk_rows,
+            **options
+        )
+    generator._set_values(values)
+    generator.reset_statistics()
+    return generator
@@ -18,7 +18,15 @@ P = Point = namedtuple('Point', 'x y')
 
 ####################### FRACTAL GEN DATA #######################
 class BaseFractalGenerator(object):
-    def __init__(self, size, chaos, seed=None, wraped=True, island=False):
+    """
+    grain is an optional grain.CounterGrain - grain of every point is then
+    hashed from its coordinates instead of drawn from sequential stream,
+    so it does not depend on the order of generation.
+    """
+
+    def __init__(
+        self, size, chaos, seed=None, wraped=True, island=False, grain=None
+    ):
         self.size = size
         self.chaos = chaos
         self.seed = seed if seed is not None else tools.make_seed()
@@ -37,20 +45,53 @@ class BaseFractalGenerator(object):
             _randgen = self._randgen
             make_grain = lambda self: self._randgen.randint(-100, 100)
             # make_grain = lambda self : int(self._randgen.gauss(0,1)*100)
-            middle_grain = make_grain
-            border_grain = lambda self: self._randgen.randint(-100, -50)
+            middle_grain = lambda self, key=None: self.make_grain()
+            border_grain = lambda self, key=None: self._randgen.randint(
+                -100, -50
+            )
 
             def __missing__(self, key):
                 return self.make_grain()
 
-        # grain data
-        self._grain = LazyGrainDict()
+        # grain data - counter grain needs numpy, so it is imported only
+        # when used and dict generators work without numpy
+        if grain is None:
+            self._grain = LazyGrainDict()
+        else:
+            from .grain import CounterGrainDict
+
+            self._grain = CounterGrainDict(grain)
 
         # fractal data
         self._data = defaultdict(int)
+        # (array, mask) of data for get_values - built on first use
+        self._grid = None
 
     def get_value(self, xy):
-        return self._data[(xy[0], xy[1])]
+        return self._data.get((xy[0], xy[1]), 0)
+
+    def _grid_data(self):
+        """Data as (width, width) float64 array and mask of points (or None)"""
+        import numpy
+
+        if self._grid is None:
+            width = 2**self.size + 1
+            grid = numpy.zeros((width, width))
+            mask = numpy.zeros((width, width), dtype=bool)
+            points = numpy.array(
+                list(self._data.keys()), dtype=numpy.int64
+            ).reshape(-1, 2)
+            grid[points[:, 0], points[:, 1]] = list(self._data.values())
+            mask[points[:, 0], points[:, 1]] = True
+            self._grid = grid, None if mask.all() else mask
+        return self._grid
+
+    def get_values(self, xs, ys, method='nearest', fill=0):
+        """Values at many points at once - needs numpy, see sampling.sample"""
+        from .sampling import sample
+
+        grid, mask = self._grid_data()
+        return sample(grid, xs, ys, method, self.wraped, mask, fill)
 
     def statistics(self):
         if self.mean is None or self.stdev is None:
@@ -86,6 +127,7 @@ class BaseFractalGenerator(object):
             ratio = float(new_stdev) / self.stdev
             for field in self._point_iterator():
                 self._data[field] = ((self._data[field] - self.mean) * ratio) + new_mean
+        self._grid = None
         self.reset_statistics()
 
     def linear_transform(self, multipier, shift):
@@ -94,9 +136,10 @@ class BaseFractalGenerator(object):
         """
         for field in self._point_iterator():
             self._data[field] = self._data[field] * multipier + shift
+        self._grid = None
         if self.mean is not None and self.stdev is not None:
             self.mean = self.mean * multipier + shift
-            self.stdev *= multipier * multipier
+            self.stdev *= abs(multipier)
 
     def power_transform(
         self,
@@ -116,26 +159,34 @@ class BaseFractalGenerator(object):
                 self._data[field] = ((self._data[field] / point_one) ** power) * point_one
             elif calculate_negatives and self._data[field] < 0:
                 self._data[field] = -((-self._data[field] / point_one) ** power) * point_one
+        self._grid = None
         self.reset_statistics()
 
 
 class HexFractalGenerator(BaseFractalGenerator):
-    def __init__(self, size, chaos, seed=None, wraped=True, island=False):
-        super().__init__(size, chaos, seed, wraped, island)
+
+    def __init__(
+        self, size, chaos, seed=None, wraped=True, island=False, grain=None
+    ):
+        super().__init__(size, chaos, seed, wraped, island, grain)
 
         width = 2**size + 1
         last = width - 1
         edge = int((width + 1) / 2)
 
         if island:
-            self._grain[P(last // 2, last // 2)] = self._grain.middle_grain()
+            middle = P(last // 2, last // 2)
+            self._grain[middle] = self._grain.middle_grain(middle)
             for i in range(edge):
-                self._grain[P(i, 0)] = self._grain.border_grain()
-                self._grain[P(0, i)] = self._grain.border_grain()
-                self._grain[P(last - i, last)] = self._grain.border_grain()
-                self._grain[P(last, last - i)] = self._grain.border_grain()
-                self._grain[P(edge - 1 + i, i)] = self._grain.border_grain()
-                self._grain[P(i, edge - 1 + i)] = self._grain.border_grain()
+                for point in (
+                    P(i, 0),
+                    P(0, i),
+                    P(last - i, last),
+                    P(last, last - i),
+                    P(edge - 1 + i, i),
+                    P(i, edge - 1 + i),
+                ):
+                    self._grain[point] = self._grain.border_grain(point)
 
         corners_and_middle = (
             P(0, 0),
@@ -200,19 +251,27 @@ class HexFractalGenerator(BaseFractalGenerator):
 
 
 class SquareDiamondFractalGenerator(BaseFractalGenerator):
-    def __init__(self, size, chaos, seed=None, wraped=True, island=False):
-        super().__init__(size, chaos, seed, wraped, island)
+
+    def __init__(
+        self, size, chaos, seed=None, wraped=True, island=False, grain=None
+    ):
+        super().__init__(size, chaos, seed, wraped, island, grain)
 
         # setting initial numbers in island mode
         if island:
             width = 2**size + 1
             middle = 2 ** (size - 1)
-            self._grain[P(middle, middle)] = self._grain.middle_grain()
+            self._grain[P(middle, middle)] = self._grain.middle_grain(
+                P(middle, middle)
+            )
             for i in range(width):
-                self._grain[P(i, width - 1)] = self._grain.border_grain()
-                self._grain[P(width - 1, i)] = self._grain.border_grain()
-                self._grain[P(i, 0)] = self._grain.border_grain()
-                self._grain[P(0, i)] = self._grain.border_grain()
+                for point in (
+                    P(i, width - 1),
+                    P(width - 1, i),
+                    P(i, 0),
+                    P(0, i),
+                ):
+                    self._grain[point] = self._grain.border_grain(point)
 
         # generate fractal
         self._generate()
@@ -0,0 +1,930 @@
+#!/usr/bin/env python
+"""Array backed fractal generators.
+
+mallib: common library for mal projects
+@author: Paweł Sobkowiak
+@contact: pawel.sobkowiak@gmail.com
+Copyright © 2011 Paweł Sobkowiak
+
+Heights are kept in numpy arrays indexed [x, y] instead of dicts of Points.
+For the same seed results are the same as of generators from fractal module.
+"""
+
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import json
+import os
+import random
+
+import numpy
+
+from . import tools
+from .fractal import P
+from .fractal_transforms import TransformPipeline, fit, statistics
+from .grain import BORDER, MIDDLE
+from .sampling import sample
+
+# number of points processed at once by banded generation steps
+BAND_SIZE = 1 << 20
+# smallest band worth passing to another thread
+MIN_BAND_SIZE = 1 << 14
+
+
+class SequentialGrain(object):
+    """Vectorized continuation of random.Random stream.
+
+    Draws exactly the same numbers as randgen.randint would, in the same
+    order, so array generators stay compatible with LazyGrainDict.
+    randgen should not be used any more after creating SequentialGrain.
+    """
+
+    def __init__(self, randgen):
+        state = randgen.getstate()[1]
+        self._bitgen = numpy.random.MT19937()
+        self._bitgen.state = {
+            'bit_generator': 'MT19937',
+            'state': {
+                'key': numpy.array(state[:624], dtype=numpy.uint32),
+                'pos': state[624],
+            },
+        }
+        # raw 32 bit words drawn from generator but not used yet
+        self._raw = numpy.empty(0, dtype=numpy.uint64)
+
+    def randint(self, low, high, count):
+        """Returns array of count random integers from low..high (inclusive)"""
+        span = high - low + 1
+        shift = 32 - span.bit_length()
+        parts = []
+        needed = count
+        while needed:
+            if not len(self._raw):
+                self._raw = self._bitgen.random_raw(needed + needed // 4 + 64)
+            candidates = self._raw >> shift
+            accepted = numpy.flatnonzero(candidates < span)
+            if len(accepted) >= needed:
+                accepted = accepted[:needed]
+                self._raw = self._raw[accepted[-1] + 1 :]
+            else:
+                self._raw = self._raw[:0]
+            parts.append(candidates[accepted])
+            needed -= len(accepted)
+        if not parts:
+            return numpy.empty(0, dtype=numpy.int64)
+        return numpy.concatenate(parts).astype(numpy.int64) + low
+
+
+class ArrayFractalGenerator(object):
+    """Base of array backed fractal generators.
+
+    Has the same interface as fractal.BaseFractalGenerator.
+    dtype selects storage of heights - numpy.int64 (default, same values
+    as dict generators), numpy.float64, numpy.float32 or numpy.int16
+    (compact, raises ValueError when generated values do not fit its
+    range; transforms clip to it).
+    fixed is an optional (width, width) array of values that are kept
+    instead of generated, NaN marks points to generate. It makes
+    the boundary of tiles and regenerated regions seamless.
+    out is an optional path of file (raw or .npy) that is memory mapped
+    and generated in place, so huge maps need not fit in memory.
+    Storage types other than the type used in memory during generation
+    (eg. int16) are generated in a temporary out + '.work' file and
+    converted at the end, so results equal those made in memory.
+    Reopen the file with open_heightmap.
+    """
+
+    band_size = BAND_SIZE
+    workers = 1
+    _executor = None
+
+    def __init__(
+        self,
+        size,
+        chaos,
+        seed=None,
+        wraped=True,
+        island=False,
+        dtype=numpy.int64,
+        fixed=None,
+        out=None,
+        grain=None,
+    ):
+        self.size = size
+        self.chaos = chaos
+        self.seed = seed if seed is not None else tools.make_seed()
+        self.wraped = wraped
+        self.island = island
+        self.dtype = numpy.dtype(dtype)
+
+        # prepare placeholders for statistics data
+        self.mean = None
+        self.stdev = None
+
+        # random generator - seeded like in BaseFractalGenerator
+        self._randgen = random.Random(seed)
+        # preset grain values { (x, y): grain, ... } - island borders etc.
+        self._preset = {}
+
+        # fractal data
+        self.width = 2**size + 1
+        self._data = None
+        # points of fractal - None when every point of array belongs to it
+        self._mask = None
+        self._fixed = fixed
+        self.path = out
+        # finest generated level - see ArraySquareDiamondFractalGenerator
+        self.level = size
+        # counter based grain - None for sequential stream of dict generators
+        self._counter = grain
+        # data changed after generation - transforms, erosion, regions
+        self.modified = False
+
+    def _work_dtype(self):
+        """Type used during generation - exact for every storage type"""
+        if self.dtype.kind == 'f':
+            return self.dtype
+        return numpy.dtype(numpy.int64)
+
+    def _store(self, data):
+        if self.dtype == data.dtype:
+            return data
+        if self.dtype.kind in 'iu' and data.size:
+            info = numpy.iinfo(self.dtype)
+            low, high = numpy.nanmin(data), numpy.nanmax(data)
+            if low < info.min or high > info.max:
+                raise ValueError(
+                    "values %s..%s do not fit %s" % (low, high, self.dtype.name)
+                )
+        return data.astype(self.dtype)
+
+    def _allocate(self, dtype=None):
+        """Creates zeroed data array - in memory or in memory mapped file
+
+        Storage types other than the work type are generated in a work
+        file next to out, converted to out by _finish.
+        """
+        shape = (self.width, self.width)
+        dtype = numpy.dtype(dtype or self._work_dtype())
+        if self.path is None:
+            return numpy.zeros(shape, dtype=dtype)
+        if dtype != self.dtype:
+            return numpy.memmap(
+                self.path + '.work', mode='w+', dtype=dtype, shape=shape
+            )
+        return self._open_out()
+
+    def _open_out(self):
+        shape = (self.width, self.width)
+        if self.path.endswith('.npy'):
+            return numpy.lib.format.open_memmap(
+                self.path, mode='w+', dtype=self.dtype, shape=shape
+            )
+        return numpy.memmap(self.path, mode='w+', dtype=self.dtype, shape=shape)
+
+    def _finish(self, data):
+        """Stores generated data - memory mapped file gets flushed"""
+        if not isinstance(data, numpy.memmap):
+            self._data = self._store(data)
+            return
+        if data.dtype != self.dtype:
+            # work file is converted band by band, it is kept
+            # while progressive generation may continue
+            out = self._data
+            if not isinstance(out, numpy.memmap):
+                out = self._open_out()
+            for rows in self._bands(numpy.arange(self.width), self.width):
+                block = slice(rows[0], rows[-1] + 1)
+                out[block] = self._store(numpy.asarray(data[block]))
+            if getattr(self, '_work', None) is None:
+                del data
+                os.remove(self.path + '.work')
+            data = out
+        data.flush()
+        self._data = data
+        self.save_metadata()
+
+    def _read(self, data, index):
+        return numpy.asarray(data[index], dtype=self._work_dtype())
+
+    def _write(self, data, index, values):
+        if data.dtype != values.dtype and data.dtype.kind in 'iu':
+            info = numpy.iinfo(data.dtype)
+            values = numpy.clip(values, info.min, info.max)
+        data[index] = values
+
+    def _bands(self, rows, row_length):
+        """Splits rows into bands of about band_size points
+
+        With more workers bands get smaller, so every worker gets some.
+        """
+        row_length = max(1, row_length)
+        per_band = self.band_size // row_length
+        if self.workers > 1:
+            per_band = min(
+                per_band,
+                max(
+                    MIN_BAND_SIZE // row_length,
+                    -(-len(rows) // (2 * self.workers)),
+                ),
+            )
+        per_band = max(1, per_band)
+        for start in range(0, len(rows), per_band):
+            yield rows[start : start + per_band]
+
+    def _deferred(self, function, *args):
+        """Returns callable giving function(*args).
+
+        Sequential grain has to be drawn right now in the order of bands,
+        counter grain is computed later by the band job itself.
+        """
+        if self._counter is not None:
+            return functools.partial(function, *args)
+        result = function(*args)
+        return lambda: result
+
+    def _run_bands(self, jobs):
+        """Runs band jobs (callables) of a single step
+
+        Jobs of one step write disjoint points and read only points
+        of previous steps, so they can run on threads in any order -
+        numpy releases GIL in their kernels. Only workers jobs are in
+        flight at a time, so memory of waiting bands stays bounded.
+        """
+        if self._executor is None:
+            for job in jobs:
+                job()
+            return
+        futures = collections.deque()
+        for job in jobs:
+            if len(futures) >= self.workers:
+                futures.popleft().result()
+            futures.append(self._executor.submit(job))
+        for future in futures:
+            future.result()
+
+    def metadata(self):
+        """Parameters of generated heightmap - see restore_heightmap"""
+        return {
+            'class': next(
+                cls.__name__
+                for cls in type(self).__mro__
+                if cls.__name__ in GENERATORS
+            ),
+            'size': self.size,
+            'chaos': self.chaos,
+            'seed': self.seed,
+            'wraped': self.wraped,
+            'island': self.island,
+            'grain': None if self._counter is None else self._counter.seed,
+            'dtype': self.dtype.str,
+            'width': self.width,
+            'level': self.level,
+            'mask': self._mask is not None,
+            'amplitude': self.amplitude,
+            'modified': self.modified,
+        }
+
+    def save_metadata(self):
+        """Writes parameters of memory mapped heightmap next to its file"""
+        with open(self.path + '.json', 'w') as fp:
+            json.dump(self.metadata(), fp)
+        if isinstance(self._mask, numpy.memmap):
+            self._mask.flush()
+        elif self._mask is not None:
+            numpy.save(self.path + '.mask.npy', self._mask)
+
+    def _middle_grain(self, point):
+        if self._counter is not None:
+            return self._counter.value(point[0], point[1], -100, 100, MIDDLE)
+        return self._randgen.randint(-100, 100)
+
+    def _border_grain(self, point):
+        if self._counter is not None:
+            return self._counter.value(point[0], point[1], -100, -50, BORDER)
+        return self._randgen.randint(-100, -50)
+
+    def _point_grain(self, point):
+        if self._counter is not None:
+            return self._counter.value(point[0], point[1])
+        return self._randgen.randint(-100, 100)
+
+    def _start_grain(self):
+        """Switches from presets drawn by randgen to vectorized stream"""
+        if self._counter is None:
+            self._sequence = SequentialGrain(self._randgen)
+        if self._preset:
+            keys = numpy.array(
+                [x * self.width + y for x, y in self._preset], dtype=numpy.int64
+            )
+            values = numpy.array(list(self._preset.values()), dtype=numpy.int64)
+            order = numpy.argsort(keys)
+            self._preset_keys = keys[order]
+            self._preset_values = values[order]
+
+    def _presets(self, xs, ys):
+        """Mask of points in xs, ys having preset grain and its values"""
+        keys = xs.astype(numpy.int64) * self.width + ys
+        positions = numpy.searchsorted(self._preset_keys, keys)
+        positions[positions == len(self._preset_keys)] = 0
+        preset = self._preset_keys[positions] == keys
+        return preset, self._preset_values[positions[preset]]
+
+    def _grain_values(self, xs, ys):
+        """Grain of points in xs, ys - drawn in the order of given points"""
+        if self._counter is not None:
+            values = self._counter.values(xs, ys)
+            if self._preset:
+                preset, preset_values = self._presets(xs, ys)
+                values[preset] = preset_values
+            return values
+        if not self._preset:
+            return self._sequence.randint(-100, 100, len(xs))
+        preset, preset_values = self._presets(xs, ys)
+        values = numpy.empty(len(xs), dtype=numpy.int64)
+        values[preset] = preset_values
+        values[~preset] = self._sequence.randint(
+            -100, 100, len(xs) - int(preset.sum())
+        )
+        return values
+
+    def _free(self, xs, ys):
+        """Mask of given points that are not fixed"""
+        if self._fixed is None:
+            return numpy.ones(len(xs), dtype=bool)
+        return numpy.isnan(self._fixed[xs, ys])
+
+    def _point_iterator(self):
+        width = self.width
+        for x in range(width):
+            for y in range(width):
+                yield P(x, y)
+
+    def _values(self):
+        """Array of values of every point of fractal"""
+        if self._mask is None:
+            return self._data
+        return self._data[self._mask]
+
+    def get_value(self, xy):
+        x, y = xy[0], xy[1]
+        if 0 <= x < self.width and 0 <= y < self.width:
+            return self._data[x, y].item()
+        return 0
+
+    def get_values(self, xs, ys, method='nearest', fill=0):
+        """Values at many points at once - see sampling.sample"""
+        return sample(self._data, xs, ys, method, self.wraped, self._mask, fill)
+
+    def to_array(self):
+        return self._data
+
+    def statistics(self):
+        if self.mean is None or self.stdev is None:
+            stats = statistics(self._values())
+            self.mean = stats.mean
+            self.stdev = stats.stdev
+
+        return {
+            'mean': self.mean,
+            'stdev': self.stdev,
+            'chaos': self.chaos,
+            'seed': self.seed,
+        }
+
+    def reset_statistics(self):
+        self.mean = None
+        self.stdev = None
+
+    def _float_values(self):
+        """Values ready for transform - int64 storage becomes float64"""
+        if self.dtype == numpy.int64:
+            self.dtype = numpy.dtype(numpy.float64)
+            self._data = self._data.astype(self.dtype)
+        values = self._values()
+        if values.dtype.kind != 'f':
+            values = values.astype(numpy.float64)
+        return values
+
+    def _set_values(self, values):
+        values = fit(values, self.dtype).astype(self.dtype)
+        if self._mask is None:
+            self._data = values
+        else:
+            self._data[self._mask] = values
+        self._modify()
+
+    def _modify(self):
+        """Marks data changed after generation, file metadata included"""
+        self.modified = True
+        if isinstance(self._data, numpy.memmap) and self.path is not None:
+            self.save_metadata()
+
+    def transform(self, new_mean, new_stdev):
+        """
+        Apply linear transform to fractal data that will set new mean and stdev
+        """
+        # ensure statistics are ready
+        self.statistics()
+        if self.stdev:  # avoid DivideByZero
+            ratio = float(new_stdev) / self.stdev
+            TransformPipeline().linear(
+                ratio, new_mean - self.mean * ratio
+            ).apply(self)
+
+    def linear_transform(self, multipier, shift):
+        """
+        Apply linear transform to fractal data
+        """
+        TransformPipeline().linear(multipier, shift).apply(self)
+
+    def power_transform(
+        self,
+        power,
+        point_one=1,
+        calculate_positives=True,
+        calculate_negatives=False,
+    ):
+        """
+        Apply power function transformation to fractal data
+        point_one specifies which value should be treated as argument=1
+        for the power function
+        """
+        TransformPipeline().power(
+            power, point_one, calculate_positives, calculate_negatives
+        ).apply(self)
+
+    def pipeline(self, pipeline):
+        """Apply TransformPipeline - many transforms in a single pass"""
+        return pipeline.apply(self)
+
+
+class ArrayHexFractalGenerator(ArrayFractalGenerator):
+    """Hex generator computing midpoints of a whole step at once.
+
+    Points are kept in axial coordinates of the square array, _mask
+    marks the hex shaped board. Heights are floats (numpy.float64).
+    amplitude scales grain of midpoints of the first step.
+    """
+
+    amplitude = 1.0
+
+    def __init__(
+        self,
+        size,
+        chaos,
+        seed=None,
+        wraped=True,
+        island=False,
+        dtype=numpy.float64,
+        fixed=None,
+        out=None,
+        grain=None,
+        amplitude=None,
+    ):
+        super().__init__(
+            size, chaos, seed, wraped, island, dtype, fixed, out, grain
+        )
+        if amplitude is not None:
+            self.amplitude = amplitude
+
+        width = self.width
+        last = width - 1
+        edge = int((width + 1) / 2)
+
+        if island:
+            self._preset[(last // 2, last // 2)] = self._middle_grain(
+                (last // 2, last // 2)
+            )
+            for i in range(edge):
+                for point in (
+                    (i, 0),
+                    (0, i),
+                    (last - i, last),
+                    (last, last - i),
+                    (edge - 1 + i, i),
+                    (i, edge - 1 + i),
+                ):
+                    self._preset[point] = self._border_grain(point)
+
+        corners_and_middle = (
+            (0, 0),
+            (edge - 1, 0),
+            (0, edge - 1),
+            (last, last),
+            (edge - 1, last),
+            (last, edge - 1),
+            (edge - 1, edge - 1),
+        )
+        data = self._allocate(numpy.float64)
+        for point in corners_and_middle:
+            if fixed is not None and not numpy.isnan(fixed[point]):
+                data[point] = fixed[point]
+            elif point in self._preset:
+                data[point] = self._preset[point]
+            else:
+                data[point] = self._point_grain(point)
+
+        # generate fractal
+        self._start_grain()
+        self._generate(data, corners_and_middle)
+
+    def _point_iterator(self):
+        return [P(x, y) for x, y in zip(*numpy.nonzero(self._mask))]
+
+    def _on_board(self, xs, ys):
+        """Mask of points xs, ys lying on hex board"""
+        edge = (self.width - 1) // 2
+        return (
+            (xs >= 0)
+            & (ys >= 0)
+            & (xs < self.width)
+            & (ys < self.width)
+            & (numpy.abs(xs - ys) <= edge)
+        )
+
+    def _board_mask(self):
+        """Mask of hex board - memory mapped next to out file if given"""
+        shape = (self.width, self.width)
+        if self.path is None:
+            mask = numpy.zeros(shape, dtype=bool)
+        else:
+            mask = numpy.lib.format.open_memmap(
+                self.path + '.mask.npy', mode='w+', dtype=bool, shape=shape
+            )
+        columns = numpy.arange(self.width)
+        for rows in self._bands(columns, self.width):
+            mask[rows[0] : rows[-1] + 1] = self._on_board(
+                rows[:, None], columns[None, :]
+            )
+        return mask
+
+    def _generate(self, data, corners_and_middle):
+        """Midpoint displacement over triangles - see HexFractalGenerator
+
+        After every step points of the board are exactly those on lattice
+        of the step, so whether a neighbour exists follows from its
+        coordinates. Points are visited in order of insertion (it decides
+        order of drawing grain) in bands, the order is kept in file next
+        to out when data is memory mapped.
+        """
+        ratio = 2.0 ** (-self.chaos)
+        edge = (self.width - 1) // 2
+        total = 3 * edge * (edge + 1) + 1
+        if self.path is None:
+            order = numpy.empty((2, total), dtype=numpy.int64)
+        else:
+            order = numpy.memmap(
+                self.path + '.order',
+                mode='w+',
+                dtype=numpy.int64,
+                shape=(2, total),
+            )
+        order[:, : len(corners_and_middle)] = numpy.array(corners_and_middle).T
+        count = len(corners_and_middle)
+        per_band = max(1, self.band_size // 3)
+        # we do calculation as if size was 2 times lower
+        # to enable hex shaped board
+        size = self.size - 1
+        for step in range(size):
+            factor = self.amplitude * ratio**step
+            edge_size = 2**size // (2**step)
+            end = count
+            for start in range(0, end, per_band):
+                xs = numpy.array(order[0, start : min(start + per_band, end)])
+                ys = numpy.array(order[1, start : min(start + per_band, end)])
+                new_x, new_y = self._midpoints(data, xs, ys, edge_size, factor)
+                order[0, count : count + len(new_x)] = new_x
+                order[1, count : count + len(new_y)] = new_y
+                count += len(new_x)
+        if self.path is not None:
+            del order
+            os.remove(self.path + '.order')
+        self._mask = self._board_mask()
+        self._finish(data)
+
+    def _midpoints(self, data, xs, ys, edge_size, factor):
+        """Creates midpoints of edges from points xs, ys - returns new points"""
+        positive_directions = numpy.array(
+            ((1, 0), (0, 1), (1, 1)), dtype=numpy.int64
+        )
+        width = self.width
+        half = edge_size // 2
+        count = len(xs)
+        # exists[p, k] - second point in direction k is on board
+        exists = numpy.zeros((count, 3), dtype=bool)
+        seconds = []
+        for k, (dx, dy) in enumerate(positive_directions):
+            second_x, second_y = xs + dx * edge_size, ys + dy * edge_size
+            exists[:, k] = self._on_board(second_x, second_y)
+            seconds.append(
+                (
+                    numpy.minimum(second_x, width - 1),
+                    numpy.minimum(second_y, width - 1),
+                )
+            )
+        # new points are created (and draw grain) point by point,
+        # direction by direction
+        new_x = (xs[:, None] + positive_directions[:, 0] * half)[exists]
+        new_y = (ys[:, None] + positive_directions[:, 1] * half)[exists]
+        free = self._free(new_x, new_y)
+        grain = numpy.zeros((count, 3), dtype=numpy.float64)
+        new_grain = numpy.zeros(len(new_x), dtype=numpy.float64)
+        new_grain[free] = self._grain_values(new_x[free], new_y[free])
+        grain[exists] = new_grain
+        if self._fixed is not None:
+            kept = numpy.full((count, 3), numpy.nan)
+            kept[exists] = numpy.where(
+                free, numpy.nan, self._fixed[new_x, new_y]
+            )
+        values = numpy.asarray(data[xs, ys], dtype=numpy.float64)
+        midpoints = []
+        for k in range(3):
+            # point and second have double weight
+            # because of hex shape from triangles
+            value = (
+                values + numpy.asarray(data[seconds[k]], dtype=numpy.float64)
+            ) * 2
+            vertices = numpy.full(count, 4)
+            # midpoints of earlier directions are already neighbours
+            for j in range(k):
+                value = value + numpy.where(exists[:, j], midpoints[j], 0.0)
+                vertices += exists[:, j]
+            midpoint = value / vertices + grain[:, k] * factor
+            if self._fixed is not None:
+                midpoint = numpy.where(
+                    numpy.isnan(kept[:, k]), midpoint, kept[:, k]
+                )
+            midpoints.append(midpoint)
+        data[new_x, new_y] = numpy.stack(midpoints, axis=1)[exists]
+        return new_x, new_y
+
+
+class ArraySquareDiamondFractalGenerator(ArrayFractalGenerator):
+    """Diamond-square generator running each pass as whole-array operations
+
+    Passes are processed in bands of rows, which bounds temporary memory.
+    With workers > 1 bands of each pass run on a thread pool, the result
+    is identical to the serial one since grain is drawn in serial order.
+
+    Every pass doubles resolution, level k is the grid of every
+    2**(size - k)-th point (width 2**k + 1). With level given generation
+    stops at that level and refine continues it later; level_array and
+    pyramid give coarse maps. Statistics and transforms should be used
+    on full resolution maps. amplitude is the scale of grain that
+    is reduced by 2**-chaos before every pass.
+    """
+
+    amplitude = 1000
+
+    def __init__(
+        self,
+        size,
+        chaos,
+        seed=None,
+        wraped=True,
+        island=False,
+        dtype=numpy.int64,
+        fixed=None,
+        out=None,
+        workers=1,
+        grain=None,
+        level=None,
+        amplitude=None,
+    ):
+        super().__init__(
+            size, chaos, seed, wraped, island, dtype, fixed, out, grain
+        )
+        self.workers = workers
+        if amplitude is not None:
+            self.amplitude = amplitude
+
+        # setting initial numbers in island mode
+        if island:
+            width = self.width
+            middle = 2 ** (size - 1)
+            self._preset[(middle, middle)] = self._middle_grain(
+                (middle, middle)
+            )
+            for i in range(width):
+                for point in ((i, width - 1), (width - 1, i), (i, 0), (0, i)):
+                    self._preset[point] = self._border_grain(point)
+
+        # generate fractal
+        self._start_grain()
+        self._generate(level)
+
+    def _generate(self, level=None):
+        """
+        Use the diamond-square algorithm to tessalate a grid of values
+        into a fractal height map - see SquareDiamondFractalGenerator.
+        """
+        data = self._allocate()
+        if self._fixed is not None:
+            for rows in self._bands(numpy.arange(self.width), self.width):
+                block = rows[0], rows[-1] + 1
+                fixed = self._fixed[block[0] : block[1]]
+                self._write(
+                    data,
+                    slice(*block),
+                    numpy.where(numpy.isnan(fixed), 0, fixed),
+                )
+        # state of progressive generation
+        self._work = data
+        self._stride = (self.width - 1) // 2
+        self._scale = self.amplitude
+        self.level = 0
+        self.refine(level)
+
+    def refine(self, level=None):
+        """Continues generation up to level (default - full resolution)"""
+        level = self.size if level is None else min(level, self.size)
+        data = getattr(self, '_work', None)
+        if data is None:
+            # complete maps and maps reopened from files have no work data
+            if self.level < level:
+                raise ValueError("reopened heightmaps cannot be refined")
+            return self
+        ratio = 2.0 ** (-self.chaos)
+        if self.workers > 1:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            while self.level < level:
+                stride = self._stride
+                self._scale = scale = int(self._scale * ratio)
+                self._run_bands(self._square_step(data, stride, scale))
+                self._run_bands(self._diamond_step(data, stride, scale))
+                self._stride >>= 1
+                self.level += 1
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+        if self.level == self.size:
+            self._work = None
+        self._finish(data)
+        self.reset_statistics()
+        return self
+
+    def level_array(self, level=None):
+        """Coarse map of given level (default - current one), a view of data"""
+        level = self.level if level is None else level
+        if not 0 <= level <= self.level:
+            raise ValueError(
+                "level %s is not generated (current level %s)"
+                % (level, self.level)
+            )
+        step = 2 ** (self.size - level)
+        return self._data[::step, ::step]
+
+    def pyramid(self):
+        """Maps of every generated level - from single square to current one"""
+        return [self.level_array(level) for level in range(self.level + 1)]
+
+    def coarse_value(self, xy, level):
+        """Value of full resolution point xy from nearest point of level"""
+        step = 2 ** (self.size - level)
+        x, y = xy[0], xy[1]
+        return self.get_value(
+            ((x + step // 2) // step * step, (y + step // 2) // step * step)
+        )
+
+    def _square_step(self, data, stride, scale):
+        """Yields band jobs giving square centers - corner average plus grain"""
+        sub_size = self.width - 1
+        step = 2 * stride
+        centers = numpy.arange(stride, sub_size, step)
+        for rows in self._bands(centers, len(centers)):
+            grain = self._deferred(self._square_grain, rows, centers)
+            yield lambda rows=rows, grain=grain: self._square_band(
+                data, stride, scale, rows, *grain()
+            )
+
+    def _square_grain(self, rows, centers):
+        """Grain of square centers in rows and mask of free ones"""
+        xs, ys = numpy.meshgrid(rows, centers, indexing='ij')
+        free = self._free(xs.ravel(), ys.ravel()).reshape(xs.shape)
+        grain = numpy.zeros(xs.shape, dtype=numpy.int64)
+        grain[free] = self._grain_values(xs[free], ys[free])
+        return grain, free
+
+    def _square_band(self, data, stride, scale, rows, grain, free):
+        sub_size = self.width - 1
+        step = 2 * stride
+        lower = slice(rows[0] - stride, rows[-1] - stride + 1, step)
+        higher = slice(rows[0] + stride, rows[-1] + stride + 1, step)
+        average = (
+            self._read(data, (lower, slice(0, sub_size, step)))
+            + self._read(data, (lower, slice(step, None, step)))
+            + self._read(data, (higher, slice(0, sub_size, step)))
+            + self._read(data, (higher, slice(step, None, step)))
+        ) // 4
+        values = scale * grain + average
+        target = (
+            slice(rows[0], rows[-1] + 1, step),
+            slice(stride, sub_size, step),
+        )
+        if self._fixed is not None:
+            values = numpy.where(free, values, self._read(data, target))
+        self._write(data, target, values)
+
+    def _diamond_step(self, data, stride, scale):
+        """Yields band jobs giving diamond centers - average of tips plus grain
+
+        Points on edges wrap around, like in _avg_diamond_vals.
+        """
+        sub_size = self.width - 1
+        step = 2 * stride
+        rows = numpy.arange(0, sub_size, stride)
+        columns = numpy.arange(0, sub_size, step)
+        for band in self._bands(rows, len(columns)):
+            xs = numpy.repeat(band, len(columns))
+            # every other row starts with stride offset
+            ys = (
+                columns
+                + numpy.where(band // stride % 2 == 0, stride, 0)[:, None]
+            ).ravel()
+            if self._fixed is not None:
+                free = self._free(xs, ys)
+                xs, ys = xs[free], ys[free]
+            grain = self._deferred(self._grain_values, xs, ys)
+            yield lambda xs=xs, ys=ys, grain=grain: self._diamond_band(
+                data, stride, scale, xs, ys, grain()
+            )
+
+    def _diamond_band(self, data, stride, scale, xs, ys, grain):
+        sub_size = self.width - 1
+        average = (
+            self._read(
+                data, (numpy.where(xs == 0, sub_size - stride, xs - stride), ys)
+            )
+            + self._read(data, (xs + stride, ys))
+            + self._read(
+                data, (xs, numpy.where(ys == 0, sub_size - stride, ys - stride))
+            )
+            + self._read(data, (xs, ys + stride))
+        ) // 4
+        self._write(data, (xs, ys), scale * grain + average)
+        # To wrap edges seamlessly, copy edge values around
+        # to other side of array
+        if self.wraped:
+            copied = xs == 0
+            if self._fixed is not None:
+                copied &= self._free(numpy.full(len(xs), sub_size), ys)
+            data[sub_size, ys[copied]] = data[0, ys[copied]]
+            copied = ys == 0
+            if self._fixed is not None:
+                copied &= self._free(xs, numpy.full(len(xs), sub_size))
+            data[xs[copied], sub_size] = data[xs[copied], 0]
+
+
+GENERATORS = {
+    'ArrayHexFractalGenerator': ArrayHexFractalGenerator,
+    'ArraySquareDiamondFractalGenerator': ArraySquareDiamondFractalGenerator,
+}
+
+
+def restore_heightmap(metadata, data, mask=None, path=None):
+    """Returns generator made of data saved with given metadata.
+
+    metadata is a dict like one of ArrayFractalGenerator.metadata,
+    no generation is done.
+    """
+    cls = GENERATORS[metadata['class']]
+    generator = cls.__new__(cls)
+    ArrayFractalGenerator.__init__(
+        generator,
+        metadata['size'],
+        metadata['chaos'],
+        metadata['seed'],
+        metadata['wraped'],
+        metadata['island'],
+        data.dtype,
+        out=path,
+    )
+    generator._data = data
+    generator._mask = mask
+    generator.level = metadata['level']
+    if metadata.get('amplitude') is not None:
+        generator.amplitude = metadata['amplitude']
+    generator.modified = metadata.get('modified', False)
+    return generator
+
+
+def open_heightmap(path, mode='r'):
+    """Reopens memory mapped heightmap written by array generator.
+
+    Returns generator with data mapped from file (no generation is done),
+    mode is the numpy.memmap mode ('r', 'r+' or 'c').
+    """
+    with open(path + '.json') as fp:
+        metadata = json.load(fp)
+    if path.endswith('.npy'):
+        data = numpy.load(path, mmap_mode=mode)
+    else:
+        shape = (metadata['width'], metadata['width'])
+        data = numpy.memmap(
+            path, mode=mode, dtype=numpy.dtype(metadata['dtype']), shape=shape
+        )
+    mask = numpy.load(path + '.mask.npy') if metadata['mask'] else None
+    return restore_heightmap(metadata, data, mask, path)
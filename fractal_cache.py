@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+"""On-disk cache of generated heightmaps.
+
+mallib: common library for mal projects
+@author: Paweł Sobkowiak
+@contact: pawel.sobkowiak@gmail.com
+Copyright © 2011 Paweł Sobkowiak
+
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy
+
+from .fractal_array import (
+    GENERATORS,
+    ArraySquareDiamondFractalGenerator,
+    restore_heightmap,
+)
+from .fractal_transforms import fit
+from .grain import CounterGrain
+
+# bump when generated maps change, so old entries are never used
+CACHE_VERSION = 2
+
+
+def _atomic_write(path, write):
+    """Calls write(fp) on temporary file and moves it to path when done"""
+    handle, temporary = tempfile.mkstemp(
+        dir=os.path.dirname(path), suffix='.tmp'
+    )
+    try:
+        with os.fdopen(handle, 'wb') as fp:
+            write(fp)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+class HeightmapCache(object):
+    """Content addressed cache of heightmaps of array generators.
+
+    Entries are keyed by hash of generator parameters. Heights are kept as
+    float32 (exact for diamond-square maps) or, with quantize, as int16
+    scaled to the range of the map. Uncompressed entries are loaded memory
+    mapped copy on write and converted back to the storage type of the
+    generator, so float32 maps start nearly for free. Maps changed after
+    generation (transforms, erosion, regions) are not stored. Every file is
+    written atomically and metadata goes last, so readers never see
+    partial entries. Least recently used entries are evicted when cache
+    grows over max_bytes.
+    """
+
+    def __init__(
+        self, directory, max_bytes=1 << 30, quantize=False, compress=False
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.quantize = quantize
+        self.compress = compress
+        os.makedirs(directory, exist_ok=True)
+
+    def key(
+        self,
+        cls,
+        size,
+        chaos,
+        seed,
+        wraped=True,
+        island=False,
+        grain=None,
+        amplitude=None,
+    ):
+        """Hex digest identifying heightmap of given parameters"""
+        grain_seed = grain.seed if isinstance(grain, CounterGrain) else grain
+        amplitude = cls.amplitude if amplitude is None else amplitude
+        params = (
+            CACHE_VERSION,
+            cls.__name__,
+            size,
+            float(chaos),
+            seed,
+            bool(wraped),
+            bool(island),
+            grain_seed,
+            float(amplitude),
+        )
+        params += (self.quantize, self.compress)
+        return hashlib.blake2b(
+            repr(params).encode(), digest_size=16
+        ).hexdigest()
+
+    def _path(self, key, extension):
+        return os.path.join(self.directory, key + extension)
+
+    def get(
+        self,
+        cls,
+        size,
+        chaos,
+        seed,
+        wraped=True,
+        island=False,
+        grain=None,
+        amplitude=None,
+    ):
+        """Returns cached generator or None"""
+        if seed is None:
+            return None
+        return self.load(
+            self.key(cls, size, chaos, seed, wraped, island, grain, amplitude)
+        )
+
+    def get_or_generate(
+        self,
+        size,
+        chaos,
+        seed,
+        wraped=True,
+        island=False,
+        grain=None,
+        cls=ArraySquareDiamondFractalGenerator,
+        amplitude=None,
+    ):
+        """Returns cached generator, generates and stores it on miss"""
+        generator = self.get(
+            cls, size, chaos, seed, wraped, island, grain, amplitude
+        )
+        if generator is None:
+            generator = cls(
+                size,
+                chaos,
+                seed,
+                wraped,
+                island,
+                grain=grain,
+                amplitude=amplitude,
+            )
+            self.put(generator)
+        return generator
+
+    def load(self, key):
+        """Generator of entry with given key or None"""
+        try:
+            with open(self._path(key, '.json')) as fp:
+                metadata = json.load(fp)
+            if metadata['compress']:
+                with numpy.load(self._path(key, '.npz')) as arrays:
+                    data = arrays['data']
+                    mask = arrays['mask'] if metadata['mask'] else None
+            else:
+                data = numpy.load(self._path(key, '.npy'), mmap_mode='c')
+                mask = (
+                    numpy.load(self._path(key, '.mask.npy'))
+                    if metadata['mask']
+                    else None
+                )
+        except (OSError, ValueError, KeyError):
+            # missing or evicted in the meantime
+            return None
+        os.utime(self._path(key, '.json'))
+        if metadata['scale'] is not None:
+            data = (
+                data * numpy.float32(metadata['scale'])
+                + numpy.float32(metadata['offset'])
+            ).astype(numpy.float32)
+        dtype = numpy.dtype(metadata['dtype'])
+        if data.dtype != dtype:
+            data = fit(data, dtype).astype(dtype)
+        return restore_heightmap(metadata, data, mask)
+
+    def put(self, generator):
+        """Stores heightmap of generator, returns its key
+
+        Only complete maps that were not changed after generation are
+        stored - keys tell only parameters of generation apart.
+        """
+        metadata = generator.metadata()
+        if metadata['modified']:
+            raise ValueError("heightmap was changed after generation")
+        if metadata.get('level', metadata['size']) < metadata['size']:
+            raise ValueError(
+                "heightmap of level %s is not complete (size %s)"
+                % (metadata['level'], metadata['size'])
+            )
+        key = self.key(
+            GENERATORS[metadata['class']],
+            metadata['size'],
+            metadata['chaos'],
+            metadata['seed'],
+            metadata['wraped'],
+            metadata['island'],
+            metadata['grain'],
+            metadata['amplitude'],
+        )
+        data = generator.to_array()
+        mask = generator._mask
+        metadata.update(compress=self.compress, scale=None, offset=None)
+        if self.quantize:
+            values = generator._values()
+            low, high = float(values.min()), float(values.max())
+            scale = (high - low) / 65535 or 1.0
+            data = numpy.rint((data - low) / scale) - 32768
+            data = numpy.clip(data, -32768, 32767).astype(numpy.int16)
+            metadata.update(scale=scale, offset=low + 32768 * scale)
+        else:
+            data = data.astype(numpy.float32)
+        if self.compress:
+            arrays = (
+                {'data': data} if mask is None else {'data': data, 'mask': mask}
+            )
+            _atomic_write(
+                self._path(key, '.npz'),
+                lambda fp: numpy.savez_compressed(fp, **arrays),
+            )
+        else:
+            _atomic_write(
+                self._path(key, '.npy'), lambda fp: numpy.save(fp, data)
+            )
+            if mask is not None:
+                _atomic_write(
+                    self._path(key, '.mask.npy'),
+                    lambda fp: numpy.save(fp, mask),
+                )
+        _atomic_write(
+            self._path(key, '.json'),
+            lambda fp: fp.write(json.dumps(metadata).encode()),
+        )
+        self.evict()
+        return key
+
+    def entries(self):
+        """Returns {key: (last use, bytes)} of complete entries"""
+        entries = {}
+        sizes = {}
+        for name in os.listdir(self.directory):
+            if name.endswith('.tmp'):
+                continue
+            key = name.split('.')[0]
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            sizes[key] = sizes.get(key, 0) + stat.st_size
+            if name.endswith('.json'):
+                entries[key] = stat.st_mtime
+        return {key: (used, sizes[key]) for key, used in entries.items()}
+
+    def remove(self, key):
+        # metadata first, so entry stops being visible before data disappear
+        for extension in ('.json', '.npy', '.mask.npy', '.npz'):
+            try:
+                os.unlink(self._path(key, extension))
+            except FileNotFoundError:
+                pass
+
+    def evict(self, max_bytes=None):
+        """Removes least recently used entries until cache fits max_bytes"""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for used, size in entries.values())
+        for key in sorted(entries, key=lambda key: entries[key][0]):
+            if total <= max_bytes:
+                break
+            self.remove(key)
+            total -= entries[key][1]
+
+    def clear(self):
+        self.evict(0)
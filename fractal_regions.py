@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+"""Regional regeneration of array fractal heightmaps.
+
+mallib: common library for mal projects
+@author: Paweł Sobkowiak
+@contact: pawel.sobkowiak@gmail.com
+Copyright © 2011 Paweł Sobkowiak
+
+A region is regenerated by a small generator covering it (2**k + 1 points
+wide) with every point outside of the region fixed to the current
+values, so the new region joins its surroundings seamlessly and only
+its own cost is paid.
+"""
+
+import random
+
+import numpy
+
+from . import tools
+from .fractal_array import (
+    ArrayHexFractalGenerator,
+    ArraySquareDiamondFractalGenerator,
+)
+
+
+def _scale_of_level(amplitude, chaos, level):
+    """Grain scale of diamond-square pass starting at level (see refine)"""
+    ratio = 2.0 ** (-chaos)
+    scale = amplitude
+    for index in range(level):
+        scale = int(scale * ratio)
+    return scale
+
+
+def _hex_board(width):
+    """Masks of points of hex board and of its interior"""
+    edge = (width - 1) // 2
+    xs, ys = numpy.meshgrid(
+        numpy.arange(width), numpy.arange(width), indexing='ij'
+    )
+    board = numpy.abs(xs - ys) <= edge
+    border = (
+        (xs == 0)
+        | (ys == 0)
+        | (xs == width - 1)
+        | (ys == width - 1)
+        | (numpy.abs(xs - ys) == edge)
+    )
+    return board, board & ~border
+
+
+class RegionEditor(object):
+    """Regenerates regions of array generator with new seed or chaos.
+
+    Only points of the region are written back to generator data (which
+    may be memory mapped). Every callback is called with generator and
+    (slice of rows, slice of columns) of every changed block, so caches
+    and meshes can be updated incrementally.
+    """
+
+    def __init__(self, generator, callbacks=()):
+        self.generator = generator
+        self.callbacks = list(callbacks)
+
+    def subscribe(self, callback):
+        self.callbacks.append(callback)
+
+    def _changed(self, index):
+        self.generator.reset_statistics()
+        self.generator._modify()
+        for callback in self.callbacks:
+            callback(self.generator, index)
+
+    def regenerate(self, x0, y0, x1, y1, seed=None, chaos=None):
+        """Regenerates points x0 <= x < x1, y0 <= y < y1 of square map.
+
+        Wraped maps repeat with period width - 1 (see sampling.sample) -
+        points around the region are taken across the edges and the
+        last row and column are kept equal to the first ones, so the
+        region may not cover the whole period.
+        """
+        generator = self.generator
+        if not isinstance(generator, ArraySquareDiamondFractalGenerator):
+            raise TypeError('rectangular regions need square diamond generator')
+        if generator.level < generator.size:
+            raise ValueError(
+                'heightmap of level %s is not complete (size %s)'
+                % (generator.level, generator.size)
+            )
+        width = generator.width
+        if not (0 <= x0 < x1 <= width and 0 <= y0 < y1 <= width):
+            raise ValueError(
+                'region (%s, %s, %s, %s) is outside of map' % (x0, y0, x1, y1)
+            )
+        if generator.wraped and max(x1 - x0, y1 - y0) >= width - 1:
+            raise ValueError(
+                'region (%s, %s, %s, %s) covers whole period of wraped map'
+                % (x0, y0, x1, y1)
+            )
+        seed = seed if seed is not None else tools.make_seed()
+        chaos = generator.chaos if chaos is None else chaos
+        # the smallest window keeping one fixed point around the region
+        size = 1
+        while 2**size + 1 < max(x1 - x0, y1 - y0) + 2 and size < generator.size:
+            size += 1
+        length = 2**size + 1
+        if generator.wraped:
+            wx, wy = x0 - 1, y0 - 1
+            window = numpy.ix_(
+                numpy.arange(wx, wx + length) % (width - 1),
+                numpy.arange(wy, wy + length) % (width - 1),
+            )
+        else:
+            wx = min(max(x0 - 1, 0), width - length)
+            wy = min(max(y0 - 1, 0), width - length)
+            window = (slice(wx, wx + length), slice(wy, wy + length))
+        region = (slice(x0, x1), slice(y0, y1))
+
+        fixed = numpy.asarray(
+            generator.to_array()[window], dtype=numpy.float64
+        ).copy()
+        fixed[x0 - wx : x1 - wx, y0 - wy : y1 - wy] = numpy.nan
+        patch = ArraySquareDiamondFractalGenerator(
+            size,
+            chaos,
+            seed,
+            wraped=False,
+            dtype=generator.dtype,
+            fixed=fixed,
+            amplitude=_scale_of_level(
+                generator.amplitude, chaos, generator.size - size
+            ),
+        )
+        generator.to_array()[region] = patch.to_array()[
+            x0 - wx : x1 - wx, y0 - wy : y1 - wy
+        ]
+        self._changed(region)
+        if generator.wraped:
+            self._copy_edges(x0, y0, x1, y1)
+        return region
+
+    def _copy_edges(self, x0, y0, x1, y1):
+        """Copies edge points of region of wraped map to the opposite edge"""
+        data = self.generator.to_array()
+        last = self.generator.width - 1
+        rows = columns = None
+        if x0 == 0 or x1 == last + 1:
+            rows = (0, last) if x0 == 0 else (last, 0)
+            data[rows[1], y0:y1] = data[rows[0], y0:y1]
+            self._changed((slice(rows[1], rows[1] + 1), slice(y0, y1)))
+        if y0 == 0 or y1 == last + 1:
+            columns = (0, last) if y0 == 0 else (last, 0)
+            data[x0:x1, columns[1]] = data[x0:x1, columns[0]]
+            self._changed((slice(x0, x1), slice(columns[1], columns[1] + 1)))
+        if rows and columns:
+            # the opposite corner
+            data[rows[1], columns[1]] = data[rows[0], columns[0]]
+            self._changed(
+                (slice(rows[1], rows[1] + 1), slice(columns[1], columns[1] + 1))
+            )
+
+    def regenerate_hex(self, x, y, size, seed=None, chaos=None):
+        """Regenerates interior of hex board 2**size + 1 points wide at (x, y).
+
+        The board is in axial coordinates of hex generator and has to lie
+        on its board.
+        """
+        generator = self.generator
+        if not isinstance(generator, ArrayHexFractalGenerator):
+            raise TypeError('hex regions need hex generator')
+        length = 2**size + 1
+        board, interior = _hex_board(length)
+        window = (slice(x, x + length), slice(y, y + length))
+        if (
+            size < 2
+            or x < 0
+            or y < 0
+            or x + length > generator.width
+            or y + length > generator.width
+        ):
+            raise ValueError(
+                'hex region of size %s at (%s, %s) is outside of map'
+                % (size, x, y)
+            )
+        if not generator._mask[window][board].all():
+            raise ValueError(
+                'hex region of size %s at (%s, %s) is outside of map'
+                % (size, x, y)
+            )
+        seed = seed if seed is not None else tools.make_seed()
+        chaos = generator.chaos if chaos is None else chaos
+        amplitude = generator.amplitude * 2.0 ** (
+            -chaos * (generator.size - size)
+        )
+
+        data = generator.to_array()
+        fixed = numpy.asarray(data[window], dtype=numpy.float64).copy()
+        fixed[~board | interior] = numpy.nan
+        # middle is a starting point of hex generator - it is displaced
+        # from average of corners like midpoints of the first step
+        edge = (length - 1) // 2
+        corners = (
+            (0, 0),
+            (edge, 0),
+            (0, edge),
+            (length - 1, length - 1),
+            (edge, length - 1),
+            (length - 1, edge),
+        )
+        grain = random.Random(seed).randint(-100, 100)
+        fixed[edge, edge] = (
+            sum(fixed[corner] for corner in corners) / len(corners)
+            + grain * amplitude
+        )
+        patch = ArrayHexFractalGenerator(
+            size,
+            chaos,
+            seed,
+            wraped=False,
+            dtype=generator.dtype,
+            fixed=fixed,
+            amplitude=amplitude,
+        )
+        block = data[window]
+        block[interior] = patch.to_array()[interior]
+        data[window] = block
+        changed = (slice(x + 1, x + length - 1), slice(y + 1, y + length - 1))
+        self._changed(changed)
+        return changed
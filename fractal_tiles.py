@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+"""On-demand tiled terrain of unlimited size.
+
+mallib: common library for mal projects
+@author: Paweł Sobkowiak
+@contact: pawel.sobkowiak@gmail.com
+Copyright © 2011 Paweł Sobkowiak
+
+Every tile is generated deterministically from (seed, tile coordinates).
+Values on tile borders depend only on border position, so tiles sharing
+a border compute it identically and join seamlessly.
+"""
+
+import hashlib
+import math
+import random
+from collections import OrderedDict
+
+import numpy
+
+from . import tools
+from .fractal_array import (
+    ArrayHexFractalGenerator,
+    ArraySquareDiamondFractalGenerator,
+)
+
+
+def hash_seed(*values):
+    """Stable 64 bit seed made of given values (same in every process)"""
+    return int.from_bytes(
+        hashlib.blake2b(repr(values).encode(), digest_size=8).digest(), 'little'
+    )
+
+
+def midpoint_displacement(first, last, length, chaos, randgen, scale, integer):
+    """Values along a line from first to last (both included).
+
+    Midpoint of every segment gets average of its ends plus grain
+    scaled by factor decreasing by 2**-chaos with every level.
+    """
+    values = [0] * (length + 1)
+    values[0], values[length] = first, last
+    ratio = 2.0 ** (-chaos)
+    stride = length // 2
+    while stride:
+        if integer:
+            scale = int(scale * ratio)
+        for i in range(stride, length, 2 * stride):
+            grain = randgen.randint(-100, 100)
+            if integer:
+                values[i] = (
+                    values[i - stride] + values[i + stride]
+                ) // 2 + scale * grain
+            else:
+                values[i] = (
+                    values[i - stride] + values[i + stride]
+                ) / 2 + grain * scale
+        if not integer:
+            scale *= ratio
+        stride >>= 1
+    return values
+
+
+class TiledTerrain(object):
+    """Terrain made of 2**size tiles generated on demand.
+
+    Tiles are diamond-square squares, or hexes from hexagonal generator
+    when hexagonal is set. At most cache_size tiles are kept in memory,
+    the least recently used are evicted first.
+    """
+
+    def __init__(
+        self, size, chaos, seed=None, hexagonal=False, cache_size=64, dtype=None
+    ):
+        self.size = size
+        self.chaos = chaos
+        self.seed = seed if seed is not None else tools.make_seed()
+        self.hexagonal = hexagonal
+        self.cache_size = cache_size
+        if dtype is None:
+            dtype = numpy.float64 if hexagonal else numpy.int64
+        self.dtype = dtype
+        self.width = 2**size + 1
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._tiles = OrderedDict()
+
+    def cache_info(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._tiles),
+            'max_size': self.cache_size,
+        }
+
+    def tile(self, tx, ty):
+        """Returns array generator of tile (tx, ty) - cached or generated"""
+        key = (tx, ty)
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self.hits += 1
+            self._tiles.move_to_end(key)
+            return tile
+        self.misses += 1
+        tile = self._make_tile(tx, ty)
+        self._tiles[key] = tile
+        if len(self._tiles) > self.cache_size:
+            self._tiles.popitem(last=False)
+            self.evictions += 1
+        return tile
+
+    def get_value(self, xy):
+        """Height at global point xy"""
+        tx, ty, x, y = self.locate(xy)
+        return self.tile(tx, ty).get_value((x, y))
+
+    ####################### SQUARE TILES #######################
+    def _square_corner(self, x, y):
+        randgen = random.Random(hash_seed(self.seed, 'corner', x, y))
+        return 1000 * randgen.randint(-100, 100)
+
+    def _square_edge(self, x, y, dx, dy):
+        """Values of tile edge from global (x, y) in direction (dx, dy)"""
+        length = self.width - 1
+        first = self._square_corner(x, y)
+        last = self._square_corner(x + dx * length, y + dy * length)
+        randgen = random.Random(hash_seed(self.seed, 'edge', x, y, dx, dy))
+        return midpoint_displacement(
+            first, last, length, self.chaos, randgen, 1000, True
+        )
+
+    def _make_square_tile(self, tx, ty):
+        length = self.width - 1
+        x0, y0 = tx * length, ty * length
+        fixed = numpy.full((self.width, self.width), numpy.nan)
+        fixed[:, 0] = self._square_edge(x0, y0, 1, 0)
+        fixed[:, length] = self._square_edge(x0, y0 + length, 1, 0)
+        fixed[0, :] = self._square_edge(x0, y0, 0, 1)
+        fixed[length, :] = self._square_edge(x0 + length, y0, 0, 1)
+        return ArraySquareDiamondFractalGenerator(
+            self.size,
+            self.chaos,
+            hash_seed(self.seed, 'tile', tx, ty),
+            wraped=False,
+            dtype=self.dtype,
+            fixed=fixed,
+        )
+
+    ####################### HEX TILES #######################
+    # Hex board of side e = 2**(size-1) in axial coordinates has vertices
+    # (0,0) (e,0) (2e,e) (2e,2e) (e,2e) (0,e); boards tile the plane
+    # with translations (2e,e) and (e,2e).
+
+    def _hex_vertices(self):
+        e = (self.width - 1) // 2
+        return ((0, 0), (e, 0), (2 * e, e), (2 * e, 2 * e), (e, 2 * e), (0, e))
+
+    def _hex_origin(self, tx, ty):
+        e = (self.width - 1) // 2
+        return (tx * 2 * e + ty * e, tx * e + ty * 2 * e)
+
+    def _hex_corner(self, x, y):
+        randgen = random.Random(hash_seed(self.seed, 'corner', x, y))
+        return randgen.randint(-100, 100)
+
+    def _hex_edge(self, start, end):
+        """Values of tile edge from global start to end vertex"""
+        # edge is generated always in the same direction - from lower vertex
+        reverse = end < start
+        if reverse:
+            start, end = end, start
+        length = (self.width - 1) // 2
+        first = self._hex_corner(*start)
+        last = self._hex_corner(*end)
+        randgen = random.Random(hash_seed(self.seed, 'edge', start, end))
+        ratio = 2.0 ** (-self.chaos)
+        values = midpoint_displacement(
+            first, last, length, self.chaos, randgen, 1.0 / ratio, False
+        )
+        return values[::-1] if reverse else values
+
+    def _make_hex_tile(self, tx, ty):
+        ox, oy = self._hex_origin(tx, ty)
+        vertices = self._hex_vertices()
+        length = (self.width - 1) // 2
+        fixed = numpy.full((self.width, self.width), numpy.nan)
+        for index, (x, y) in enumerate(vertices):
+            nx, ny = vertices[(index + 1) % len(vertices)]
+            dx, dy = (nx - x) // length, (ny - y) // length
+            values = self._hex_edge((ox + x, oy + y), (ox + nx, oy + ny))
+            for i, value in enumerate(values):
+                fixed[x + dx * i, y + dy * i] = value
+        return ArrayHexFractalGenerator(
+            self.size,
+            self.chaos,
+            hash_seed(self.seed, 'tile', tx, ty),
+            dtype=self.dtype,
+            fixed=fixed,
+        )
+
+    def _make_tile(self, tx, ty):
+        if self.hexagonal:
+            return self._make_hex_tile(tx, ty)
+        return self._make_square_tile(tx, ty)
+
+    def _in_hex(self, x, y):
+        e = (self.width - 1) // 2
+        return 0 <= x <= 2 * e and 0 <= y <= 2 * e and abs(x - y) <= e
+
+    def locate(self, xy):
+        """Returns (tx, ty, x, y) - tile holding global point and local point"""
+        x, y = int(xy[0]), int(xy[1])
+        length = self.width - 1
+        if not self.hexagonal:
+            tx, ty = x // length, y // length
+            return tx, ty, x - tx * length, y - ty * length
+        e = length // 2
+        # invert translations to get approximate tile, then check around it
+        px, py = x - e, y - e
+        fx = (2 * px - py) / (3.0 * e)
+        fy = (2 * py - px) / (3.0 * e)
+        base_x, base_y = int(math.floor(fx)), int(math.floor(fy))
+        for tx in (base_x, base_x + 1, base_x - 1, base_x + 2):
+            for ty in (base_y, base_y + 1, base_y - 1, base_y + 2):
+                ox, oy = self._hex_origin(tx, ty)
+                if self._in_hex(x - ox, y - oy):
+                    return tx, ty, x - ox, y - oy
+        raise ValueError("point %s is not covered by any tile" % (xy,))
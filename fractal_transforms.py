@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+"""Vectorized statistics and transform pipeline for fractal heightmaps.
+
+mallib: common library for mal projects
+@author: Paweł Sobkowiak
+@contact: pawel.sobkowiak@gmail.com
+Copyright © 2011 Paweł Sobkowiak
+
+"""
+
+import numpy
+
+# number of array elements processed at once
+CHUNK_SIZE = 1 << 20
+
+
+def iter_chunks(values, chunk_size=CHUNK_SIZE):
+    """Yields (start, stop) of chunks along first axis of values"""
+    row_size = max(1, values[0].size) if values.ndim > 1 and len(values) else 1
+    rows = max(1, chunk_size // row_size)
+    for start in range(0, len(values), rows):
+        yield start, min(start + rows, len(values))
+
+
+def fit(values, dtype):
+    """Rounds and clips float values to integer dtype"""
+    dtype = numpy.dtype(dtype)
+    if dtype.kind not in 'iu':
+        return values
+    info = numpy.iinfo(dtype)
+    return numpy.clip(numpy.rint(values), info.min, info.max)
+
+
+class RunningStatistics(object):
+    """Mean and stdev of data seen chunk by chunk in a single pass.
+
+    Chunks are merged with Chan's parallel variant of Welford's algorithm,
+    so precision does not depend on how large the map is.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def update(self, values):
+        count = values.size
+        if not count:
+            return
+        mean = float(values.mean(dtype=numpy.float64))
+        m2 = float(numpy.square(values - mean, dtype=numpy.float64).sum())
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self._m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        low, high = values.min().item(), values.max().item()
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    @property
+    def stdev(self):
+        return (self._m2 / self.count) ** 0.5 if self.count else 0.0
+
+
+def statistics(values, chunk_size=CHUNK_SIZE):
+    """Returns RunningStatistics of whole array"""
+    stats = RunningStatistics()
+    for start, stop in iter_chunks(values, chunk_size):
+        stats.update(values[start:stop])
+    return stats
+
+
+class TransformPipeline(object):
+    """Chain of transforms applied to heightmap in one pass.
+
+    Elementwise steps (linear, power, clip) are fused and run chunk by chunk.
+    Steps depending on data (normalize, equalize, quantiles) need one extra
+    reading pass each, to learn statistics of data entering them.
+    Statistics of the result are computed during the writing pass.
+
+    >>> pipeline = TransformPipeline().normalize(0, 100).power(1.5, 50)
+    >>> pipeline = pipeline.clip(-300, None)
+    """
+
+    def __init__(self, bins=4096):
+        self.bins = bins
+        self._steps = []
+
+    def __len__(self):
+        return len(self._steps)
+
+    def linear(self, multiplier, shift):
+        self._steps.append(('linear', (multiplier, shift)))
+        return self
+
+    def power(
+        self,
+        power,
+        point_one=1,
+        calculate_positives=True,
+        calculate_negatives=False,
+    ):
+        """Power function - point_one is treated as argument=1"""
+        self._steps.append(
+            (
+                'power',
+                (
+                    power,
+                    float(point_one),
+                    calculate_positives,
+                    calculate_negatives,
+                ),
+            )
+        )
+        return self
+
+    def clip(self, low=None, high=None):
+        self._steps.append(('clip', (low, high)))
+        return self
+
+    def normalize(self, new_mean, new_stdev):
+        """Linear transform that sets new mean and stdev"""
+        self._steps.append(('normalize', (new_mean, new_stdev)))
+        return self
+
+    def equalize(self, low=0.0, high=1.0):
+        """Histogram equalization - spreads values evenly over low..high"""
+        self._steps.append(('equalize', (low, high)))
+        return self
+
+    def quantiles(self, levels):
+        """Piecewise linear transform mapping quantiles of data to values.
+
+        levels is a list of (quantile, value) pairs, eg. [(0, -1000),
+        (0.3, 0), (1, 3000)] makes 30% of map lie below 0.
+        """
+        levels = sorted(levels)
+        self._steps.append(
+            ('quantiles', ([q for q, v in levels], [v for q, v in levels]))
+        )
+        return self
+
+    @staticmethod
+    def _elementwise(name, args):
+        if name == 'linear':
+            multiplier, shift = args
+            return lambda block: numpy.add(
+                numpy.multiply(block, multiplier, out=block), shift, out=block
+            )
+        if name == 'clip':
+            low, high = args
+            return lambda block: numpy.clip(block, low, high, out=block)
+        if name == 'power':
+            power, point_one, positives, negatives = args
+
+            def power_function(block):
+                if positives:
+                    selected = block > 0
+                    block[selected] = (
+                        (block[selected] / point_one) ** power
+                    ) * point_one
+                if negatives:
+                    selected = block < 0
+                    block[selected] = (
+                        -((-block[selected] / point_one) ** power) * point_one
+                    )
+                return block
+
+            return power_function
+        if name == 'interp':
+            xs, ys = args
+            return lambda block: numpy.interp(block, xs, ys)
+        raise ValueError("unknown transform %s" % name)
+
+    def _run(self, values, functions, chunk_size, out=None):
+        """Passes values through functions - writes to out if given"""
+        stats = RunningStatistics()
+        for start, stop in iter_chunks(values, chunk_size):
+            block = numpy.array(values[start:stop], dtype=numpy.float64)
+            for function in functions:
+                block = function(block)
+            stats.update(block)
+            if out is not None:
+                out[start:stop] = fit(block, out.dtype)
+        return stats
+
+    def _histogram(self, values, functions, chunk_size, low, high):
+        """Cumulative distribution of values passed through functions"""
+        counts = numpy.zeros(self.bins, dtype=numpy.int64)
+        if high <= low:
+            high = low + 1
+        for start, stop in iter_chunks(values, chunk_size):
+            block = numpy.array(values[start:stop], dtype=numpy.float64)
+            for function in functions:
+                block = function(block)
+            counts += numpy.histogram(block, self.bins, (low, high))[0]
+        edges = numpy.linspace(low, high, self.bins + 1)
+        cdf = numpy.concatenate(
+            ([0.0], numpy.cumsum(counts) / max(1, counts.sum()))
+        )
+        return edges, cdf
+
+    def resolve(self, values, chunk_size=CHUNK_SIZE):
+        """Turns data dependent steps into elementwise functions"""
+        functions = []
+        for name, args in self._steps:
+            if name == 'normalize':
+                stats = self._run(values, functions, chunk_size)
+                new_mean, new_stdev = args
+                ratio = float(new_stdev) / stats.stdev if stats.stdev else 1.0
+                name, args = 'linear', (ratio, new_mean - stats.mean * ratio)
+            elif name in ('equalize', 'quantiles'):
+                stats = self._run(values, functions, chunk_size)
+                edges, cdf = self._histogram(
+                    values, functions, chunk_size, stats.min, stats.max
+                )
+                if name == 'equalize':
+                    low, high = args
+                    name, args = 'interp', (edges, low + cdf * (high - low))
+                else:
+                    levels, targets = args
+                    name, args = 'interp', (
+                        numpy.interp(levels, cdf, edges),
+                        targets,
+                    )
+            functions.append(self._elementwise(name, args))
+        return functions
+
+    def apply_array(self, values, out=None, chunk_size=CHUNK_SIZE):
+        """Transforms array - returns (result, RunningStatistics of result)"""
+        functions = self.resolve(values, chunk_size)
+        if out is None:
+            out = numpy.empty(values.shape, dtype=numpy.float64)
+        stats = self._run(values, functions, chunk_size, out)
+        return out, stats
+
+    def apply(self, generator, chunk_size=CHUNK_SIZE):
+        """Transforms data of array fractal generator in place
+
+        Memory mapped data are transformed chunk by chunk in the file
+        and keep their storage type.
+        """
+        if (
+            isinstance(generator._data, numpy.memmap)
+            and generator._mask is None
+        ):
+            stats = self.apply_array(
+                generator._data, generator._data, chunk_size
+            )[1]
+            generator._data.flush()
+            generator._modify()
+        else:
+            values = generator._float_values()
+            out = values if values is generator._data else None
+            result, stats = self.apply_array(values, out, chunk_size)
+            generator._set_values(result)
+        if generator.dtype.kind == 'f':
+            generator.mean, generator.stdev = stats.mean, stats.stdev
+        else:
+            generator.reset_statistics()
+        return generator
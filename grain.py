@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""Counter based grain for fractal generators.
+
+mallib: common library for mal projects
+@author: Paweł Sobkowiak
+@contact: pawel.sobkowiak@gmail.com
+Copyright © 2011 Paweł Sobkowiak
+
+"""
+
+import hashlib
+
+import numpy
+
+MASK64 = (1 << 64) - 1
+# odd multipliers spreading coordinates and stream over 64 bits
+X_FACTOR = 0x9E3779B97F4A7C15
+Y_FACTOR = 0xC2B2AE3D27D4EB4F
+Z_FACTOR = 0xD6E8FEB86659FD93
+STREAM_FACTOR = 0x165667B19E3779F9
+
+# streams of grain - one point may need values of different kinds
+GRAIN = 0
+MIDDLE = 1
+BORDER = 2
+
+
+def _mix(value):
+    """splitmix64 finalizer of python int"""
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK64
+    return value ^ (value >> 31)
+
+
+def _mix_array(values):
+    """splitmix64 finalizer of numpy.uint64 array (wraps like _mix), in place"""
+    values ^= values >> numpy.uint64(30)
+    values *= numpy.uint64(0xBF58476D1CE4E5B9)
+    values ^= values >> numpy.uint64(27)
+    values *= numpy.uint64(0x94D049BB133111EB)
+    values ^= values >> numpy.uint64(31)
+    return values
+
+
+class CounterGrain(object):
+    """Grain computed from hash of seed and coordinates.
+
+    Unlike sequential random.Random stream, value of a point does not depend
+    on the order in which points are visited, so parts of a map may be
+    generated in any order, in parallel or again later.
+    """
+
+    def __init__(self, seed):
+        self.seed = seed
+        digest = hashlib.blake2b(
+            repr(('grain', seed)).encode(), digest_size=8
+        ).digest()
+        self._key = int.from_bytes(digest, 'little')
+
+    def value(self, x, y, low=-100, high=100, stream=GRAIN, z=0):
+        """Grain of single point - integer from low..high (inclusive)
+
+        z is the third coordinate of volumes.
+        """
+        counter = (
+            x * X_FACTOR + y * Y_FACTOR + z * Z_FACTOR + stream * STREAM_FACTOR
+        ) & MASK64
+        value = _mix(self._key ^ _mix(counter))
+        return low + ((value >> 32) * (high - low + 1) >> 32)
+
+    def values(self, xs, ys, low=-100, high=100, stream=GRAIN, zs=0):
+        """Grain of points in xs, ys (zs) - numpy.int64 array, same as value"""
+        values = numpy.asarray(xs, dtype=numpy.int64).astype(numpy.uint64)
+        values *= numpy.uint64(X_FACTOR)
+        values += numpy.asarray(ys, dtype=numpy.int64).astype(
+            numpy.uint64
+        ) * numpy.uint64(Y_FACTOR)
+        if numpy.any(zs):
+            values += numpy.asarray(zs, dtype=numpy.int64).astype(
+                numpy.uint64
+            ) * numpy.uint64(Z_FACTOR)
+        values += numpy.uint64(stream * STREAM_FACTOR & MASK64)
+        _mix_array(values)
+        values ^= numpy.uint64(self._key)
+        _mix_array(values)
+        values >>= numpy.uint64(32)
+        values *= numpy.uint64(high - low + 1)
+        values >>= numpy.uint64(32)
+        values = values.view(numpy.int64)
+        values += low
+        return values
+
+
+class CounterGrainDict(dict):
+    """Replacement of LazyGrainDict of dict generators using CounterGrain"""
+
+    def __init__(self, grain):
+        super().__init__()
+        self.grain = grain
+
+    def __missing__(self, key):
+        return self.grain.value(key[0], key[1])
+
+    def middle_grain(self, key):
+        return self.grain.value(key[0], key[1], -100, 100, MIDDLE)
+
+    def border_grain(self, key):
+        return self.grain.value(key[0], key[1], -100, -50, BORDER)
@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+"""Flow directions, depression filling and flow accumulation of heightmaps.
+
+mallib: common library for mal projects
+@author: Paweł Sobkowiak
+@contact: pawel.sobkowiak@gmail.com
+Copyright © 2011 Paweł Sobkowiak
+
+"""
+
+import heapq
+
+import numpy
+
+# 8 neighbours (dx, dy) of a cell and distances to them
+OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+DISTANCES = numpy.array([(dx * dx + dy * dy) ** 0.5 for dx, dy in OFFSETS])
+
+
+def _core(values):
+    """Cells of wraped map without the last row and column.
+
+    The last row and column are copies of the first ones, so the rest
+    repeats with period of its own width.
+    """
+    return values[:-1, :-1]
+
+
+def _mirrored(core):
+    """Wraped map of core cells - the first row and column added at the end"""
+    return numpy.pad(core, ((0, 1), (0, 1)), mode='wrap')
+
+
+def _shifted(values, dx, dy, wraped, fill):
+    """values[x + dx, y + dy] for every x, y - fill outside of map.
+
+    wraped may be a pair - wrapping of rows and of columns separately.
+    Wraped values repeat with period of their shape, see _core.
+    """
+    wrap_rows, wrap_columns = (
+        wraped if isinstance(wraped, tuple) else (wraped, wraped)
+    )
+    if wrap_rows:
+        values = numpy.roll(values, -dx, axis=0)
+        dx = 0
+    if wrap_columns:
+        values = numpy.roll(values, -dy, axis=1)
+        dy = 0
+    if not dx and not dy:
+        return values
+    result = numpy.full(values.shape, fill, dtype=values.dtype)
+    width, height = values.shape
+    result[
+        max(0, -dx) : width - max(0, dx), max(0, -dy) : height - max(0, dy)
+    ] = values[
+        max(0, dx) : width + min(0, dx) or None,
+        max(0, dy) : height + min(0, dy) or None,
+    ]
+    return result
+
+
+def _outlets(heights, wraped, sea_level):
+    """Cells where water leaves the map - border, sea or the lowest cell"""
+    if sea_level is not None:
+        outlets = heights <= sea_level
+    else:
+        outlets = numpy.zeros(heights.shape, dtype=bool)
+    if not wraped:
+        outlets[0, :] = outlets[-1, :] = outlets[:, 0] = outlets[:, -1] = True
+    elif not outlets.any():
+        outlets.flat[numpy.argmin(heights)] = True
+    return outlets
+
+
+def _drops(heights, wraped):
+    """(8, x, y) array of slopes towards every neighbour, -inf outside of map"""
+    values = numpy.asarray(heights, dtype=numpy.float64)
+    drops = numpy.empty((len(OFFSETS),) + values.shape)
+    for k, (dx, dy) in enumerate(OFFSETS):
+        drops[k] = (
+            values - _shifted(values, dx, dy, wraped, numpy.inf)
+        ) / DISTANCES[k]
+    return drops
+
+
+def _receivers(directions, shape, wraped):
+    """Flat indices of cells pointed by directions (-1 stays -1)"""
+    width, height = shape
+    xs, ys = numpy.divmod(numpy.arange(width * height).reshape(shape), height)
+    offsets = numpy.array(OFFSETS + ((0, 0),))
+    rx = xs + offsets[directions, 0]
+    ry = ys + offsets[directions, 1]
+    if wraped:
+        rx %= width
+        ry %= height
+    receivers = rx * height + ry
+    receivers[directions < 0] = -1
+    return receivers
+
+
+def flow_directions(
+    heights, wraped=False, sea_level=None, weighted=False, seed=None
+):
+    """Returns flat indices of receivers of water, -1 for outlets and pits.
+
+    Water goes down the steepest slope (D8). With weighted it goes to
+    a random lower neighbour with probability proportional to slope -
+    vectorized tools.choice_weighted_by_slope, seeded by seed. Wraped
+    maps repeat with period width - 1 (the last row and column equal
+    the first ones, see sampling.sample) - the last row and column get
+    receivers of the first ones and no cell sends water to them.
+    """
+    heights = numpy.asarray(heights)
+    if not wraped:
+        return _flow_directions(heights, False, sea_level, weighted, seed)
+    receivers = _flow_directions(
+        _core(heights), True, sea_level, weighted, seed
+    )
+    return _mirrored(_full_indices(receivers, heights.shape))
+
+
+def _full_indices(indices, shape):
+    """Flat indices of cells of core of wraped map in the map (-1 stays)"""
+    height = shape[1]
+    xs, ys = numpy.divmod(indices, height - 1)
+    return numpy.where(indices < 0, -1, xs * height + ys)
+
+
+def _flow_directions(heights, wraped, sea_level, weighted, seed):
+    drops = _drops(heights, wraped)
+    if weighted:
+        weights = numpy.maximum(drops, 0).reshape(len(OFFSETS), -1)
+        cumulated = numpy.cumsum(weights, axis=0)
+        total = cumulated[-1]
+        treshhold = numpy.random.default_rng(seed).random(total.shape) * total
+        directions = numpy.minimum(
+            (cumulated <= treshhold).sum(axis=0), len(OFFSETS) - 1
+        )
+        directions[total <= 0] = -1
+        directions = directions.reshape(heights.shape)
+    else:
+        directions = numpy.argmax(drops, axis=0)
+        directions[
+            numpy.take_along_axis(drops, directions[None], axis=0)[0] <= 0
+        ] = -1
+    directions[_outlets(heights, wraped, sea_level)] = -1
+    return _receivers(directions, heights.shape, wraped)
+
+
+def terminals(receivers):
+    """Flat index of the cell where water of every cell ends"""
+    flat = receivers.ravel()
+    result = numpy.where(flat < 0, numpy.arange(flat.size), flat)
+    while True:
+        following = result[result]
+        if numpy.array_equal(following, result):
+            return result.reshape(receivers.shape)
+        result = following
+
+
+def _neighbours(indices, shape, wraped):
+    """Yields flat indices of neighbours in every direction and valid mask"""
+    width, height = shape
+    xs, ys = numpy.divmod(indices, height)
+    for dx, dy in OFFSETS:
+        nx, ny = xs + dx, ys + dy
+        if wraped:
+            yield (nx % width) * height + ny % height, numpy.ones(
+                len(indices), dtype=bool
+            )
+        else:
+            valid = (nx >= 0) & (nx < width) & (ny >= 0) & (ny < height)
+            yield nx * height + ny, valid
+
+
+def _spill_levels(heights, basins, outlets, wraped):
+    """Water level of every basin (-inf for basins of outlets).
+
+    Priority flood over graph of basins - edge of two neighbouring basins
+    is the lowest pass between them.
+    """
+    flat = heights.ravel()
+    size = flat.size
+    cells = numpy.arange(size)
+    keys, passes = [], []
+    # every pair of neighbours is seen once - from its first cell
+    for (neighbours, valid), (dx, dy) in zip(
+        _neighbours(cells, heights.shape, wraped), OFFSETS
+    ):
+        if (dx, dy) < (0, 0):
+            continue
+        first = basins[valid]
+        second = basins[neighbours[valid]]
+        different = first != second
+        first, second = first[different], second[different]
+        keys.append(
+            numpy.minimum(first, second) * size + numpy.maximum(first, second)
+        )
+        passes.append(
+            numpy.maximum(
+                flat[valid][different], flat[neighbours[valid]][different]
+            )
+        )
+    keys, passes = numpy.concatenate(keys), numpy.concatenate(passes)
+    # the lowest pass of every pair of basins
+    order = numpy.argsort(keys, kind='stable')
+    keys, passes = keys[order], passes[order]
+    starts = numpy.flatnonzero(
+        numpy.concatenate(([True], keys[1:] != keys[:-1]))
+    )
+    lowest = numpy.minimum.reduceat(passes, starts) if len(starts) else passes
+    firsts, seconds = numpy.divmod(keys[starts], size)
+    edges = {}
+    for first, second, level in zip(
+        firsts.tolist(), seconds.tolist(), lowest.tolist()
+    ):
+        edges.setdefault(first, []).append((second, level))
+        edges.setdefault(second, []).append((first, level))
+    levels = {}
+    queue = [
+        (-numpy.inf, basin)
+        for basin in numpy.unique(basins[outlets.ravel()]).tolist()
+    ]
+    heapq.heapify(queue)
+    while queue:
+        level, basin = heapq.heappop(queue)
+        if basin in levels:
+            continue
+        levels[basin] = level
+        for neighbour, spill in edges.get(basin, ()):
+            if neighbour not in levels:
+                heapq.heappush(queue, (max(level, spill), neighbour))
+    return levels
+
+
+def _flat_distances(filled, outlets, wraped):
+    """Steps from every flat cell to a cell draining at the same height"""
+    shape = filled.shape
+    flat = ((_drops(filled, wraped).max(axis=0) <= 0) & ~outlets).ravel()
+    values = filled.ravel()
+    distances = numpy.zeros(values.size)
+    visited = ~flat
+    # cells draining next to flat cells of the same height
+    frontier = numpy.flatnonzero(~flat)
+    distance = 0
+    while len(frontier):
+        distance += 1
+        found = []
+        for neighbours, valid in _neighbours(frontier, shape, wraped):
+            neighbours = numpy.where(valid, neighbours, 0)
+            valid &= ~visited[neighbours] & (
+                values[neighbours] == values[frontier]
+            )
+            found.append(neighbours[valid])
+        frontier = numpy.unique(numpy.concatenate(found))
+        visited[frontier] = True
+        distances[frontier] = distance
+    return distances.reshape(shape)
+
+
+def fill_depressions(heights, wraped=False, sea_level=None, epsilon=1e-6):
+    """Returns float64 heights with pits filled up to their spill level.
+
+    Every cell gets a path to an outlet (border, cells under sea_level or
+    the lowest cell of wraped maps) that never goes up. Cells are grouped
+    into basins of pits by steepest descent and only the small graph
+    of basins is flooded cell by cell. With epsilon > 0 filled lakes and
+    other flats get slope of epsilon per cell towards their outlet, so
+    flow_directions finds a way out of every cell; epsilon should stay
+    below the smallest height step of the map divided by lake width.
+    Wraped maps - see flow_directions.
+    """
+    heights = numpy.asarray(heights)
+    if wraped:
+        return _mirrored(
+            _fill_depressions(_core(heights), True, sea_level, epsilon)
+        )
+    return _fill_depressions(heights, False, sea_level, epsilon)
+
+
+def _fill_depressions(heights, wraped, sea_level, epsilon):
+    filled = heights.astype(numpy.float64)
+    outlets = _outlets(heights, wraped, sea_level)
+    basins = terminals(
+        _flow_directions(heights, wraped, sea_level, False, None)
+    ).ravel()
+    levels = _spill_levels(filled, basins, outlets, wraped)
+    level_of = numpy.full(filled.size, -numpy.inf)
+    keys = numpy.array(list(levels.keys()), dtype=numpy.int64)
+    level_of[keys] = list(levels.values())
+    filled = numpy.maximum(filled, level_of[basins].reshape(filled.shape))
+    if epsilon:
+        filled += epsilon * _flat_distances(filled, outlets, wraped)
+    return filled
+
+
+def flow_accumulation(receivers, weights=None, wraped=False):
+    """Returns amount of water passing every cell (its own weight included).
+
+    Cells are processed in waves - cells with no unprocessed donors
+    pass their water down at once. Receivers of wraped maps (see
+    flow_directions) count the last row and column once - as the first
+    ones.
+    """
+    if wraped:
+        height = receivers.shape[1]
+        xs, ys = numpy.divmod(_core(receivers), height)
+        core = numpy.where(xs < 0, -1, xs * (height - 1) + ys)
+        weights = None if weights is None else _core(numpy.asarray(weights))
+        return _mirrored(flow_accumulation(core, weights))
+    flat = receivers.ravel()
+    size = flat.size
+    accumulated = (
+        numpy.ones(size)
+        if weights is None
+        else numpy.array(weights, dtype=numpy.float64).ravel()
+    )
+    flowing = flat >= 0
+    donors = numpy.bincount(flat[flowing], minlength=size)
+    wave = numpy.flatnonzero(donors == 0)
+    while len(wave):
+        wave = wave[flowing[wave]]
+        targets = flat[wave]
+        numpy.add.at(accumulated, targets, accumulated[wave])
+        numpy.subtract.at(donors, targets, 1)
+        targets = numpy.unique(targets)
+        wave = targets[donors[targets] == 0]
+    return accumulated.reshape(receivers.shape)
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+"""Coherent noise terrain evaluated at any point.
+
+mallib: common library for mal projects
+@author: Paweł Sobkowiak
+@contact: pawel.sobkowiak@gmail.com
+Copyright © 2011 Paweł Sobkowiak
+
+"""
+
+import math
+
+import numpy
+
+from . import tools
+from .fractal_transforms import TransformPipeline, statistics
+from .grain import CounterGrain
+
+# gradients of noise lattice - unit vectors in evenly spread directions
+GRADIENTS = numpy.array(
+    [
+        (numpy.cos(angle), numpy.sin(angle))
+        for angle in numpy.arange(16) * numpy.pi / 8
+    ],
+    dtype=numpy.float64,
+)
+_GRADIENTS = GRADIENTS.tolist()
+# grain streams used by noise - octave is added to NOISE_STREAM
+NOISE_STREAM = 16
+SAMPLE_STREAM = 15
+
+
+def _fade(values):
+    """Perlin's smootherstep 6t^5 - 15t^4 + 10t^3"""
+    return values * values * values * (values * (values * 6 - 15) + 10)
+
+
+class NoiseTerrain(object):
+    """Octave gradient noise heights - no grid is precomputed.
+
+    Heights of any points, however sparse or far apart, are evaluated on
+    demand with get_value or in batches with values. Octave k has lattice
+    period / 2**k points wide and amplitude scaled by 2**(-chaos * k), like
+    successive passes of diamond-square. Gradients are hashed from seed
+    and lattice coordinates (grain.CounterGrain).
+
+    Statistics are estimated on a fixed sample of sample_size points;
+    transforms are kept and applied to every evaluated height.
+    """
+
+    # lattice width of the first octave - default of period
+    period = 256
+
+    def __init__(
+        self,
+        octaves,
+        chaos,
+        seed=None,
+        period=None,
+        amplitude=1000,
+        sample_size=1 << 16,
+    ):
+        self.octaves = octaves
+        self.chaos = chaos
+        self.seed = seed if seed is not None else tools.make_seed()
+        if period is not None:
+            self.period = period
+        self.amplitude = amplitude
+        self.sample_size = sample_size
+
+        # prepare placeholders for statistics data
+        self.mean = None
+        self.stdev = None
+
+        self._grain = CounterGrain(self.seed)
+        # elementwise functions of applied transforms
+        self._functions = []
+        self._sample = None
+
+    def _noise(self, xs, ys, octave):
+        """Gradient noise of lattice with unit cells at points xs, ys"""
+        x0, y0 = numpy.floor(xs), numpy.floor(ys)
+        fx, fy = xs - x0, ys - y0
+        x0, y0 = x0.astype(numpy.int64), y0.astype(numpy.int64)
+        corners = []
+        for dx, dy in ((0, 0), (1, 0), (0, 1), (1, 1)):
+            index = self._grain.values(
+                x0 + dx, y0 + dy, 0, len(GRADIENTS) - 1, NOISE_STREAM + octave
+            )
+            gradient = GRADIENTS[index]
+            corners.append(
+                gradient[:, 0] * (fx - dx) + gradient[:, 1] * (fy - dy)
+            )
+        u, v = _fade(fx), _fade(fy)
+        low = corners[0] + u * (corners[1] - corners[0])
+        high = corners[2] + u * (corners[3] - corners[2])
+        return low + v * (high - low)
+
+    def _raw_value(self, x, y):
+        """Height of single point - _raw_values without numpy overhead"""
+        total = 0.0
+        ratio = 2.0 ** (-self.chaos)
+        amplitude = float(self.amplitude)
+        frequency = 1.0 / self.period
+        last = len(GRADIENTS) - 1
+        for octave in range(self.octaves):
+            xs, ys = x * frequency, y * frequency
+            x0, y0 = math.floor(xs), math.floor(ys)
+            fx, fy = xs - x0, ys - y0
+            corners = []
+            for dx, dy in ((0, 0), (1, 0), (0, 1), (1, 1)):
+                gx, gy = _GRADIENTS[
+                    self._grain.value(
+                        x0 + dx, y0 + dy, 0, last, NOISE_STREAM + octave
+                    )
+                ]
+                corners.append(gx * (fx - dx) + gy * (fy - dy))
+            u, v = _fade(fx), _fade(fy)
+            low = corners[0] + u * (corners[1] - corners[0])
+            high = corners[2] + u * (corners[3] - corners[2])
+            total += amplitude * (low + v * (high - low))
+            amplitude *= ratio
+            frequency *= 2
+        return total
+
+    def _raw_values(self, xs, ys):
+        """Heights of points xs, ys - array of their broadcast shape"""
+        xs, ys = numpy.broadcast_arrays(
+            numpy.asarray(xs, dtype=numpy.float64),
+            numpy.asarray(ys, dtype=numpy.float64),
+        )
+        shape = xs.shape
+        xs, ys = xs.ravel(), ys.ravel()
+        total = numpy.zeros(len(xs), dtype=numpy.float64)
+        ratio = 2.0 ** (-self.chaos)
+        amplitude = float(self.amplitude)
+        frequency = 1.0 / self.period
+        for octave in range(self.octaves):
+            total += amplitude * self._noise(
+                xs * frequency, ys * frequency, octave
+            )
+            amplitude *= ratio
+            frequency *= 2
+        return total.reshape(shape)
+
+    def _apply(self, values):
+        """Passes raw values through applied transforms"""
+        for function in self._functions:
+            values = function(values)
+        return values
+
+    def values(self, xs, ys):
+        """Heights of points xs, ys (any floats) - numpy.float64 array"""
+        return self._apply(self._raw_values(xs, ys))
+
+    def get_value(self, xy):
+        value = self._raw_value(float(xy[0]), float(xy[1]))
+        if self._functions:
+            value = self._apply(numpy.array([value]))[0].item()
+        return value
+
+    def _sample_points(self, dimensions=2):
+        """Coordinates of fixed sample of points spread over many periods"""
+        span = self.period * 64
+        counter = numpy.arange(self.sample_size)
+        return [
+            self._grain.values(counter, axis, 0, span - 1, SAMPLE_STREAM)
+            for axis in range(dimensions)
+        ]
+
+    def _sample_values(self):
+        if self._sample is None:
+            self._sample = self._raw_values(*self._sample_points())
+        return self._apply(self._sample.copy())
+
+    def statistics(self):
+        if self.mean is None or self.stdev is None:
+            stats = statistics(self._sample_values())
+            self.mean = stats.mean
+            self.stdev = stats.stdev
+
+        return {
+            'mean': self.mean,
+            'stdev': self.stdev,
+            'chaos': self.chaos,
+            'seed': self.seed,
+        }
+
+    def reset_statistics(self):
+        self.mean = None
+        self.stdev = None
+
+    def transform(self, new_mean, new_stdev):
+        """
+        Apply linear transform to noise that will set new mean and stdev
+        """
+        self.pipeline(TransformPipeline().normalize(new_mean, new_stdev))
+
+    def linear_transform(self, multipier, shift):
+        """
+        Apply linear transform to noise
+        """
+        self.pipeline(TransformPipeline().linear(multipier, shift))
+
+    def power_transform(
+        self,
+        power,
+        point_one=1,
+        calculate_positives=True,
+        calculate_negatives=False,
+    ):
+        """
+        Apply power function transformation to noise
+        point_one specifies which value should be treated as argument=1
+        for the power function
+        """
+        self.pipeline(
+            TransformPipeline().power(
+                power, point_one, calculate_positives, calculate_negatives
+            )
+        )
+
+    def pipeline(self, pipeline):
+        """Apply TransformPipeline - data dependent steps resolve on sample"""
+        self._functions.extend(pipeline.resolve(self._sample_values()))
+        self.reset_statistics()
+        return self
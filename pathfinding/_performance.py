@@ -8,14 +8,25 @@ Copyright © 2011 Paweł Sobkowiak
 
 """
 
+import functools
 import json
 import logging
 from optparse import OptionParser
 import os
+import random
 import sys
 import time
 
-from .finders import find_path, find_path_bisect_insort, find_path_heapq
+from .compact import CompactGraph, find_path_compact
+from .finders import (
+    find_path,
+    find_path_bisect_insort,
+    find_path_heapq,
+    find_paths,
+    NoPathFound,
+)
+from .ordering import ORDERINGS, reorder_exported
+from .overlays import CostOverlay
 from .sample import SampleXYZ, SampleConnection, SampleNode
 
 FIND_FUNCTIONS = {
@@ -42,9 +53,93 @@ def find_all_paths(sample, find_func):
     return time.time() - t0
 
 
-def main(path, repetitions, find_func):
+def find_all_paths_threaded(sample, find_func, threads):
+    pairs = [(src, dst) for src in sample for dst in sample]
+    t0 = time.time()
+    find_paths(pairs, find_func, max_workers=threads)
+    return time.time() - t0
+
+
+def thread_scaling(sample, repetitions, find_func, max_threads):
+    """Measures speedup of find_paths with growing number of threads"""
+    threads = 1
+    single = None
+    while threads <= max_threads:
+        best = min(
+            find_all_paths_threaded(sample, find_func, threads)
+            for index in range(repetitions)
+        )
+        if single is None:
+            single = best
+        print(
+            'threads=%i : %.3fs speedup=%.2f' % (threads, best, single / best)
+        )
+        threads *= 2
+
+
+def make_grid_data(size, sample_size=10, seed=0):
+    """Square grid graph in export_to_json format with rows in random order"""
+    randgen = random.Random(seed)
+    graph = []
+    for x in range(size):
+        for y in range(size):
+            row = [x, y, 0, []]
+            for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+                if 0 <= x + dx < size and 0 <= y + dy < size:
+                    row[3].append([x + dx, y + dy, 0, randgen.randint(1, 3)])
+            graph.append(row)
+    randgen.shuffle(graph)
+    sample = [row[:3] for row in randgen.sample(graph, sample_size)]
+    return {'graph': graph, 'sample': sample}
+
+
+def compact_expansion_throughput(data, repetitions, order=None):
+    """Measures expanded nodes per second of A* over CompactGraph"""
+    graph = CompactGraph.from_json(data)
+    if order:
+        t0 = time.time()
+        graph = graph.reordered(ORDERINGS[order](graph))
+        print('reordered by %s in %.3fs' % (order, time.time() - t0))
+    sample = [graph.id_of(xyz) for xyz in data['sample']]
+    for index in range(repetitions):
+        stats = {}
+        t0 = time.time()
+        for src in sample:
+            for dst in sample:
+                try:
+                    find_path_compact(graph, src, dst, stats=stats)
+                except NoPathFound:
+                    pass
+        elapsed = time.time() - t0
+        print(
+            index,
+            ': %.3fs expanded=%i %.0f nodes/s'
+            % (elapsed, stats['expanded'], stats['expanded'] / elapsed),
+        )
+
+
+def main(
+    path,
+    repetitions,
+    find_func,
+    threads=0,
+    order=None,
+    compact=False,
+    grid=0,
+    overlay=False,
+):
     find_func = FIND_FUNCTIONS[find_func]
-    data = json.load(open(path))
+    if overlay:
+        # measures overhead of cost overlay applied during expansion
+        find_func = functools.partial(
+            find_func, cost_function=CostOverlay(tag_multipliers={'water': 2})
+        )
+    data = make_grid_data(grid) if grid else json.load(open(path))
+    if compact:
+        compact_expansion_throughput(data, repetitions, order)
+        return
+    if order:
+        data = reorder_exported(data, order)
     graph = SimpleGraph()
     for node_data in data['graph']:
         xyz = SampleXYZ(*node_data[:3])
@@ -54,6 +149,9 @@ def main(path, repetitions, find_func):
             connection = SampleConnection(conn_node, conn_data[3])
             node.connections.append(connection)
     sample = [graph[SampleXYZ(*node)] for node in data['sample']]
+    if threads:
+        thread_scaling(sample, repetitions, find_func, threads)
+        return
     for index in range(repetitions):
         print(index, ':', find_all_paths(sample, find_func))
 
@@ -85,17 +183,73 @@ if __name__ == '__main__':
         help="choose find function implementation {}".format(list(FIND_FUNCTIONS.keys())),
         default="find_path",
     )
+    parser.add_option(
+        "-t",
+        "--threads",
+        type="int",
+        dest="threads",
+        help="measure scaling of find_paths with up to THREADS threads",
+        default=0,
+    )
+    parser.add_option(
+        "-o",
+        "--order",
+        type="str",
+        dest="order",
+        help="reorder nodes before measurement {}".format(
+            list(ORDERINGS.keys())
+        ),
+        default=None,
+    )
+    parser.add_option(
+        "-c",
+        "--compact",
+        action="store_true",
+        dest="compact",
+        help="measure A* expansion throughput on CompactGraph",
+        default=False,
+    )
+    parser.add_option(
+        "-g",
+        "--grid",
+        type="int",
+        dest="grid",
+        help="use generated GRID x GRID graph instead of a file",
+        default=0,
+    )
+    parser.add_option(
+        "--overlay",
+        action="store_true",
+        dest="overlay",
+        help="apply a CostOverlay during search",
+        default=False,
+    )
     (options, args) = parser.parse_args()
     if options.find_func not in FIND_FUNCTIONS:
         print("Incorrect find function.")
         parser.print_help()
     if options.verbose:
         logging.basicConfig(level=logging.DEBUG)
-    if len(args) < 1:
-        parser.print_usage()
-        sys.exit(1)
-    path = args[0]
-    if not os.path.exists(path):
-        print("File: %s does not exist" % path)
+    if options.order is not None and options.order not in ORDERINGS:
+        print("Incorrect ordering.")
+        parser.print_help()
         sys.exit(1)
-    main(path, options.repetitions, options.find_func)
+    path = None
+    if not options.grid:
+        if len(args) < 1:
+            parser.print_usage()
+            sys.exit(1)
+        path = args[0]
+        if not os.path.exists(path):
+            print("File: %s does not exist" % path)
+            sys.exit(1)
+    main(
+        path,
+        options.repetitions,
+        options.find_func,
+        options.threads,
+        options.order,
+        options.compact,
+        options.grid,
+        options.overlay,
+    )
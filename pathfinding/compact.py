@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+"""Compact array representation of pathfinding graphs.
+
+mallib: common library for mal projects
+@author: Paweł Sobkowiak
+@contact: pawel.sobkowiak@gmail.com
+Copyright © 2011 Paweł Sobkowiak
+
+"""
+
+from array import array
+import heapq
+
+from .constants import NOT_PASSABLE
+from .finders import NoPathFound
+from .sample import SampleConnection, SampleXYZ
+from .tools import walk_graph
+
+
+class CompactGraph(object):
+    """Graph stored in flat arrays (compressed sparse rows).
+
+    Nodes are identified by ids 0..len(graph)-1.
+    Connections of node i are slots offsets[i]..offsets[i+1]-1
+    of targets and costs arrays.
+    nodes optionally keeps original node objects (indexed by id).
+    heuristic_scale scales manhattan heuristic of find_path_compact,
+    graphs with cheaper moves than manhattan distance need it below 1.
+    """
+
+    heuristic_scale = 1
+
+    def __init__(
+        self, xs, ys, zs, offsets, targets, costs, nodes=None, original_ids=None
+    ):
+        self.xs = xs
+        self.ys = ys
+        self.zs = zs
+        self.offsets = offsets
+        self.targets = targets
+        self.costs = costs
+        self.nodes = nodes
+        # ids of nodes in graph this one was reordered from
+        self.original_ids = original_ids
+        self._ids = None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @classmethod
+    def from_graph(cls, entry_node, only_passable=True):
+        """Builds compact graph of nodes reachable from entry_node"""
+        nodes = list(walk_graph(entry_node, only_passable))
+        ids = {node: index for index, node in enumerate(nodes)}
+        xs, ys, zs = array('d'), array('d'), array('d')
+        offsets, targets, costs = array('q', [0]), array('q'), array('d')
+        for node in nodes:
+            x, y, z = node.xyz
+            xs.append(x)
+            ys.append(y)
+            zs.append(z)
+            for connection in node.connections:
+                if not connection.cost or connection.destination not in ids:
+                    continue
+                targets.append(ids[connection.destination])
+                costs.append(connection.cost)
+            offsets.append(len(targets))
+        return cls(xs, ys, zs, offsets, targets, costs, nodes)
+
+    @classmethod
+    def from_json(cls, data):
+        """Builds compact graph from data of tools.export_to_json"""
+        ids = {}
+        for row in data['graph']:
+            ids[tuple(row[:3])] = len(ids)
+        xs, ys, zs = array('d'), array('d'), array('d')
+        offsets, targets, costs = array('q', [0]), array('q'), array('d')
+        for row in data['graph']:
+            xs.append(row[0])
+            ys.append(row[1])
+            zs.append(row[2])
+            for conn in row[3]:
+                target = ids.get(tuple(conn[:3]))
+                if target is not None and conn[3]:
+                    targets.append(target)
+                    costs.append(conn[3])
+            offsets.append(len(targets))
+        return cls(xs, ys, zs, offsets, targets, costs)
+
+    def xyz(self, index):
+        return SampleXYZ(self.xs[index], self.ys[index], self.zs[index])
+
+    def id_of(self, key):
+        """Returns id of node object or of its xyz tuple"""
+        if self._ids is None:
+            self._ids = {
+                tuple(self.xyz(index)): index for index in range(len(self))
+            }
+        return self._ids[tuple(getattr(key, 'xyz', key))]
+
+    def connections(self, index):
+        """Returns list of (target, cost) tuples of node with given id"""
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return list(zip(self.targets[start:end], self.costs[start:end]))
+
+    def reordered(self, order):
+        """Returns copy of graph with node ids given by order.
+
+        order lists current ids in their new sequence, it is kept
+        as original_ids of the new graph (mapping back to this graph ids).
+        """
+        new_ids = array('q', bytes(8 * len(self)))
+        for new_id, old_id in enumerate(order):
+            new_ids[old_id] = new_id
+        xs, ys, zs = array('d'), array('d'), array('d')
+        offsets, targets, costs = array('q', [0]), array('q'), array('d')
+        for old_id in order:
+            xs.append(self.xs[old_id])
+            ys.append(self.ys[old_id])
+            zs.append(self.zs[old_id])
+            start, end = self.offsets[old_id], self.offsets[old_id + 1]
+            targets.extend(
+                new_ids[target] for target in self.targets[start:end]
+            )
+            costs.extend(self.costs[start:end])
+            offsets.append(len(targets))
+        nodes = (
+            [self.nodes[old_id] for old_id in order]
+            if self.nodes is not None
+            else None
+        )
+        if self.original_ids is not None:
+            order = [self.original_ids[old_id] for old_id in order]
+        graph = CompactGraph(
+            xs, ys, zs, offsets, targets, costs, nodes, array('q', order)
+        )
+        graph.heuristic_scale = self.heuristic_scale
+        return graph
+
+
+def find_path_compact(
+    graph,
+    src,
+    dst,
+    max_nodes_checked=1000000,
+    stats=None,
+    cost_function=None,
+):
+    """A* over node ids of CompactGraph
+
+    Returns ids of path in find_path format (destination first, src excluded).
+    Number of expanded nodes is added to stats['expanded'] if stats is given.
+    cost_function(node, connection) may replace stored costs like in
+    find_path (see overlays module) - it gets node objects of graph.nodes
+    (eg. LazyNodes), which the graph needs then. Heuristic is scaled
+    by heuristic_scale of both graph and cost_function.
+    """
+    if src == dst:
+        return []
+    nodes = graph.nodes
+    if cost_function is not None and nodes is None:
+        raise ValueError('cost_function needs graph with nodes')
+    offsets, targets, costs = graph.offsets, graph.targets, graph.costs
+    xs, ys, zs = graph.xs, graph.ys, graph.zs
+    scale = graph.heuristic_scale * getattr(cost_function, 'heuristic_scale', 1)
+    dx, dy, dz = xs[dst], ys[dst], zs[dst]
+    heuristic = scale * (
+        abs(xs[src] - dx) + abs(ys[src] - dy) + abs(zs[src] - dz)
+    )
+    ### costs = { node: (g, parent), ... }
+    known = {src: (0, None)}
+    ### queue = [(g + h, g, node), ...] - ids compare, so no ties to break
+    queue = [(heuristic, 0, src)]
+    closed = set()
+    success = None
+    while queue:
+        node_f, node_g, node = heapq.heappop(queue)
+        if node in closed:
+            continue
+        if node == dst:
+            success = True
+            break
+        elif len(closed) > max_nodes_checked:
+            success = False
+            break
+        closed.add(node)
+        for index in range(offsets[node], offsets[node + 1]):
+            neighbour = targets[index]
+            if neighbour in closed:
+                continue
+            if cost_function is None:
+                cost = costs[index]
+            else:
+                cost = cost_function(
+                    nodes[node],
+                    SampleConnection(nodes[neighbour], costs[index]),
+                )
+                if cost == NOT_PASSABLE:
+                    continue
+            cost += node_g
+            old = known.get(neighbour)
+            if old is None or cost < old[0]:
+                known[neighbour] = (cost, node)
+                heuristic = scale * (
+                    abs(xs[neighbour] - dx)
+                    + abs(ys[neighbour] - dy)
+                    + abs(zs[neighbour] - dz)
+                )
+                heapq.heappush(queue, (cost + heuristic, cost, neighbour))
+    if stats is not None:
+        stats['expanded'] = stats.get('expanded', 0) + len(closed)
+    if success is None:
+        raise NoPathFound(
+            "opened list empty - find_path_compact(%s, %s)" % (src, dst)
+        )
+    path = []
+    parent = known[node][1]
+    while parent is not None:
+        path.append(node)
+        node = parent
+        parent = known[node][1]
+    return path
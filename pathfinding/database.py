@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+"""Compressed path database - precomputed first-move tables.
+
+mallib: common library for mal projects
+@author: Paweł Sobkowiak
+@contact: pawel.sobkowiak@gmail.com
+Copyright © 2011 Paweł Sobkowiak
+
+"""
+
+from array import array
+import bisect
+import heapq
+import logging
+import multiprocessing
+import struct
+import sys
+from time import time
+
+from .compact import CompactGraph
+from .finders import NoPathFound
+
+logger = logging.getLogger('malpath')
+
+MAGIC = b'MALPDB02'
+# magic, nodes, connections, runs, original ids (0 or nodes)
+HEADER = struct.Struct('<8sqqqq')
+# files of version 1 have no original ids
+MAGIC_V1 = b'MALPDB01'
+HEADER_V1 = struct.Struct('<8sqqq')
+NO_MOVE = -1
+
+
+def first_moves(graph, src):
+    """Runs Dijkstra from src and returns first move toward every node.
+
+    Move is a connection slot of src (0..degree-1), NO_MOVE for src itself
+    and for unreachable nodes.
+    """
+    offsets, targets, costs = graph.offsets, graph.targets, graph.costs
+    moves = [NO_MOVE] * len(graph)
+    distances = {src: 0}
+    closed = set()
+    start = offsets[src]
+    queue = []
+    for slot in range(offsets[src + 1] - start):
+        target = targets[start + slot]
+        cost = costs[start + slot]
+        if target != src and cost < distances.get(target, float('inf')):
+            distances[target] = cost
+            moves[target] = slot
+            heapq.heappush(queue, (cost, target))
+    closed.add(src)
+    while queue:
+        node_cost, node = heapq.heappop(queue)
+        if node in closed:
+            continue
+        closed.add(node)
+        move = moves[node]
+        for index in range(offsets[node], offsets[node + 1]):
+            target = targets[index]
+            if target in closed:
+                continue
+            cost = node_cost + costs[index]
+            if cost < distances.get(target, float('inf')):
+                distances[target] = cost
+                moves[target] = move
+                heapq.heappush(queue, (cost, target))
+    return moves
+
+
+def compress_row(moves):
+    """Run-length encodes first moves into (starts, moves) arrays"""
+    starts, values = array('q'), array('h')
+    previous = None
+    for index, move in enumerate(moves):
+        if move != previous:
+            starts.append(index)
+            values.append(move)
+            previous = move
+    return starts, values
+
+
+# graph shared with worker processes by pool initializer
+_worker_graph = None
+
+
+def _init_worker(graph):
+    global _worker_graph
+    _worker_graph = graph
+
+
+def _compress_sources(sources, graph=None):
+    if graph is None:
+        graph = _worker_graph
+    return [compress_row(first_moves(graph, src)) for src in sources]
+
+
+class PathDatabase(object):
+    """First-move tables of every node, compressed with run-length encoding.
+
+    Runs compress well when node ids of spatially close nodes are close,
+    so build it on a reordered graph (see ordering module).
+    Queries walk a path move by move with no search at all.
+    """
+
+    def __init__(self, graph, row_offsets, run_starts, run_moves):
+        self.graph = graph
+        self.row_offsets = row_offsets
+        self.run_starts = run_starts
+        self.run_moves = run_moves
+
+    @classmethod
+    def build(cls, graph, processes=1, chunk_size=64):
+        """Builds database of CompactGraph, optionally with process pool.
+
+        processes=None uses every available cpu.
+        """
+        start_time = time()
+        sources = range(len(graph))
+        chunks = [
+            sources[index : index + chunk_size]
+            for index in range(0, len(graph), chunk_size)
+        ]
+        if processes == 1:
+            results = (_compress_sources(chunk, graph) for chunk in chunks)
+            rows = [row for result in results for row in result]
+        else:
+            with multiprocessing.Pool(
+                processes, _init_worker, (graph,)
+            ) as pool:
+                rows = [
+                    row
+                    for result in pool.imap(_compress_sources, chunks)
+                    for row in result
+                ]
+        row_offsets, run_starts, run_moves = (
+            array('q', [0]),
+            array('q'),
+            array('h'),
+        )
+        for starts, moves in rows:
+            run_starts.extend(starts)
+            run_moves.extend(moves)
+            row_offsets.append(len(run_starts))
+        logger.debug(
+            "path database %.3f nodes=%i runs=%i",
+            time() - start_time,
+            len(graph),
+            len(run_starts),
+        )
+        return cls(graph, row_offsets, run_starts, run_moves)
+
+    def __len__(self):
+        return len(self.graph)
+
+    def first_move(self, src, dst):
+        """Returns connection slot of src leading toward dst or NO_MOVE"""
+        start, end = self.row_offsets[src], self.row_offsets[src + 1]
+        run = bisect.bisect_right(self.run_starts, dst, start, end) - 1
+        return self.run_moves[run]
+
+    def path_ids(self, src, dst):
+        """Returns list of node ids from src to dst (both included)"""
+        offsets, targets = self.graph.offsets, self.graph.targets
+        path = [src]
+        node = src
+        while node != dst:
+            move = self.first_move(node, dst)
+            if move == NO_MOVE or len(path) > len(self.graph):
+                raise NoPathFound(
+                    "no first move - PathDatabase.path_ids(%s, %s)" % (src, dst)
+                )
+            node = targets[offsets[node] + move]
+            path.append(node)
+        return path
+
+    def find_path(self, src, dst):
+        """Same as finders.find_path, but for nodes of graph.nodes"""
+        graph = self.graph
+        path = self.path_ids(graph.id_of(src), graph.id_of(dst))
+        if graph.nodes is None:
+            return [graph.xyz(index) for index in reversed(path[1:])]
+        return [graph.nodes[index] for index in reversed(path[1:])]
+
+    def save(self, path):
+        """Saves database together with its compact graph.
+
+        original_ids of reordered graph are saved too, so ids can still
+        be mapped to the original graph after load.
+        """
+        graph = self.graph
+        original_ids = (
+            array('q', graph.original_ids)
+            if graph.original_ids is not None
+            else array('q')
+        )
+        arrays = (
+            graph.xs,
+            graph.ys,
+            graph.zs,
+            graph.offsets,
+            graph.targets,
+            graph.costs,
+            self.row_offsets,
+            self.run_starts,
+            self.run_moves,
+            original_ids,
+        )
+        with open(path, 'wb') as fp:
+            fp.write(
+                HEADER.pack(
+                    MAGIC,
+                    len(graph),
+                    len(graph.targets),
+                    len(self.run_starts),
+                    len(original_ids),
+                )
+            )
+            for data in arrays:
+                if sys.byteorder == 'big':
+                    data = array(data.typecode, data)
+                    data.byteswap()
+                data.tofile(fp)
+
+    @classmethod
+    def load(cls, path, nodes=None):
+        """Loads database saved by save, nodes may restore node objects"""
+        with open(path, 'rb') as fp:
+            magic = fp.read(len(MAGIC))
+            fp.seek(0)
+            if magic == MAGIC:
+                magic, node_count, edge_count, run_count, id_count = (
+                    HEADER.unpack(fp.read(HEADER.size))
+                )
+            elif magic == MAGIC_V1:
+                magic, node_count, edge_count, run_count = HEADER_V1.unpack(
+                    fp.read(HEADER_V1.size)
+                )
+                id_count = 0
+            else:
+                raise ValueError("%s is not a path database file" % path)
+            layout = (
+                ('d', node_count),
+                ('d', node_count),
+                ('d', node_count),
+                ('q', node_count + 1),
+                ('q', edge_count),
+                ('d', edge_count),
+                ('q', node_count + 1),
+                ('q', run_count),
+                ('h', run_count),
+                ('q', id_count),
+            )
+            arrays = []
+            for typecode, count in layout:
+                data = array(typecode)
+                data.fromfile(fp, count)
+                if sys.byteorder == 'big':
+                    data.byteswap()
+                arrays.append(data)
+        graph = CompactGraph(
+            *arrays[:6], nodes=nodes, original_ids=arrays[9] or None
+        )
+        return cls(graph, *arrays[6:9])
@@ -8,12 +8,16 @@ Copyright © 2011 Paweł Sobkowiak
 
 """
 
+from array import array
 import bisect
+from concurrent.futures import ThreadPoolExecutor
+import itertools
 import logging
 import heapq
 from time import time
 
 from .constants import NOT_PASSABLE
+from .neighbours import node_connections
 
 logger = logging.getLogger('malpath')
 
@@ -28,26 +32,39 @@ class NoPathFound(Exception):
 #    return abs(x1 - x2) + abs(y1 - y2) + abs(z1 - z2)
 
 
-def find_path_bisect_insort(src, dst, max_nodes_checked=1000000):
-    """Implementation of A* algorithm"""
-    global logger
+def find_path_bisect_insort(
+    src, dst, max_nodes_checked=1000000, neighbours=None, cost_function=None
+):
+    """Implementation of A* algorithm
+
+    neighbours is an optional callable returning connections of given node,
+    it defaults to prebuilt node.connections.
+    cost_function(node, connection) may replace connection.cost
+    (see overlays module), its heuristic_scale (if any) scales heuristic
+    to keep it admissible for costs lowered by the function.
+    """
     if src == dst:
         return []
+    if neighbours is None:
+        neighbours = node_connections
     success = None
     start_time = time()
+    # sequence number breaks ties, so nodes never get compared
+    sequence = itertools.count()
 
+    scale = getattr(cost_function, 'heuristic_scale', 1)
     dx, dy, dz = dst.xyz
     x, y, z = src.xyz
-    heuristic = abs(x - dx) + abs(y - dy) + abs(z - dz)
+    heuristic = scale * (abs(x - dx) + abs(y - dy) + abs(z - dz))
     ### costs = { node: (g, h, parent), ... }
     costs = {src: (0, heuristic, None)}
-    ### queue = [(g + h, g, node), ...]
-    queue = [(heuristic, 0, src)]
+    ### queue = [(g + h, g, sequence, node), ...]
+    queue = [(heuristic, 0, next(sequence), src)]
     opened = {src}
     closed = set()
 
     while queue:
-        node_f, node_g, node = queue.pop(0)
+        node_f, node_g, _, node = queue.pop(0)
         # optimalization - it is better to check if node is already
         # in closed list, than to remove tuple from queue list
         if node in closed:
@@ -66,8 +83,12 @@ def find_path_bisect_insort(src, dst, max_nodes_checked=1000000):
         closed.add(node)
 
         # check every neighbouring nodes
-        for connection in node.connections:
-            cost = connection.cost
+        for connection in neighbours(node):
+            cost = (
+                connection.cost
+                if cost_function is None
+                else cost_function(node, connection)
+            )
             neighbour = connection.destination
             if cost == NOT_PASSABLE or neighbour in closed:
                 continue
@@ -77,13 +98,17 @@ def find_path_bisect_insort(src, dst, max_nodes_checked=1000000):
                 if cost < old_g:
                     # update node cost
                     costs[neighbour] = (cost, h, node)
-                    bisect.insort(queue, (cost + h, cost, neighbour))
+                    bisect.insort(
+                        queue, (cost + h, cost, next(sequence), neighbour)
+                    )
             else:
                 # add node to opened list
                 x, y, z = neighbour.xyz
-                heuristic = abs(x - dx) + abs(y - dy) + abs(z - dz)
+                heuristic = scale * (abs(x - dx) + abs(y - dy) + abs(z - dz))
                 costs[neighbour] = (cost, heuristic, node)
-                bisect.insort(queue, (cost + heuristic, cost, neighbour))
+                bisect.insort(
+                    queue, (cost + heuristic, cost, next(sequence), neighbour)
+                )
                 opened.add(neighbour)
 
     if success is None:
@@ -114,30 +139,43 @@ def find_path_bisect_insort(src, dst, max_nodes_checked=1000000):
     return path
 
 
-def find_path_heapq(src, dst, max_nodes_checked=1000000):
-    """Implementation of A* algorithm"""
-    global logger
+def find_path_heapq(
+    src, dst, max_nodes_checked=1000000, neighbours=None, cost_function=None
+):
+    """Implementation of A* algorithm
+
+    neighbours is an optional callable returning connections of given node,
+    it defaults to prebuilt node.connections.
+    cost_function(node, connection) may replace connection.cost
+    (see overlays module), its heuristic_scale (if any) scales heuristic
+    to keep it admissible for costs lowered by the function.
+    """
     if src == dst:
         return []
+    if neighbours is None:
+        neighbours = node_connections
     success = None
     start_time = time()
+    # sequence number breaks ties, so nodes never get compared
+    sequence = itertools.count()
 
     heappush = heapq.heappush
     heappop = heapq.heappop
 
+    scale = getattr(cost_function, 'heuristic_scale', 1)
     dx, dy, dz = dst.xyz
     x, y, z = src.xyz
-    heuristic = abs(x - dx) + abs(y - dy) + abs(z - dz)
+    heuristic = scale * (abs(x - dx) + abs(y - dy) + abs(z - dz))
     ### costs = { node: (g, h, parent), ... }
     costs = {src: (0, heuristic, None)}
-    ### queue = [(g + h, g, node), ...]
+    ### queue = [(g + h, g, sequence, node), ...]
     queue = []
-    heappush(queue, (heuristic, 0, src))
+    heappush(queue, (heuristic, 0, next(sequence), src))
     opened = {src}
     closed = set()
 
     while queue:
-        node_f, node_g, node = heappop(queue)
+        node_f, node_g, _, node = heappop(queue)
         # optimalization - it is better to check if node is already
         # in closed list, than to remove tuple from queue list
         if node in closed:
@@ -156,8 +194,12 @@ def find_path_heapq(src, dst, max_nodes_checked=1000000):
         closed.add(node)
 
         # check every neighbouring nodes
-        for connection in node.connections:
-            cost = connection.cost
+        for connection in neighbours(node):
+            cost = (
+                connection.cost
+                if cost_function is None
+                else cost_function(node, connection)
+            )
             neighbour = connection.destination
             if cost == NOT_PASSABLE or neighbour in closed:
                 continue
@@ -167,13 +209,15 @@ def find_path_heapq(src, dst, max_nodes_checked=1000000):
                 if cost < old_g:
                     # update node cost
                     costs[neighbour] = (cost, h, node)
-                    heappush(queue, (cost + h, cost, neighbour))
+                    heappush(queue, (cost + h, cost, next(sequence), neighbour))
             else:
                 # add node to opened list
                 x, y, z = neighbour.xyz
-                heuristic = abs(x - dx) + abs(y - dy) + abs(z - dz)
+                heuristic = scale * (abs(x - dx) + abs(y - dy) + abs(z - dz))
                 costs[neighbour] = (cost, heuristic, node)
-                heappush(queue, (cost + heuristic, cost, neighbour))
+                heappush(
+                    queue, (cost + heuristic, cost, next(sequence), neighbour)
+                )
                 opened.add(neighbour)
 
     if success is None:
@@ -204,21 +248,36 @@ def find_path_heapq(src, dst, max_nodes_checked=1000000):
     return path
 
 
-def find_nearest_targets(src, target_getter, count=1, max_distance=100000):
+def find_nearest_targets(
+    src,
+    target_getter,
+    count=1,
+    max_distance=100000,
+    neighbours=None,
+    cost_function=None,
+):
     """
     Uses Dijkstra algorithm to find nodes that have any target
     returned by given target getter
+
+    neighbours is an optional callable returning connections of given node,
+    it defaults to prebuilt node.connections.
+    cost_function(node, connection) may replace connection.cost
+    (see overlays module).
     """
-    global logger
+    if neighbours is None:
+        neighbours = node_connections
     destinations = []
     start_time = time()
+    # sequence number breaks ties, so nodes never get compared
+    sequence = itertools.count()
 
     costs = {src: (0, None)}
-    queue = [(0, src)]
+    queue = [(0, next(sequence), src)]
     opened = {src}
     closed = set()
     while queue:
-        node_cost, node = queue.pop(0)
+        node_cost, _, node = queue.pop(0)
         # optimalization - it is better to check if node is already
         # in closed list, than to remove touple from queue list
         if node in closed:
@@ -238,8 +297,12 @@ def find_nearest_targets(src, target_getter, count=1, max_distance=100000):
         closed.add(node)
 
         # check every neighbouring node
-        for connection in node.connections:
-            cost = connection.cost
+        for connection in neighbours(node):
+            cost = (
+                connection.cost
+                if cost_function is None
+                else cost_function(node, connection)
+            )
             neighbour = connection.destination
             if cost == NOT_PASSABLE or neighbour in closed:
                 continue
@@ -248,11 +311,11 @@ def find_nearest_targets(src, target_getter, count=1, max_distance=100000):
                 if cost < costs[neighbour][0]:
                     # update neighbour cost
                     costs[neighbour] = (cost, node)
-                    bisect.insort(queue, (cost, neighbour))
+                    bisect.insort(queue, (cost, next(sequence), neighbour))
             else:
                 # add to opened list
                 costs[neighbour] = (cost, node)
-                bisect.insort(queue, (cost, neighbour))
+                bisect.insort(queue, (cost, next(sequence), neighbour))
                 opened.add(neighbour)
 
     # backtracing paths
@@ -286,4 +349,152 @@ def find_nearest_targets(src, target_getter, count=1, max_distance=100000):
     return paths
 
 
+class ReachableSet(object):
+    """Result of find_reachable kept in compact arrays.
+
+    nodes[i] is reachable with total cost costs[i], parents[i] is index
+    of previous node on the cheapest path (-1 for the source).
+    Nodes are ordered by cost, so nodes[0] is the source.
+    """
+
+    def __init__(self, nodes, costs, parents):
+        self.nodes = nodes
+        self.costs = costs
+        self.parents = parents
+        self._index = None
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, node):
+        return node in self.index
+
+    @property
+    def index(self):
+        """Dictionary node -> position in arrays, built on first use"""
+        if self._index is None:
+            self._index = {
+                node: position for position, node in enumerate(self.nodes)
+            }
+        return self._index
+
+    def cost(self, node):
+        return self.costs[self.index[node]]
+
+    def path_to(self, node):
+        """Returns path in find_path format (destination first, no source)"""
+        path = []
+        position = self.index[node]
+        while self.parents[position] >= 0:
+            path.append(self.nodes[position])
+            position = self.parents[position]
+        return path
+
+
+def find_reachable(src, max_cost, neighbours=None, cost_function=None):
+    """
+    Uses bounded Dijkstra algorithm to find all nodes reachable
+    from src with total cost not greater than max_cost
+
+    neighbours and cost_function work the same as in find_path.
+    """
+    if neighbours is None:
+        neighbours = node_connections
+    start_time = time()
+    heappush = heapq.heappush
+    heappop = heapq.heappop
+
+    nodes = []
+    costs = array('d')
+    parents = array('q')
+    positions = {}
+    # best known costs of opened nodes
+    opened = {src: 0}
+    sequence = itertools.count()
+    ### queue = [(g, sequence, node, parent position), ...]
+    queue = [(0, next(sequence), src, -1)]
+    while queue:
+        node_cost, _, node, parent = heappop(queue)
+        if node in positions:
+            continue
+        position = positions[node] = len(nodes)
+        nodes.append(node)
+        costs.append(node_cost)
+        parents.append(parent)
+        for connection in neighbours(node):
+            cost = (
+                connection.cost
+                if cost_function is None
+                else cost_function(node, connection)
+            )
+            neighbour = connection.destination
+            if cost == NOT_PASSABLE or neighbour in positions:
+                continue
+            cost += node_cost
+            if cost > max_cost:
+                continue
+            old_cost = opened.get(neighbour)
+            if old_cost is None or cost < old_cost:
+                opened[neighbour] = cost
+                heappush(queue, (cost, next(sequence), neighbour, position))
+
+    reachable = ReachableSet(nodes, costs, parents)
+    reachable._index = positions
+    logger.debug(
+        "range %.3f from %s max_cost=%s reachable=%i",
+        time() - start_time,
+        src.xyz,
+        max_cost,
+        len(nodes),
+    )
+    return reachable
+
+
+def find_reachable_many(
+    sources, max_cost, max_workers=None, neighbours=None, cost_function=None
+):
+    """Runs find_reachable for many sources using a pool of threads.
+
+    max_cost may be a single value or a sequence with cost for every source.
+    Returns list of ReachableSet in order of sources.
+    """
+    sources = list(sources)
+    if hasattr(max_cost, '__len__'):
+        max_cost = list(max_cost)
+    else:
+        max_cost = [max_cost] * len(sources)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(
+            executor.map(
+                lambda src, cost: find_reachable(
+                    src, cost, neighbours, cost_function
+                ),
+                sources,
+                max_cost,
+            )
+        )
+
+
 find_path = find_path_bisect_insort
+
+
+def find_paths(pairs, find_func=None, max_workers=None, **kwargs):
+    """Finds paths for many (src, dst) pairs using a pool of threads.
+
+    Finders keep all search state local, so they can share one read-only
+    graph between threads (on free-threaded Python they run in parallel).
+    Extra keyword arguments are passed to find_func, which defaults
+    to find_path. Returns list of paths in order of given pairs,
+    with None for pairs that have no path.
+    """
+    if find_func is None:
+        find_func = find_path
+
+    def find(pair):
+        try:
+            return find_func(pair[0], pair[1], **kwargs)
+        except NoPathFound:
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(find, pairs))
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+"""Pathfinding graphs built from heightmap arrays.
+
+mallib: common library for mal projects
+@author: Paweł Sobkowiak
+@contact: pawel.sobkowiak@gmail.com
+Copyright © 2011 Paweł Sobkowiak
+
+"""
+
+from array import array
+
+import numpy
+
+from .compact import CompactGraph
+from .sample import SampleConnection, SampleNode
+
+SQUARE_OFFSETS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+DIAGONAL_OFFSETS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+# neighbours in axial coordinates of hex generators
+HEX_OFFSETS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, -1))
+
+
+def slope_cost(
+    base=1.0, climb=1.0, descent=1.0, max_climb=None, max_descent=None
+):
+    """Returns vectorized cost(z_from, z_to, distance) of moves.
+
+    Cost is base * distance plus climb per unit of height gained and
+    descent per unit lost; steeper moves than max_climb / max_descent
+    (height per unit of distance) are impassable (infinite cost).
+    With base, climb and descent of at least 1 no move is cheaper than
+    heuristic of finders (manhattan distance with z) scaled by
+    heuristic_scale of graphs of graph_from_heightmap, so it stays
+    admissible.
+    """
+
+    def cost(z_from, z_to, distance):
+        rise = z_to - z_from
+        costs = (
+            base * distance
+            + climb * numpy.maximum(rise, 0)
+            + descent * numpy.maximum(-rise, 0)
+        )
+        if max_climb is not None:
+            costs[rise > max_climb * distance] = numpy.inf
+        if max_descent is not None:
+            costs[-rise > max_descent * distance] = numpy.inf
+        return costs
+
+    return cost
+
+
+def _array(typecode, values):
+    result = array(typecode)
+    result.frombytes(
+        numpy.ascontiguousarray(
+            values, dtype='<q' if typecode == 'q' else '<d'
+        ).tobytes()
+    )
+    return result
+
+
+def graph_from_heightmap(
+    heights,
+    hexagonal=False,
+    mask=None,
+    passable=None,
+    cost=None,
+    diagonal=False,
+    wraped=False,
+    z_scale=1.0,
+    lazy_nodes=False,
+):
+    """Builds CompactGraph of heightmap array in one vectorized pass.
+
+    Every cell of mask (all cells by default) that is passable becomes
+    a node with xyz (x, y, height * z_scale), ids go in row-major order.
+    Square maps connect 4 neighbours (8 with diagonal), hexagonal maps
+    6 neighbours of axial coordinates. cost is a function like one
+    of slope_cost (default slope_cost()) - moves of infinite cost
+    are left out. With lazy_nodes graph.nodes creates node objects
+    for finders on demand (see LazyNodes).
+
+    Wraped maps repeat with period width - 1 (the last row and column
+    equal the first ones, see sampling.sample), so the last row and
+    column are left out.
+
+    graph.heuristic_scale keeps the manhattan heuristic of
+    find_path_compact admissible - diagonal moves cost sqrt(2) for
+    manhattan distance 2 (scale 1 / sqrt(2)), hexagonal moves (1, 1)
+    cost 1 (scale 0.5) and moves across edges of wraped maps join
+    nodes far apart in xyz (scale 0, Dijkstra search). Finders of node
+    objects take the scale from cost_function (see overlays module).
+    """
+    heights = numpy.asarray(heights)
+    width, height = heights.shape
+    cost = cost or slope_cost()
+    usable = (
+        numpy.ones(heights.shape, dtype=bool)
+        if mask is None
+        else numpy.array(mask, dtype=bool)
+    )
+    if passable is not None:
+        usable &= passable
+    if wraped:
+        usable[-1, :] = usable[:, -1] = False
+    ids = numpy.full(heights.shape, -1, dtype=numpy.int64)
+    cells = numpy.flatnonzero(usable)
+    ids.flat[cells] = numpy.arange(len(cells))
+    xs, ys = numpy.divmod(cells, height)
+    zs = heights.flat[cells].astype(numpy.float64) * z_scale
+    if hexagonal:
+        offsets = HEX_OFFSETS
+    else:
+        offsets = (
+            SQUARE_OFFSETS + DIAGONAL_OFFSETS if diagonal else SQUARE_OFFSETS
+        )
+    sources, targets, costs = [], [], []
+    for dx, dy in offsets:
+        nx, ny = xs + dx, ys + dy
+        if wraped:
+            nx, ny = nx % (width - 1), ny % (height - 1)
+            valid = numpy.ones(len(cells), dtype=bool)
+        else:
+            valid = (nx >= 0) & (nx < width) & (ny >= 0) & (ny < height)
+        neighbours = numpy.full(len(cells), -1, dtype=numpy.int64)
+        neighbours[valid] = ids[nx[valid], ny[valid]]
+        valid = neighbours >= 0
+        source = numpy.flatnonzero(valid)
+        target = neighbours[valid]
+        distance = 1.0 if hexagonal else (dx * dx + dy * dy) ** 0.5
+        move = cost(zs[source], zs[target], distance)
+        finite = numpy.isfinite(move)
+        sources.append(source[finite])
+        targets.append(target[finite])
+        costs.append(move[finite])
+    sources, targets, costs = (
+        numpy.concatenate(sources),
+        numpy.concatenate(targets),
+        numpy.concatenate(costs),
+    )
+    order = numpy.argsort(sources, kind='stable')
+    counts = numpy.bincount(sources, minlength=len(cells))
+    graph = CompactGraph(
+        _array('d', xs),
+        _array('d', ys),
+        _array('d', zs),
+        _array('q', numpy.concatenate(([0], numpy.cumsum(counts)))),
+        _array('q', targets[order]),
+        _array('d', costs[order]),
+    )
+    if wraped:
+        graph.heuristic_scale = 0
+    elif hexagonal:
+        graph.heuristic_scale = 0.5
+    elif diagonal:
+        graph.heuristic_scale = 0.5**0.5
+    if lazy_nodes:
+        graph.nodes = LazyNodes(graph)
+    return graph
+
+
+def graph_from_generator(generator, **kwargs):
+    """Builds CompactGraph of array fractal generator (hex or square)"""
+    kwargs.setdefault('hexagonal', generator._mask is not None)
+    kwargs.setdefault('mask', generator._mask)
+    return graph_from_heightmap(generator.to_array(), **kwargs)
+
+
+class LazyNode(SampleNode):
+    """Node of CompactGraph - connections are made when first used"""
+
+    def __init__(self, nodes, index):
+        super().__init__(nodes.graph.xyz(index))
+        self._nodes = nodes
+        self.index = index
+        self._connections = None
+
+    @property
+    def connections(self):
+        if self._connections is None:
+            self._connections = [
+                SampleConnection(self._nodes[target], cost)
+                for target, cost in self._nodes.graph.connections(self.index)
+            ]
+        return self._connections
+
+    @connections.setter
+    def connections(self, value):
+        self._connections = value
+
+
+class LazyNodes(object):
+    """Sequence of node objects of CompactGraph created on demand"""
+
+    def __init__(self, graph):
+        self.graph = graph
+        self._nodes = {}
+
+    def __len__(self):
+        return len(self.graph)
+
+    def __getitem__(self, index):
+        node = self._nodes.get(index)
+        if node is None:
+            if not 0 <= index < len(self.graph):
+                raise IndexError(index)
+            node = self._nodes[index] = LazyNode(self, index)
+        return node
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""Neighbour providers for finder functions.
+
+mallib: common library for mal projects
+@author: Paweł Sobkowiak
+@contact: pawel.sobkowiak@gmail.com
+Copyright © 2011 Paweł Sobkowiak
+
+"""
+
+from collections import OrderedDict
+import threading
+
+
+def node_connections(node):
+    """Default neighbour provider - returns prebuilt Node.connections"""
+    return node.connections
+
+
+class CachedNeighbours(object):
+    """Neighbour provider that generates connections on demand.
+
+    Wraps any callable provider(node) -> iterable of connections
+    and keeps at most max_size generated neighbourhoods in LRU order,
+    so memory stays proportional to the recently explored region.
+    Use max_size=None for an unbounded cache.
+    Nodes generated by provider have to be hashable and compare equal
+    when they represent the same place in the world.
+    Cache is guarded by a lock, so it can be shared by concurrent finders.
+    """
+
+    def __init__(self, provider, max_size=10000):
+        self.provider = provider
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, node):
+        cache = self._cache
+        with self._lock:
+            connections = cache.get(node)
+            if connections is not None:
+                self.hits += 1
+                cache.move_to_end(node)
+                return connections
+        # generate outside of the lock, so slow providers run in parallel
+        connections = tuple(self.provider(node))
+        with self._lock:
+            self.misses += 1
+            cache[node] = connections
+            if self.max_size is not None and len(cache) > self.max_size:
+                cache.popitem(last=False)
+        return connections
+
+    def __len__(self):
+        return len(self._cache)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
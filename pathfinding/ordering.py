@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+"""Node orderings improving memory locality of graph traversal.
+
+mallib: common library for mal projects
+@author: Paweł Sobkowiak
+@contact: pawel.sobkowiak@gmail.com
+Copyright © 2011 Paweł Sobkowiak
+
+Every ordering function returns list of node ids of CompactGraph
+in the new order, use CompactGraph.reordered to apply it.
+"""
+
+import collections
+
+CURVE_BITS = 16
+
+
+def _quantize(values, bits=CURVE_BITS):
+    """Maps coordinates to integers 0..2**bits-1"""
+    low = min(values) if len(values) else 0
+    high = max(values) if len(values) else 0
+    scale = ((1 << bits) - 1) / (high - low) if high > low else 0
+    return [int((value - low) * scale) for value in values]
+
+
+def morton_key(x, y, z, bits=CURVE_BITS):
+    """Interleaves bits of three integer coordinates (Z-order curve)"""
+    key = 0
+    for bit in range(bits):
+        key |= ((x >> bit) & 1) << (3 * bit + 2)
+        key |= ((y >> bit) & 1) << (3 * bit + 1)
+        key |= ((z >> bit) & 1) << (3 * bit)
+    return key
+
+
+def hilbert_key(x, y, bits=CURVE_BITS):
+    """Distance of integer point along 2D Hilbert curve"""
+    side = 1 << bits
+    key = 0
+    step = side >> 1
+    while step:
+        rx = 1 if x & step else 0
+        ry = 1 if y & step else 0
+        key += step * step * ((3 * rx) ^ ry)
+        if ry == 0:
+            if rx == 1:
+                x = side - 1 - x
+                y = side - 1 - y
+            x, y = y, x
+        step >>= 1
+    return key
+
+
+def morton_order(graph):
+    xs, ys, zs = _quantize(graph.xs), _quantize(graph.ys), _quantize(graph.zs)
+    keys = [morton_key(x, y, z) for x, y, z in zip(xs, ys, zs)]
+    return sorted(range(len(graph)), key=keys.__getitem__)
+
+
+def hilbert_order(graph):
+    """Hilbert curve over x, y - z only breaks ties (layers of a map)"""
+    xs, ys = _quantize(graph.xs), _quantize(graph.ys)
+    keys = [(hilbert_key(x, y), z) for x, y, z in zip(xs, ys, graph.zs)]
+    return sorted(range(len(graph)), key=keys.__getitem__)
+
+
+def _undirected(graph):
+    neighbours = [set() for _ in range(len(graph))]
+    offsets, targets = graph.offsets, graph.targets
+    for node in range(len(graph)):
+        for index in range(offsets[node], offsets[node + 1]):
+            target = targets[index]
+            if target != node:
+                neighbours[node].add(target)
+                neighbours[target].add(node)
+    return neighbours
+
+
+def bfs_order(graph, start=0):
+    """Breadth first order, unreached components follow by lowest id"""
+    neighbours = _undirected(graph)
+    order = []
+    visited = [False] * len(graph)
+    for root in [start] + list(range(len(graph))):
+        if visited[root]:
+            continue
+        visited[root] = True
+        queue = collections.deque([root])
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            for neighbour in sorted(neighbours[node]):
+                if not visited[neighbour]:
+                    visited[neighbour] = True
+                    queue.append(neighbour)
+    return order
+
+
+def rcm_order(graph):
+    """Reverse Cuthill-McKee order - minimizes bandwidth of adjacency"""
+    neighbours = _undirected(graph)
+    degree = [len(each) for each in neighbours]
+    order = []
+    visited = [False] * len(graph)
+    for root in sorted(range(len(graph)), key=degree.__getitem__):
+        if visited[root]:
+            continue
+        visited[root] = True
+        queue = collections.deque([root])
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            for neighbour in sorted(neighbours[node], key=degree.__getitem__):
+                if not visited[neighbour]:
+                    visited[neighbour] = True
+                    queue.append(neighbour)
+    order.reverse()
+    return order
+
+
+ORDERINGS = {
+    'morton': morton_order,
+    'hilbert': hilbert_order,
+    'bfs': bfs_order,
+    'rcm': rcm_order,
+}
+
+
+def reorder_exported(data, method='hilbert'):
+    """Reorders rows of tools.export_to_json data.
+
+    Returns new data with 'original_ids' - index of every row
+    in the original data.
+    """
+    from .compact import CompactGraph
+
+    order = ORDERINGS[method](CompactGraph.from_json(data))
+    return {
+        'graph': [data['graph'][index] for index in order],
+        'sample': data['sample'],
+        'original_ids': order,
+    }
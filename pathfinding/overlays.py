@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+"""Cost overlays - per-query connection costs over one shared graph.
+
+mallib: common library for mal projects
+@author: Paweł Sobkowiak
+@contact: pawel.sobkowiak@gmail.com
+Copyright © 2011 Paweł Sobkowiak
+
+Overlays are cost functions, pass them as cost_function to finders.
+"""
+
+from .constants import NOT_PASSABLE
+
+
+class _OverlayDict(dict):
+    """Dict telling its overlay about every change"""
+
+    def __init__(self, overlay, items):
+        super().__init__(items)
+        self._overlay = overlay
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._overlay._changed()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._overlay._changed()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self):
+        super().clear()
+        self._overlay._changed()
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        self._overlay._changed()
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        self._overlay._changed()
+        return item
+
+    def setdefault(self, key, default=None):
+        value = super().setdefault(key, default)
+        self._overlay._changed()
+        return value
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._overlay._changed()
+
+
+class CostOverlay(object):
+    """Changes connection costs without copying the graph.
+
+    overrides: {(node, destination): cost} replaces cost of connection,
+        also of not passable one (use NOT_PASSABLE to block connection).
+    multipliers: {(node, destination): multiplier} scales cost.
+    tag_multipliers: {tag: multiplier} scales cost of entering
+        destination tagged with tag (multiplier NOT_PASSABLE blocks it),
+        tags of destinations are read every time a cost is computed.
+    The dicts are copied - change them through attributes of overlay.
+
+    Multipliers below 1 and cheaper overrides make the manhattan heuristic
+    of find_path overestimate, so finders scale it by heuristic_scale.
+    """
+
+    def __init__(self, overrides=None, multipliers=None, tag_multipliers=None):
+        self._overrides = _OverlayDict(self, overrides or {})
+        self._multipliers = _OverlayDict(self, multipliers or {})
+        self._tag_multipliers = _OverlayDict(self, tag_multipliers or {})
+        self._changed()
+
+    def _changed(self):
+        """Drops values derived from costs of overlay"""
+        self._tags = frozenset(self._tag_multipliers)
+        self._heuristic_scale = None
+
+    @property
+    def overrides(self):
+        return self._overrides
+
+    @overrides.setter
+    def overrides(self, overrides):
+        self._overrides = _OverlayDict(self, overrides)
+        self._changed()
+
+    @property
+    def multipliers(self):
+        return self._multipliers
+
+    @multipliers.setter
+    def multipliers(self, multipliers):
+        self._multipliers = _OverlayDict(self, multipliers)
+        self._changed()
+
+    @property
+    def tag_multipliers(self):
+        return self._tag_multipliers
+
+    @tag_multipliers.setter
+    def tag_multipliers(self, tag_multipliers):
+        self._tag_multipliers = _OverlayDict(self, tag_multipliers)
+        self._changed()
+
+    @property
+    def heuristic_scale(self):
+        """The smallest ratio of overlay cost to graph cost (1 at most).
+
+        Graph costs are assumed to be at least the manhattan distance of
+        a move, overrides are compared to that distance. The value is
+        kept until costs of overlay change.
+        """
+        if self._heuristic_scale is None:
+            self._heuristic_scale = self._smallest_ratio()
+        return self._heuristic_scale
+
+    def _smallest_ratio(self):
+        scale = 1
+        factors = list(self.multipliers.values())
+        factors += [
+            m for m in self.tag_multipliers.values() if m is not NOT_PASSABLE
+        ]
+        if factors:
+            scale = min(scale, min(factors))
+        for (node, destination), cost in self.overrides.items():
+            distance = sum(
+                abs(a - b) for a, b in zip(node.xyz, destination.xyz)
+            )
+            if distance and cost is not NOT_PASSABLE:
+                scale = min(scale, cost / distance)
+        return max(scale, 0)
+
+    def __call__(self, node, connection):
+        destination = connection.destination
+        if self.overrides:
+            cost = self.overrides.get((node, destination))
+            if cost is not None:
+                return cost
+        cost = connection.cost
+        if cost == NOT_PASSABLE:
+            return cost
+        if self.multipliers:
+            cost *= self.multipliers.get((node, destination), 1)
+        if not self._tags.isdisjoint(destination.tags):
+            for tag in self._tags.intersection(destination.tags):
+                multiplier = self.tag_multipliers[tag]
+                if multiplier is NOT_PASSABLE:
+                    return NOT_PASSABLE
+                cost *= multiplier
+        return cost
+
+
+class UnitCostFunctions(dict):
+    """Maps unit class to its cost function.
+
+    Unknown unit classes get None, so finders use costs stored in graph.
+    """
+
+    def __missing__(self, unit_class):
+        return None
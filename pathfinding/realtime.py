@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+"""Real-time and anytime finders with bounded latency.
+
+mallib: common library for mal projects
+@author: Paweł Sobkowiak
+@contact: pawel.sobkowiak@gmail.com
+Copyright © 2011 Paweł Sobkowiak
+
+"""
+
+import heapq
+import itertools
+import logging
+
+from .constants import NOT_PASSABLE
+from .finders import NoPathFound
+from .neighbours import node_connections
+
+logger = logging.getLogger('malpath')
+
+
+def manhattan(node, dst):
+    x, y, z = node.xyz
+    dx, dy, dz = dst.xyz
+    return abs(x - dx) + abs(y - dy) + abs(z - dz)
+
+
+def _cost(cost_function, node, connection):
+    if cost_function is None:
+        return connection.cost
+    return cost_function(node, connection)
+
+
+def _scaled(heuristic, cost_function):
+    """heuristic scaled by heuristic_scale of cost_function (if any)"""
+    if not hasattr(cost_function, 'heuristic_scale'):
+        return heuristic
+    return lambda node, dst: (
+        cost_function.heuristic_scale * heuristic(node, dst)
+    )
+
+
+def _backtrace(costs, node):
+    """Returns path in finders format - from node back to first step"""
+    path = []
+    parent = costs[node][1]
+    while parent is not None:
+        path.append(node)
+        node = parent
+        parent = costs[node][1]
+    return path
+
+
+class RealTimeSearch(object):
+    """Real-time A* (RTAA*) with heuristic values learned across calls.
+
+    Every call expands at most lookahead nodes and returns path
+    to the most promising frontier node, so agent can start moving
+    immediately. Expanded nodes get their heuristic raised, which steers
+    next calls out of dead ends. Learned values are kept per destination.
+    cost_function(node, connection) may replace connection.cost like
+    in find_path (see overlays module).
+    """
+
+    def __init__(
+        self,
+        lookahead=100,
+        neighbours=None,
+        heuristic=manhattan,
+        cost_function=None,
+    ):
+        self.lookahead = lookahead
+        self.neighbours = (
+            neighbours if neighbours is not None else node_connections
+        )
+        self.heuristic = _scaled(heuristic, cost_function)
+        self.cost_function = cost_function
+        self.learned = {}
+
+    def forget(self, dst=None):
+        """Drops learned heuristic values (for one destination or all)"""
+        if dst is None:
+            self.learned.clear()
+        else:
+            self.learned.pop(dst, None)
+
+    def find_next_path(self, src, dst, lookahead=None):
+        """Returns (path, complete) where path leads toward dst.
+
+        Path is in find_path format - path[-1] is the first step.
+        complete is True when path reaches dst.
+        """
+        if src == dst:
+            return [], True
+        if lookahead is None:
+            lookahead = self.lookahead
+        learned = self.learned.setdefault(dst, {})
+        heuristic = self.heuristic
+
+        def h(node):
+            value = learned.get(node)
+            return value if value is not None else heuristic(node, dst)
+
+        sequence = itertools.count()
+        ### costs = { node: (g, parent), ... }
+        costs = {src: (0, None)}
+        ### queue = [(g + h, g, sequence, node), ...]
+        queue = [(h(src), 0, next(sequence), src)]
+        closed = []
+        closed_set = set()
+        while queue:
+            node_f, node_g, _, node = queue[0]
+            if node in closed_set or costs[node][0] != node_g:
+                heapq.heappop(queue)
+                continue
+            if node == dst:
+                return _backtrace(costs, node), True
+            if len(closed) >= lookahead:
+                break
+            heapq.heappop(queue)
+            closed.append(node)
+            closed_set.add(node)
+            for connection in self.neighbours(node):
+                cost = _cost(self.cost_function, node, connection)
+                neighbour = connection.destination
+                if cost == NOT_PASSABLE or neighbour in closed_set:
+                    continue
+                cost += node_g
+                if neighbour not in costs or cost < costs[neighbour][0]:
+                    costs[neighbour] = (cost, node)
+                    heapq.heappush(
+                        queue,
+                        (cost + h(neighbour), cost, next(sequence), neighbour),
+                    )
+        else:
+            logger.error(
+                "No path found - opened list empty - find_next_path(%s, %s)",
+                src,
+                dst,
+            )
+            raise NoPathFound(
+                "opened list empty - find_next_path(%s, %s)" % (src, dst)
+            )
+
+        # RTAA* update - h(s) = f(best) - g(s) for every expanded node
+        best_f = node_f
+        for expanded in closed:
+            learned[expanded] = best_f - costs[expanded][0]
+        return _backtrace(costs, node), False
+
+
+class AnytimeSearch(object):
+    """Resumable weighted A* between two nodes.
+
+    Each call to search expands at most max_nodes_checked nodes
+    and returns the best path known so far. Until destination is reached
+    that is a partial path to the node closest to it. Once a path is found
+    the weight is lowered and search is restarted, so later calls keep
+    improving the path until it is optimal (weight 1). cost_function
+    - see RealTimeSearch.
+    """
+
+    def __init__(
+        self,
+        src,
+        dst,
+        weight=2.0,
+        weight_step=0.5,
+        neighbours=None,
+        heuristic=manhattan,
+        cost_function=None,
+    ):
+        self.src = src
+        self.dst = dst
+        self.weight_step = weight_step
+        self.neighbours = (
+            neighbours if neighbours is not None else node_connections
+        )
+        self.heuristic = _scaled(heuristic, cost_function)
+        self.cost_function = cost_function
+        self.path = None
+        self.cost = None
+        self.optimal = src == dst
+        if self.optimal:
+            self.path, self.cost = [], 0
+        self._restart(weight)
+
+    def _restart(self, weight):
+        self.weight = weight
+        self._sequence = itertools.count()
+        ### costs = { node: (g, parent), ... }
+        self._costs = {self.src: (0, None)}
+        h = self.heuristic(self.src, self.dst)
+        ### queue = [(g + w * h, g, sequence, node), ...]
+        self._queue = [(weight * h, 0, next(self._sequence), self.src)]
+        self._closed = set()
+        self._best = (h, 0, self.src)
+
+    def search(self, max_nodes_checked=1000):
+        """Returns (path, complete) after up to max_nodes_checked expansions"""
+        dst = self.dst
+        heuristic = self.heuristic
+        checked = 0
+        while not self.optimal and checked < max_nodes_checked:
+            costs = self._costs
+            queue = self._queue
+            closed = self._closed
+            if not queue:
+                if self.path is None:
+                    logger.error(
+                        "No path found - opened list empty - "
+                        "AnytimeSearch(%s, %s)",
+                        self.src,
+                        dst,
+                    )
+                    raise NoPathFound(
+                        "opened list empty - AnytimeSearch(%s, %s)"
+                        % (self.src, dst)
+                    )
+                self._next_pass()
+                continue
+            node_f, node_g, _, node = heapq.heappop(queue)
+            if node in closed or costs[node][0] != node_g:
+                continue
+            if node == dst:
+                self.path, self.cost = _backtrace(costs, node), node_g
+                logger.debug(
+                    "anytime weight=%.2f %s->%s total_cost=%i",
+                    self.weight,
+                    self.src.xyz,
+                    dst.xyz,
+                    node_g,
+                )
+                self._next_pass()
+                continue
+            closed.add(node)
+            checked += 1
+            for connection in self.neighbours(node):
+                cost = _cost(self.cost_function, node, connection)
+                neighbour = connection.destination
+                if cost == NOT_PASSABLE or neighbour in closed:
+                    continue
+                cost += node_g
+                if neighbour in costs and cost >= costs[neighbour][0]:
+                    continue
+                h = heuristic(neighbour, dst)
+                if self.cost is not None and cost + h >= self.cost:
+                    # cannot improve already known path
+                    continue
+                costs[neighbour] = (cost, node)
+                heapq.heappush(
+                    queue,
+                    (
+                        cost + self.weight * h,
+                        cost,
+                        next(self._sequence),
+                        neighbour,
+                    ),
+                )
+                if (h, cost) < self._best[:2]:
+                    self._best = (h, cost, neighbour)
+
+        if self.path is not None:
+            return self.path, True
+        return _backtrace(self._costs, self._best[2]), False
+
+    def _next_pass(self):
+        """Finishes current pass - lowers weight or marks path optimal"""
+        if self.weight <= 1:
+            self.optimal = True
+        else:
+            self._restart(max(1.0, self.weight - self.weight_step))
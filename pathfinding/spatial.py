@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+"""Spatial indexes for snapping world positions to graph nodes.
+
+mallib: common library for mal projects
+@author: Paweł Sobkowiak
+@contact: pawel.sobkowiak@gmail.com
+Copyright © 2011 Paweł Sobkowiak
+
+"""
+
+import heapq
+import itertools
+import math
+
+from .tools import walk_graph
+
+
+def _distance2(a, b):
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2
+
+
+class BaseSpatialIndex(object):
+    """Common interface of spatial indexes over node positions.
+
+    Index stores items - by default graph nodes keyed by node.xyz,
+    but any hashable item with explicit xyz can be added.
+    """
+
+    def __init__(self):
+        self._positions = {}
+
+    @classmethod
+    def from_graph(cls, entry_node, *args, **kwargs):
+        """Builds index of every node reachable from entry_node"""
+        index = cls(*args, **kwargs)
+        index.build(
+            (node.xyz, node)
+            for node in walk_graph(entry_node, only_passable=False)
+        )
+        return index
+
+    @classmethod
+    def from_arrays(cls, xs, ys, zs, items=None, *args, **kwargs):
+        """Builds index from compact coordinate arrays.
+
+        items defaults to positions in arrays (compact node ids).
+        """
+        if items is None:
+            items = range(len(xs))
+        index = cls(*args, **kwargs)
+        index.build(
+            ((x, y, z), item) for x, y, z, item in zip(xs, ys, zs, items)
+        )
+        return index
+
+    def build(self, entries):
+        """Adds many (xyz, item) entries at once"""
+        for xyz, item in entries:
+            self.add(item, xyz)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, item):
+        return item in self._positions
+
+    def nearest(self, xyz):
+        """Returns item nearest to xyz or None for empty index"""
+        found = self.k_nearest(xyz, 1)
+        return found[0] if found else None
+
+    def k_nearest(self, xyz, k):
+        raise NotImplementedError
+
+    def within_radius(self, xyz, radius):
+        raise NotImplementedError
+
+
+class GridIndex(BaseSpatialIndex):
+    """Uniform grid hash - O(1) add and remove, good for dynamic graphs"""
+
+    def __init__(self, cell_size=1.0):
+        super().__init__()
+        self.cell_size = cell_size
+        self._cells = {}
+        # bounds of cells ever used, limit ring search of empty space
+        self._low = None
+        self._high = None
+
+    def _cell(self, xyz):
+        size = self.cell_size
+        return (
+            int(math.floor(xyz[0] / size)),
+            int(math.floor(xyz[1] / size)),
+            int(math.floor(xyz[2] / size)),
+        )
+
+    def add(self, item, xyz=None):
+        if xyz is None:
+            xyz = item.xyz
+        if item in self._positions:
+            self.remove(item)
+        self._positions[item] = xyz
+        cell = self._cell(xyz)
+        self._cells.setdefault(cell, {})[item] = xyz
+        if self._low is None:
+            self._low = self._high = cell
+        else:
+            self._low = tuple(map(min, self._low, cell))
+            self._high = tuple(map(max, self._high, cell))
+
+    def remove(self, item):
+        xyz = self._positions.pop(item)
+        cell = self._cell(xyz)
+        items = self._cells[cell]
+        del items[item]
+        if not items:
+            del self._cells[cell]
+
+    def _cube(self, center, ring):
+        """(low, high) of every axis of cube of ring within used cells"""
+        return [
+            (max(c - ring, low), min(c + ring, high))
+            for c, low, high in zip(center, self._low, self._high)
+        ]
+
+    @staticmethod
+    def _volume(cube):
+        volume = 1
+        for low, high in cube:
+            volume *= max(high - low + 1, 0)
+        return volume
+
+    def _shell(self, center, ring):
+        """Yields used cells on the surface of cube with given ring radius"""
+        cells = self._cells
+        cube = self._cube(center, ring)
+        # faces of cube within bounds on every axis
+        x_faces, y_faces, z_faces = [
+            [face for face in {c - ring, c + ring} if low <= face <= high]
+            for c, (low, high) in zip(center, cube)
+        ]
+        (x0, x1), (y0, y1), (z0, z1) = cube
+        all_ys, all_zs = range(y0, y1 + 1), range(z0, z1 + 1)
+        xs = range(x0, x1 + 1) if y_faces or z_faces else x_faces
+        for x in xs:
+            if x in x_faces:
+                ys = all_ys
+            else:
+                ys = all_ys if z_faces else y_faces
+            for y in ys:
+                zs = all_zs if x in x_faces or y in y_faces else z_faces
+                for z in zs:
+                    items = cells.get((x, y, z))
+                    if items:
+                        yield items
+
+    def k_nearest(self, xyz, k):
+        """Returns up to k items sorted by distance to xyz.
+
+        Rings of cells around xyz are searched from the first one
+        reaching used cells. Once a ring has more cells than there are
+        used cells, the remaining items are compared one by one.
+        """
+        if not self._positions or k <= 0:
+            return []
+        center = self._cell(xyz)
+        best = []  # heap of (-distance2, sequence, item)
+        sequence = itertools.count()
+
+        def consider(items):
+            for item, position in items.items():
+                entry = (-_distance2(xyz, position), next(sequence), item)
+                if len(best) < k:
+                    heapq.heappush(best, entry)
+                elif entry[0] > best[0][0]:
+                    heapq.heapreplace(best, entry)
+
+        # cells nearer than first_ring are outside of bounds
+        first_ring = max(
+            max(low - c, c - high, 0)
+            for low, high, c in zip(self._low, self._high, center)
+        )
+        inner = 0
+        for ring in range(first_ring, self._max_ring(center) + 1):
+            volume = self._volume(self._cube(center, ring))
+            if volume - inner > len(self._cells):
+                for cell, items in self._cells.items():
+                    if max(abs(a - c) for a, c in zip(cell, center)) >= ring:
+                        consider(items)
+                break
+            inner = volume
+            for items in self._shell(center, ring):
+                consider(items)
+            # every item outside of searched cube is farther than ring
+            if len(best) == k and -best[0][0] <= (ring * self.cell_size) ** 2:
+                break
+        return [item for _, _, item in sorted(best, reverse=True)]
+
+    def _max_ring(self, center):
+        return max(
+            max(abs(low - c), abs(high - c))
+            for low, high, c in zip(self._low, self._high, center)
+        )
+
+    def within_radius(self, xyz, radius):
+        """Returns all items no farther than radius from xyz"""
+        low = self._cell((xyz[0] - radius, xyz[1] - radius, xyz[2] - radius))
+        high = self._cell((xyz[0] + radius, xyz[1] + radius, xyz[2] + radius))
+        radius2 = radius * radius
+        found = []
+        cells = self._cells
+        for x in range(low[0], high[0] + 1):
+            for y in range(low[1], high[1] + 1):
+                for z in range(low[2], high[2] + 1):
+                    items = cells.get((x, y, z))
+                    if items:
+                        found.extend(
+                            item
+                            for item, position in items.items()
+                            if _distance2(xyz, position) <= radius2
+                        )
+        return found
+
+
+class KDTree(BaseSpatialIndex):
+    """K-d tree - fast queries on mostly static sets of nodes.
+
+    Added items wait in a small linear buffer and removed items
+    are only marked, tree is rebuilt when either grows beyond
+    rebuild_ratio of indexed items.
+    """
+
+    def __init__(self, rebuild_ratio=0.25):
+        super().__init__()
+        self.rebuild_ratio = rebuild_ratio
+        self._tree = None
+        self._tree_size = 0
+        self._pending = {}
+        self._removed = set()
+
+    def build(self, entries):
+        for xyz, item in entries:
+            self._positions[item] = xyz
+        self._rebuild()
+
+    def add(self, item, xyz=None):
+        if xyz is None:
+            xyz = item.xyz
+        if item in self._positions:
+            self.remove(item)
+        self._positions[item] = xyz
+        self._pending[item] = xyz
+        self._check_rebuild()
+
+    def remove(self, item):
+        del self._positions[item]
+        if self._pending.pop(item, None) is None:
+            self._removed.add(item)
+            self._check_rebuild()
+
+    def _check_rebuild(self):
+        limit = max(16, self.rebuild_ratio * self._tree_size)
+        if len(self._pending) > limit or len(self._removed) > limit:
+            self._rebuild()
+
+    def _rebuild(self):
+        entries = [(xyz, item) for item, xyz in self._positions.items()]
+        self._tree = self._build_node(entries, 0)
+        self._tree_size = len(entries)
+        self._pending = {}
+        self._removed = set()
+
+    def _build_node(self, entries, axis):
+        """Tree node is a tuple (xyz, item, axis, lower, higher)"""
+        if not entries:
+            return None
+        entries.sort(key=lambda entry: entry[0][axis])
+        median = len(entries) // 2
+        xyz, item = entries[median]
+        next_axis = (axis + 1) % 3
+        return (
+            xyz,
+            item,
+            axis,
+            self._build_node(entries[:median], next_axis),
+            self._build_node(entries[median + 1 :], next_axis),
+        )
+
+    def k_nearest(self, xyz, k):
+        """Returns up to k items sorted by distance to xyz"""
+        if k <= 0:
+            return []
+        best = []  # heap of (-distance2, sequence, item)
+        sequence = itertools.count()
+        removed = self._removed
+
+        def consider(position, item):
+            entry = (-_distance2(xyz, position), next(sequence), item)
+            if len(best) < k:
+                heapq.heappush(best, entry)
+            elif entry[0] > best[0][0]:
+                heapq.heapreplace(best, entry)
+
+        ### stack = [(node, distance2 to its region), ...]
+        stack = [(self._tree, 0)]
+        while stack:
+            node, region_distance2 = stack.pop()
+            if node is None or (
+                len(best) == k and region_distance2 > -best[0][0]
+            ):
+                continue
+            position, item, axis, lower, higher = node
+            if item not in removed:
+                consider(position, item)
+            offset = xyz[axis] - position[axis]
+            near, far = (lower, higher) if offset < 0 else (higher, lower)
+            # farther side is pushed first, so it is checked last
+            stack.append((far, max(region_distance2, offset * offset)))
+            stack.append((near, region_distance2))
+        for item, position in self._pending.items():
+            consider(position, item)
+        return [item for _, _, item in sorted(best, reverse=True)]
+
+    def within_radius(self, xyz, radius):
+        """Returns all items no farther than radius from xyz"""
+        radius2 = radius * radius
+        removed = self._removed
+        found = []
+        stack = [self._tree]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            position, item, axis, lower, higher = node
+            if item not in removed and _distance2(xyz, position) <= radius2:
+                found.append(item)
+            offset = xyz[axis] - position[axis]
+            if offset - radius <= 0:
+                stack.append(lower)
+            if offset + radius >= 0:
+                stack.append(higher)
+        found.extend(
+            item
+            for item, position in self._pending.items()
+            if _distance2(xyz, position) <= radius2
+        )
+        return found
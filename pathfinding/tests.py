@@ -8,11 +8,33 @@ Copyright © 2011 Paweł Sobkowiak
 
 """
 
+from array import array
+import json
+import os
+import random
+import tempfile
 import unittest
 
+from .compact import CompactGraph, find_path_compact
 from .constants import NOT_PASSABLE
-from .finders import find_path, find_nearest_targets, NoPathFound
+from .database import PathDatabase
+from .finders import (
+    find_path,
+    find_path_heapq,
+    find_paths,
+    find_nearest_targets,
+    find_reachable,
+    find_reachable_many,
+    NoPathFound,
+)
+from .heightmap import graph_from_heightmap, slope_cost
+from .neighbours import CachedNeighbours
+from .ordering import ORDERINGS, reorder_exported
+from .overlays import CostOverlay, UnitCostFunctions
+from .realtime import RealTimeSearch, AnytimeSearch
 from .sample import SampleXYZ, SampleConnection, SampleNode
+from .spatial import GridIndex, KDTree
+from .tools import export_to_json
 
 MOCK_DIRECTIONS = (
     SampleXYZ(1, 0, 0),
@@ -68,6 +90,28 @@ class MockGraph(dict):
         self[3, 2, 0].tags |= {'target'}
 
 
+class LazyNode(SampleNode):
+    """Node of procedural world identified only by its position"""
+
+    def __eq__(self, other):
+        return self.xyz == other.xyz
+
+    def __hash__(self):
+        return hash(self.xyz)
+
+
+def generate_lazy_connections(node):
+    """Neighbour provider of infinite world with a wall at x == 5"""
+    for direction in MOCK_DIRECTIONS:
+        neighbor_xyz = SampleXYZ(
+            node.xyz.x + direction.x, node.xyz.y + direction.y, 0
+        )
+        passable = neighbor_xyz.x != 5 or neighbor_xyz.y > 3
+        yield SampleConnection(
+            LazyNode(neighbor_xyz), 1 if passable else NOT_PASSABLE
+        )
+
+
 class TestPathfinding(unittest.TestCase):
     def setUp(self):
         """Build test graph to test pathfinders on it"""
@@ -108,6 +152,572 @@ class TestPathfinding(unittest.TestCase):
         found_paths = find_nearest_targets(departure, condition)
         self.assertEqual(len(found_paths), 0)
 
+    def test_find_paths_threaded(self):
+        nodes = [
+            self.graph[(1, 1, 0)],
+            self.graph[(7, 8, 0)],
+            self.graph[(9, 0, 0)],
+        ]
+        pairs = [(src, dst) for src in nodes for dst in nodes]
+        found_paths = find_paths(pairs, max_workers=4)
+        self.assertEqual(len(found_paths), 9)
+        isolated = self.graph[(9, 0, 0)]
+        for (src, dst), path in zip(pairs, found_paths):
+            if isolated in (src, dst) and src != dst:
+                self.assertIsNone(path)
+            else:
+                self.assertEqual(path, find_path(src, dst))
+
+
+class TestReachable(unittest.TestCase):
+    def setUp(self):
+        self.graph = MockGraph()
+
+    def test_find_reachable(self):
+        departure = self.graph[(1, 1, 0)]
+        reachable = find_reachable(departure, 2)
+        self.assertEqual(len(reachable), 1 + 4 + 6)
+        self.assertIs(reachable.nodes[0], departure)
+        self.assertEqual(list(reachable.costs), sorted(reachable.costs))
+        self.assertEqual(reachable.cost(self.graph[(2, 2, 0)]), 2)
+        self.assertNotIn(self.graph[(3, 2, 0)], reachable)
+
+    def test_path_to(self):
+        departure = self.graph[(1, 1, 0)]
+        reachable = find_reachable(departure, 100)
+        self.assertEqual(len(reachable), SIZE_X * SIZE_Y - 4)
+        destination = self.graph[(SIZE_X - 2, SIZE_Y - 2, 0)]
+        path = reachable.path_to(destination)
+        self.assertEqual(len(path), 14)
+        self.assertIs(path[0], destination)
+        self.assertEqual(reachable.path_to(departure), [])
+
+    def test_find_reachable_many(self):
+        sources = [
+            self.graph[(1, 1, 0)],
+            self.graph[(9, 0, 0)],
+            self.graph[(5, 5, 0)],
+        ]
+        results = find_reachable_many(sources, [2, 5, 1], max_workers=2)
+        self.assertEqual([len(each) for each in results], [11, 1, 5])
+        results = find_reachable_many(sources, array('d', [2, 5, 1]))
+        self.assertEqual([len(each) for each in results], [11, 1, 5])
+
+
+class TestCostOverlay(unittest.TestCase):
+    def setUp(self):
+        self.graph = MockGraph()
+        for y in range(SIZE_Y):
+            self.graph[(4, y, 0)].tags.add('water')
+        self.overlays = UnitCostFunctions(
+            walker=CostOverlay(tag_multipliers={'water': NOT_PASSABLE}),
+            boat=CostOverlay(tag_multipliers={'water': 0.5}),
+        )
+
+    def test_unit_without_overlay(self):
+        departure = self.graph[(1, 1, 0)]
+        destination = self.graph[(7, 1, 0)]
+        path = find_path(
+            departure, destination, cost_function=self.overlays['flyer']
+        )
+        self.assertEqual(len(path), 6)
+
+    def test_tag_multipliers(self):
+        departure = self.graph[(1, 1, 0)]
+        destination = self.graph[(7, 1, 0)]
+        self.assertRaises(
+            NoPathFound,
+            find_path,
+            departure,
+            destination,
+            cost_function=self.overlays['walker'],
+        )
+        reachable = find_reachable(
+            departure, 100, cost_function=self.overlays['boat']
+        )
+        self.assertEqual(reachable.cost(destination), 5.5)
+        self.assertEqual(
+            len(
+                find_reachable(
+                    departure, 100, cost_function=self.overlays['walker']
+                )
+            ),
+            4 * SIZE_Y,
+        )
+
+    def test_overrides_and_multipliers(self):
+        bridge = (self.graph[(3, 5, 0)], self.graph[(4, 5, 0)])
+        overlay = CostOverlay(
+            overrides={bridge: 1},
+            multipliers={(self.graph[(4, 5, 0)], self.graph[(5, 5, 0)]): 3},
+            tag_multipliers={'water': NOT_PASSABLE},
+        )
+        departure = self.graph[(1, 5, 0)]
+        destination = self.graph[(7, 5, 0)]
+        found_paths = find_nearest_targets(
+            departure, lambda node: node is destination, cost_function=overlay
+        )
+        self.assertEqual(found_paths[0]['cost'], 8)
+        # blocked edge of base graph can be opened by override
+        unpassable = (self.graph[(7, 0, 0)], self.graph[(8, 0, 0)])
+        path = find_path_heapq(
+            unpassable[0],
+            unpassable[1],
+            cost_function=CostOverlay(overrides={unpassable: 2}),
+        )
+        self.assertEqual(path, [unpassable[1]])
+
+    def test_find_path_with_cheaper_costs(self):
+        for x in range(SIZE_X):
+            self.graph[(x, 4, 0)].tags.add('road')
+        overlay = CostOverlay(tag_multipliers={'road': 0.1})
+        self.assertEqual(overlay.heuristic_scale, 0.1)
+        departure = self.graph[(2, 6, 0)]
+        reachable = find_reachable(departure, 100, cost_function=overlay)
+        for destination in (
+            self.graph[(9, 9, 0)],
+            self.graph[(0, 0, 0)],
+            self.graph[(7, 8, 0)],
+        ):
+            node, cost = departure, 0
+            for step in reversed(
+                find_path(departure, destination, cost_function=overlay)
+            ):
+                connection = [
+                    c for c in node.connections if c.destination is step
+                ][0]
+                node, cost = step, cost + overlay(node, connection)
+            self.assertAlmostEqual(cost, reachable.cost(destination))
+        # heuristic scale follows changes of overlay
+        overlay.tag_multipliers['road'] = 0.2
+        self.assertEqual(overlay.heuristic_scale, 0.2)
+        overlay.multipliers = {(departure, departure): 0.05}
+        self.assertEqual(overlay.heuristic_scale, 0.05)
+
+    def test_other_finders(self):
+        departure = self.graph[(1, 1, 0)]
+        destination = self.graph[(7, 1, 0)]
+        walker, boat = self.overlays['walker'], self.overlays['boat']
+        self.assertRaises(
+            NoPathFound,
+            RealTimeSearch(1000, cost_function=walker).find_next_path,
+            departure,
+            destination,
+        )
+        self.assertRaises(
+            NoPathFound,
+            AnytimeSearch(departure, destination, cost_function=walker).search,
+        )
+        path, complete = AnytimeSearch(
+            departure, destination, cost_function=boat
+        ).search(10000)
+        self.assertTrue(complete)
+        graph = CompactGraph.from_graph(departure)
+        ids = find_path_compact(
+            graph,
+            graph.id_of(departure.xyz),
+            graph.id_of(destination.xyz),
+            cost_function=boat,
+        )
+        # the water is crossed at half cost - like in test_tag_multipliers
+        node, cost = departure, 0
+        for step in reversed(ids):
+            cost += boat(node, SampleConnection(graph.nodes[step], 1))
+            node = graph.nodes[step]
+        self.assertEqual(cost, 5.5)
+        self.assertRaises(
+            NoPathFound,
+            find_path_compact,
+            graph,
+            graph.id_of(departure.xyz),
+            graph.id_of(destination.xyz),
+            cost_function=walker,
+        )
+
+
+class TestLazyNeighbours(unittest.TestCase):
+    def test_find_path_generated_connections(self):
+        departure = LazyNode(SampleXYZ(0, 0, 0))
+        destination = LazyNode(SampleXYZ(10, 0, 0))
+        found_path = find_path(
+            departure, destination, neighbours=generate_lazy_connections
+        )
+        self.assertEqual(len(found_path), 18)
+        self.assertEqual(found_path[0], destination)
+
+    def test_find_path_heapq_generated_connections(self):
+        departure = LazyNode(SampleXYZ(0, 0, 0))
+        destination = LazyNode(SampleXYZ(10, 0, 0))
+        found_path = find_path_heapq(
+            departure, destination, neighbours=generate_lazy_connections
+        )
+        self.assertEqual(len(found_path), 18)
+
+    def test_find_nearest_targets_generated_connections(self):
+        condition = lambda field: field.xyz == (3, 3, 0)
+        departure = LazyNode(SampleXYZ(0, 0, 0))
+        found_paths = find_nearest_targets(
+            departure, condition, neighbours=generate_lazy_connections
+        )
+        self.assertEqual(len(found_paths), 1)
+        self.assertEqual(found_paths[0]['cost'], 6)
+
+    def test_cached_neighbours_bounded(self):
+        neighbours = CachedNeighbours(generate_lazy_connections, max_size=20)
+        departure = LazyNode(SampleXYZ(0, 0, 0))
+        destination = LazyNode(SampleXYZ(10, 0, 0))
+        found_path = find_path(departure, destination, neighbours=neighbours)
+        self.assertEqual(len(found_path), 18)
+        self.assertEqual(len(neighbours), 20)
+        self.assertGreater(neighbours.misses, 20)
+
+    def test_cached_neighbours_hits(self):
+        neighbours = CachedNeighbours(generate_lazy_connections)
+        node = LazyNode(SampleXYZ(0, 0, 0))
+        first = neighbours(node)
+        self.assertIs(neighbours(LazyNode(SampleXYZ(0, 0, 0))), first)
+        self.assertEqual((neighbours.hits, neighbours.misses), (1, 1))
+
+
+class TestRealTimeSearch(unittest.TestCase):
+    def setUp(self):
+        self.graph = MockGraph()
+
+    def test_find_next_path_partial(self):
+        search = RealTimeSearch(lookahead=3)
+        departure = self.graph[(1, 1, 0)]
+        destination = self.graph[(SIZE_X - 2, SIZE_Y - 2, 0)]
+        path, complete = search.find_next_path(departure, destination)
+        self.assertFalse(complete)
+        self.assertTrue(0 < len(path) < 14)
+        self.assertTrue(search.learned[destination])
+
+    def test_agent_reaches_destination(self):
+        search = RealTimeSearch(lookahead=2)
+        node = self.graph[(9, 2, 0)]
+        destination = self.graph[(9, 0, 0)]
+        with self.assertRaises(NoPathFound):
+            search.find_next_path(node, destination, lookahead=1000)
+        destination = self.graph[(7, 0, 0)]
+        moves = 0
+        while node != destination and moves < 100:
+            path, complete = search.find_next_path(node, destination)
+            node = path[-1]
+            moves += 1
+        self.assertEqual(node, destination)
+
+    def test_anytime_search_improves(self):
+        departure = self.graph[(1, 1, 0)]
+        destination = self.graph[(SIZE_X - 2, SIZE_Y - 2, 0)]
+        search = AnytimeSearch(
+            departure, destination, weight=3.0, weight_step=1.0
+        )
+        path, complete = search.search(max_nodes_checked=2)
+        self.assertFalse(complete)
+        self.assertTrue(path)
+        for _ in range(100):
+            path, complete = search.search(max_nodes_checked=5)
+            if search.optimal:
+                break
+        self.assertTrue(complete)
+        self.assertEqual(len(path), 14)
+
+    def test_anytime_search_no_path(self):
+        departure = self.graph[(1, 1, 0)]
+        destination = self.graph[(9, 0, 0)]
+        search = AnytimeSearch(departure, destination)
+        self.assertRaises(NoPathFound, search.search, 1000)
+
+
+class TestSpatialIndex(unittest.TestCase):
+    index_classes = (GridIndex, KDTree)
+
+    def setUp(self):
+        randgen = random.Random(0)
+        self.points = [
+            SampleXYZ(
+                randgen.uniform(-50, 50),
+                randgen.uniform(-50, 50),
+                randgen.uniform(0, 5),
+            )
+            for _ in range(300)
+        ]
+        self.queries = [
+            SampleXYZ(randgen.uniform(-70, 70), randgen.uniform(-70, 70), 0)
+            for _ in range(20)
+        ]
+
+    def brute_nearest(self, xyz, k, ids=None):
+        ids = range(len(self.points)) if ids is None else ids
+        distance = lambda i: sum(
+            (a - b) ** 2 for a, b in zip(self.points[i], xyz)
+        )
+        return sorted(ids, key=distance)[:k]
+
+    def build(self, index_class):
+        xs, ys, zs = zip(*self.points)
+        return index_class.from_arrays(xs, ys, zs)
+
+    def test_k_nearest(self):
+        for index_class in self.index_classes:
+            index = self.build(index_class)
+            for xyz in self.queries:
+                self.assertEqual(
+                    index.nearest(xyz), self.brute_nearest(xyz, 1)[0]
+                )
+                self.assertEqual(
+                    index.k_nearest(xyz, 5), self.brute_nearest(xyz, 5)
+                )
+
+    def test_far_queries(self):
+        # rings of empty cells are skipped, so far queries stay fast
+        for index_class in self.index_classes:
+            index = self.build(index_class)
+            for xyz in (SampleXYZ(5000, 20, 0), SampleXYZ(-3000, -3000, 900)):
+                self.assertEqual(
+                    index.k_nearest(xyz, 3), self.brute_nearest(xyz, 3)
+                )
+            sparse = index_class.from_arrays((0, 1000), (0, 0), (0, 0))
+            self.assertEqual(sparse.nearest((499, 0, 0)), 0)
+            self.assertEqual(sparse.nearest((500.5, 3, 0)), 1)
+
+    def test_within_radius(self):
+        for index_class in self.index_classes:
+            index = self.build(index_class)
+            for xyz in self.queries:
+                expected = [
+                    i
+                    for i, point in enumerate(self.points)
+                    if sum((a - b) ** 2 for a, b in zip(point, xyz)) <= 100
+                ]
+                self.assertEqual(sorted(index.within_radius(xyz, 10)), expected)
+
+    def test_add_remove(self):
+        for index_class in self.index_classes:
+            index = self.build(index_class)
+            for i in range(0, 300, 3):
+                index.remove(i)
+            index.add('new', SampleXYZ(100, 100, 0))
+            ids = [i for i in range(300) if i % 3] + ['new']
+            self.points.append(SampleXYZ(100, 100, 0))
+            for xyz in self.queries:
+                expected = self.brute_nearest(
+                    xyz, 3, [i if i != 'new' else 300 for i in ids]
+                )
+                expected = ['new' if i == 300 else i for i in expected]
+                self.assertEqual(index.k_nearest(xyz, 3), expected)
+            self.assertEqual(index.nearest(SampleXYZ(99, 99, 0)), 'new')
+            self.assertEqual(len(index), 201)
+            self.points.pop()
+
+    def test_from_graph(self):
+        graph = MockGraph()
+        for index_class in self.index_classes:
+            index = index_class.from_graph(graph[(0, 0, 0)])
+            self.assertEqual(len(index), SIZE_X * SIZE_Y)
+            self.assertIs(index.nearest((3.4, 6.6, 0)), graph[(3, 7, 0)])
+
+
+class TestPathDatabase(unittest.TestCase):
+    def setUp(self):
+        self.graph = MockGraph()
+        self.compact = CompactGraph.from_graph(
+            self.graph[(0, 0, 0)], only_passable=False
+        )
+
+    def test_compact_graph(self):
+        self.assertEqual(len(self.compact), SIZE_X * SIZE_Y)
+        node_id = self.compact.id_of(self.graph[(1, 1, 0)])
+        self.assertIs(self.compact.nodes[node_id], self.graph[(1, 1, 0)])
+        self.assertEqual(len(self.compact.connections(node_id)), 4)
+
+    def test_find_path(self):
+        database = PathDatabase.build(self.compact)
+        departure = self.graph[(1, 1, 0)]
+        destination = self.graph[(SIZE_X - 2, SIZE_Y - 2, 0)]
+        found_path = database.find_path(departure, destination)
+        self.assertEqual(len(found_path), 14)
+        self.assertIs(found_path[0], destination)
+        self.assertEqual(database.find_path(departure, departure), [])
+
+    def test_every_path_is_optimal(self):
+        database = PathDatabase.build(self.compact)
+        nodes = self.compact.nodes
+        for src in nodes[::7]:
+            for dst in nodes[::5]:
+                try:
+                    expected = find_path(src, dst)
+                except NoPathFound:
+                    self.assertRaises(NoPathFound, database.find_path, src, dst)
+                else:
+                    self.assertEqual(
+                        len(database.find_path(src, dst)), len(expected)
+                    )
+
+    def test_parallel_build_and_save(self):
+        database = PathDatabase.build(self.compact)
+        parallel = PathDatabase.build(self.compact, processes=2, chunk_size=10)
+        self.assertEqual(parallel.run_starts, database.run_starts)
+        self.assertEqual(parallel.run_moves, database.run_moves)
+        self.assertLess(len(database.run_starts), len(self.compact) ** 2 // 2)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'paths.db')
+            database.save(path)
+            loaded = PathDatabase.load(path)
+        src, dst = self.compact.id_of((1, 1, 0)), self.compact.id_of((8, 8, 0))
+        self.assertEqual(loaded.path_ids(src, dst), database.path_ids(src, dst))
+        self.assertEqual(loaded.find_path((1, 1, 0), (8, 8, 0))[0], (8, 8, 0))
+        # without node objects only points of the path are made
+        calls = []
+        xyz = loaded.graph.xyz
+        loaded.graph.xyz = lambda index: calls.append(index) or xyz(index)
+        path = loaded.find_path((1, 1, 0), (8, 8, 0))
+        self.assertEqual(len(calls), len(path))
+        self.assertIsNone(loaded.graph.original_ids)
+
+    def test_save_reordered(self):
+        order = list(reversed(range(len(self.compact))))
+        database = PathDatabase.build(self.compact.reordered(order))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'paths.db')
+            database.save(path)
+            loaded = PathDatabase.load(path)
+        self.assertEqual(list(loaded.graph.original_ids), order)
+
+    def test_unreachable(self):
+        database = PathDatabase.build(self.compact)
+        departure = self.graph[(1, 1, 0)]
+        self.assertRaises(
+            NoPathFound, database.find_path, departure, self.graph[(9, 0, 0)]
+        )
+
+
+class TestOrdering(unittest.TestCase):
+    def setUp(self):
+        self.graph = MockGraph()
+        self.compact = CompactGraph.from_graph(
+            self.graph[(0, 0, 0)], only_passable=False
+        )
+
+    def test_orderings_are_permutations(self):
+        for method, ordering in ORDERINGS.items():
+            order = ordering(self.compact)
+            self.assertEqual(
+                sorted(order), list(range(len(self.compact))), method
+            )
+
+    def test_reordered_graph(self):
+        for ordering in ORDERINGS.values():
+            reordered = self.compact.reordered(ordering(self.compact))
+            for new_id, old_id in enumerate(reordered.original_ids):
+                self.assertEqual(
+                    reordered.xyz(new_id), self.compact.xyz(old_id)
+                )
+                self.assertIs(
+                    reordered.nodes[new_id], self.compact.nodes[old_id]
+                )
+            src, dst = reordered.id_of((1, 1, 0)), reordered.id_of((8, 8, 0))
+            path = find_path_compact(reordered, src, dst)
+            self.assertEqual(len(path), 14)
+            self.assertEqual(
+                reordered.original_ids[path[0]], self.compact.id_of((8, 8, 0))
+            )
+
+    def test_reordering_compresses_path_database(self):
+        original = PathDatabase.build(self.compact)
+        reordered = PathDatabase.build(
+            self.compact.reordered(ORDERINGS['hilbert'](self.compact))
+        )
+        self.assertLess(len(reordered.run_starts), len(original.run_starts))
+
+    def test_reorder_exported(self):
+        data = json.loads(export_to_json(self.graph[(0, 0, 0)]))
+        reordered = reorder_exported(data, 'rcm')
+        self.assertEqual(len(reordered['graph']), len(data['graph']))
+        for row, index in zip(reordered['graph'], reordered['original_ids']):
+            self.assertEqual(row, data['graph'][index])
+
+
+class TestHeightmapGraph(unittest.TestCase):
+    def setUp(self):
+        self.heights = [[0, 1, 2, 3], [0, 5, 0, 3], [0, 1, 2, 3]]
+
+    def test_costs_follow_slope(self):
+        graph = graph_from_heightmap(
+            self.heights, cost=slope_cost(climb=2, descent=1)
+        )
+        self.assertEqual(len(graph), 12)
+        self.assertEqual(dict(graph.connections(0)), {1: 3.0, 4: 1.0})
+        self.assertEqual(
+            dict(graph.connections(5)), {1: 5.0, 9: 5.0, 4: 6.0, 6: 6.0}
+        )
+
+    def test_impassable_moves_and_cells(self):
+        passable = [[True] * 4, [True, True, False, True], [True] * 4]
+        graph = graph_from_heightmap(
+            self.heights, passable=passable, cost=slope_cost(max_climb=2)
+        )
+        self.assertEqual(len(graph), 11)
+        peak = graph.id_of((1, 1, 5))
+        self.assertEqual(
+            sorted(
+                graph.xyz(target) for target, cost in graph.connections(peak)
+            ),
+            [(0, 1, 1), (1, 0, 0), (2, 1, 1)],
+        )
+        self.assertNotIn(
+            peak,
+            [
+                target
+                for target, cost in graph.connections(graph.id_of((1, 0, 0)))
+            ],
+        )
+
+    def test_lazy_nodes_match_compact_search(self):
+        graph = graph_from_heightmap(
+            self.heights, diagonal=True, lazy_nodes=True
+        )
+        ids = find_path_compact(graph, 0, 11)
+        path = find_path(graph.nodes[0], graph.nodes[11])
+        self.assertEqual(
+            [node.xyz for node in path], [graph.xyz(index) for index in ids]
+        )
+
+    def test_compact_search_is_optimal(self):
+        rng = random.Random(7)
+        heights = [[rng.randint(0, 3) for y in range(17)] for x in range(17)]
+        for options in (
+            {'diagonal': True},
+            {'hexagonal': True},
+            {'diagonal': True, 'wraped': True},
+        ):
+            graph = graph_from_heightmap(heights, lazy_nodes=True, **options)
+            reachable = find_reachable(graph.nodes[0], float('inf'))
+            for dst in rng.sample(range(len(graph)), 20):
+                ids = find_path_compact(graph, 0, dst)
+                cost = sum(
+                    dict(graph.connections(src))[target]
+                    for src, target in zip([0] + ids[::-1], ids[::-1])
+                )
+                self.assertAlmostEqual(
+                    cost, reachable.cost(graph.nodes[dst]), msg=options
+                )
+
+    def test_hexagonal_wraped(self):
+        graph = graph_from_heightmap([[0] * 5] * 5, hexagonal=True, wraped=True)
+        # the last row and column repeat the first ones
+        self.assertEqual(len(graph), 16)
+        self.assertEqual(
+            sorted(graph.xyz(target) for target, cost in graph.connections(0)),
+            [(0, 1, 0), (0, 3, 0), (1, 0, 0), (1, 1, 0), (3, 0, 0), (3, 3, 0)],
+        )
+        self.assertTrue(
+            all(
+                len(list(graph.connections(index))) == 6
+                for index in range(len(graph))
+            )
+        )
+
 
 if __name__ == '__main__':
     unittest.main()
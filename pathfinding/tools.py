@@ -13,6 +13,22 @@ import json
 import random
 
 
+def walk_graph(entry_node, only_passable=True):
+    """Yields every node reachable from entry_node (breadth first)"""
+    queue = collections.deque([entry_node])
+    opened = {entry_node}
+    while queue:
+        node = queue.popleft()
+        yield node
+        for connection in node.connections:
+            if only_passable and not connection.cost:
+                continue
+            dst = connection.destination
+            if dst not in opened:
+                opened.add(dst)
+                queue.append(dst)
+
+
 def export_to_json(entry_node, fp=None, sample_size=10, only_passable=True):
     """Exports graph to JSON.
 
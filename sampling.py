@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""Batch sampling of heightmap arrays with interpolation.
+
+mallib: common library for mal projects
+@author: Paweł Sobkowiak
+@contact: pawel.sobkowiak@gmail.com
+Copyright © 2011 Paweł Sobkowiak
+
+"""
+
+import numpy
+
+
+def _nearest(coordinates):
+    return numpy.floor(coordinates + 0.5), (0,), (numpy.ones(len(coordinates)),)
+
+
+def _bilinear(coordinates):
+    base = numpy.floor(coordinates)
+    t = coordinates - base
+    return base, (0, 1), (1 - t, t)
+
+
+def _bicubic(coordinates):
+    """Catmull-Rom spline - passes through values of grid points"""
+    base = numpy.floor(coordinates)
+    t = coordinates - base
+    t2, t3 = t * t, t * t * t
+    weights = (
+        (-t3 + 2 * t2 - t) / 2,
+        (3 * t3 - 5 * t2 + 2) / 2,
+        (-3 * t3 + 4 * t2 + t) / 2,
+        (t3 - t2) / 2,
+    )
+    return base, (-1, 0, 1, 2), weights
+
+
+# method -> function(coordinates) returning (base, offsets, weights of offsets)
+INTERPOLATIONS = {
+    'nearest': _nearest,
+    'bilinear': _bilinear,
+    'bicubic': _bicubic,
+}
+
+
+def sample(grid, xs, ys, method='nearest', wraped=False, mask=None, fill=0):
+    """Returns float64 values of grid at points xs, ys (any floats).
+
+    method is one of INTERPOLATIONS. Wraped grids repeat with period
+    width - 1 (the last row and column equal the first ones), others
+    give fill outside of [0, width - 1] and clamp interpolation to the
+    edge. mask marks points of the map (hex boards) - points nearest to
+    cells off the map give fill and weights of such cells are left out.
+    grid is only read, so it may be a memory mapped array.
+    """
+    if method not in INTERPOLATIONS:
+        raise ValueError('Unknown interpolation: %s' % method)
+    xs, ys = numpy.broadcast_arrays(
+        numpy.asarray(xs, dtype=numpy.float64),
+        numpy.asarray(ys, dtype=numpy.float64),
+    )
+    shape = xs.shape
+    xs, ys = xs.ravel(), ys.ravel()
+    width, height = grid.shape
+    wrap = wraped and mask is None
+    if wrap:
+        xs, ys = xs % (width - 1), ys % (height - 1)
+        inside = numpy.isfinite(xs) & numpy.isfinite(ys)
+    else:
+        inside = (xs >= 0) & (xs <= width - 1) & (ys >= 0) & (ys <= height - 1)
+    xs, ys = numpy.where(inside, xs, 0), numpy.where(inside, ys, 0)
+
+    def cells(base, offset, length):
+        index = base.astype(numpy.int64) + offset
+        return (
+            index % (length - 1) if wrap else numpy.clip(index, 0, length - 1)
+        )
+
+    x0, x_offsets, x_weights = INTERPOLATIONS[method](xs)
+    y0, y_offsets, y_weights = INTERPOLATIONS[method](ys)
+    total = numpy.zeros(len(xs))
+    norm = numpy.zeros(len(xs))
+    for dx, x_weight in zip(x_offsets, x_weights):
+        cx = cells(x0, dx, width)
+        for dy, y_weight in zip(y_offsets, y_weights):
+            cy = cells(y0, dy, height)
+            weight = x_weight * y_weight
+            if mask is not None:
+                weight = weight * mask[cx, cy]
+            total += weight * grid[cx, cy]
+            norm += weight
+    if mask is not None:
+        nx = _nearest(xs)[0].astype(numpy.int64)
+        ny = _nearest(ys)[0].astype(numpy.int64)
+        inside &= mask[nx, ny] & (norm != 0)
+        total = numpy.divide(total, norm, out=total, where=inside)
+    return numpy.where(inside, total, fill).reshape(shape)
@@ -61,3 +61,725 @@ def test_mark_disabled():
     add_disabled(2, 2)
     print(MARK)
     assert MARK['test']['mallib.tests:add_disabled'] == 0
+
+
+def test_array_square_diamond_same_as_dict_generator():
+    from .fractal import SquareDiamondFractalGenerator
+    from .fractal_array import ArraySquareDiamondFractalGenerator
+
+    for seed, wraped, island in (
+        (0, True, False),
+        (1, False, False),
+        (7, True, True),
+        (9, False, True),
+    ):
+        reference = SquareDiamondFractalGenerator(5, 1.2, seed, wraped, island)
+        generator = ArraySquareDiamondFractalGenerator(
+            5, 1.2, seed, wraped, island
+        )
+        for x in range(generator.width):
+            for y in range(generator.width):
+                assert generator.get_value((x, y)) == reference.get_value(
+                    (x, y)
+                )
+        assert (
+            abs(generator.statistics()['mean'] - reference.statistics()['mean'])
+            < 1e-6
+        )
+        assert (
+            abs(
+                generator.statistics()['stdev']
+                - reference.statistics()['stdev']
+            )
+            < 1e-6
+        )
+
+
+def test_array_square_diamond_storage_types():
+    import numpy
+    from .fractal_array import ArraySquareDiamondFractalGenerator
+
+    exact = ArraySquareDiamondFractalGenerator(6, 1, 3, island=True)
+    compact = ArraySquareDiamondFractalGenerator(
+        6, 1, 3, island=True, dtype=numpy.float32
+    )
+    short = ArraySquareDiamondFractalGenerator(4, 1, 3, dtype=numpy.int16)
+    assert compact.to_array().dtype == numpy.float32
+    assert short.to_array().dtype == numpy.int16
+    assert (compact.to_array() == exact.to_array()).all()
+    assert (
+        short.to_array()
+        == ArraySquareDiamondFractalGenerator(4, 1, 3).to_array()
+    ).all()
+    assert short.get_value((100, 100)) == 0
+    try:
+        ArraySquareDiamondFractalGenerator(
+            6, 1, 3, island=True, dtype=numpy.int16
+        )
+        assert False, "island heights do not fit int16"
+    except ValueError:
+        pass
+    short.transform(0, 100)
+    assert short.to_array().dtype == numpy.int16
+    assert abs(short.statistics()['stdev'] - 100) < 1
+
+
+def test_array_hex_same_as_dict_generator():
+    from .fractal import HexFractalGenerator
+    from .fractal_array import ArrayHexFractalGenerator
+
+    for seed, island in ((0, False), (5, True)):
+        reference = HexFractalGenerator(5, 1.1, seed, island=island)
+        generator = ArrayHexFractalGenerator(5, 1.1, seed, island=island)
+        assert sorted(generator._point_iterator()) == sorted(
+            reference._point_iterator()
+        )
+        for point in reference._point_iterator():
+            assert generator.get_value(point) == reference.get_value(point)
+        assert (
+            abs(generator.statistics()['mean'] - reference.statistics()['mean'])
+            < 1e-6
+        )
+        assert (
+            abs(
+                generator.statistics()['stdev']
+                - reference.statistics()['stdev']
+            )
+            < 1e-6
+        )
+        reference.transform(10, 2)
+        generator.transform(10, 2)
+        for point in reference._point_iterator():
+            assert (
+                abs(generator.get_value(point) - reference.get_value(point))
+                < 1e-9
+            )
+        # points outside of hex board are not transformed
+        assert generator.get_value((generator.width - 1, 0)) == 0
+
+
+def test_linear_transform_statistics():
+    from .fractal import SquareDiamondFractalGenerator
+
+    generator = SquareDiamondFractalGenerator(4, 1, 2)
+    generator.statistics()
+    generator.linear_transform(-3, 10)
+    updated = dict(generator.statistics())
+    generator.reset_statistics()
+    computed = generator.statistics()
+    assert abs(updated['mean'] - computed['mean']) < 1e-6
+    assert abs(updated['stdev'] - computed['stdev']) < 1e-6
+
+
+def test_transform_pipeline():
+    import numpy
+    from .fractal_array import ArraySquareDiamondFractalGenerator
+    from .fractal_transforms import TransformPipeline, statistics
+
+    chained = ArraySquareDiamondFractalGenerator(6, 1, 4)
+    stepwise = ArraySquareDiamondFractalGenerator(6, 1, 4)
+    chained.pipeline(
+        TransformPipeline()
+        .normalize(0, 100)
+        .power(1.5, 50, True, True)
+        .linear(2, 1)
+    )
+    stepwise.transform(0, 100)
+    stepwise.power_transform(1.5, 50, True, True)
+    stepwise.linear_transform(2, 1)
+    assert numpy.allclose(chained.to_array(), stepwise.to_array())
+    values = chained.to_array()
+    stats = statistics(values, chunk_size=100)
+    assert abs(stats.mean - values.mean()) < 1e-9
+    assert abs(stats.stdev - values.std()) < 1e-9
+    assert abs(chained.statistics()['stdev'] - values.std()) < 1e-9
+
+
+def test_equalize_and_quantiles():
+    import numpy
+    from .fractal_array import ArraySquareDiamondFractalGenerator
+    from .fractal_transforms import TransformPipeline
+
+    generator = ArraySquareDiamondFractalGenerator(6, 1, 4, dtype=numpy.float32)
+    generator.pipeline(TransformPipeline().equalize(0, 1))
+    histogram = (
+        numpy.histogram(generator.to_array(), 4, (0, 1))[0]
+        / generator.to_array().size
+    )
+    assert numpy.allclose(histogram, 0.25, atol=0.01)
+    generator.pipeline(
+        TransformPipeline().quantiles([(0, -1000), (0.3, 0), (1, 3000)])
+    )
+    assert abs((generator.to_array() < 0).mean() - 0.3) < 0.01
+    assert generator.to_array().dtype == numpy.float32
+
+
+def test_tiled_terrain_square():
+    from .fractal_tiles import TiledTerrain
+
+    terrain = TiledTerrain(4, 1, 3, cache_size=2)
+    tile = terrain.tile(0, 0).to_array().copy()
+    right = terrain.tile(1, 0).to_array()
+    assert (tile[16, :] == right[0, :]).all()
+    assert (tile[:, 16] == terrain.tile(0, 1).to_array()[:, 0]).all()
+    assert terrain.cache_info() == {
+        'hits': 0,
+        'misses': 3,
+        'evictions': 1,
+        'size': 2,
+        'max_size': 2,
+    }
+    assert terrain.get_value((5, 7)) == tile[5, 7]
+    assert terrain.get_value((-11, -1)) == TiledTerrain(4, 1, 3).tile(
+        -1, -1
+    ).get_value((5, 15))
+    assert terrain.cache_info()['evictions'] == 3
+
+
+def test_tiled_terrain_hex_borders():
+    from .fractal_tiles import TiledTerrain
+
+    terrain = TiledTerrain(4, 1, 5, hexagonal=True)
+    shared = 0
+    for x in range(-8, 24):
+        for y in range(-8, 24):
+            tx, ty, lx, ly = terrain.locate((x, y))
+            value = terrain.tile(tx, ty).get_value((lx, ly))
+            # border points belong to more tiles - all must agree
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    ox, oy = terrain._hex_origin(tx + dx, ty + dy)
+                    if (dx or dy) and terrain._in_hex(x - ox, y - oy):
+                        shared += 1
+                        assert (
+                            terrain.tile(tx + dx, ty + dy).get_value(
+                                (x - ox, y - oy)
+                            )
+                            == value
+                        )
+    assert shared
+
+
+def test_array_memory_mapped_output():
+    import os
+    import tempfile
+
+    import numpy
+    from .fractal_array import (
+        ArrayHexFractalGenerator,
+        ArraySquareDiamondFractalGenerator,
+        open_heightmap,
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        for cls, name in (
+            (ArraySquareDiamondFractalGenerator, 'square.npy'),
+            (ArrayHexFractalGenerator, 'hex.raw'),
+        ):
+            path = os.path.join(directory, name)
+            reference = cls(6, 1, 4, island=True)
+            generator = cls(6, 1, 4, island=True, out=path)
+            assert isinstance(generator._data, numpy.memmap)
+            assert (generator.to_array() == reference.to_array()).all()
+            opened = open_heightmap(path)
+            assert (opened.to_array() == reference.to_array()).all()
+            assert sorted(opened._point_iterator()) == sorted(
+                reference._point_iterator()
+            )
+        # banded passes give the same map as whole passes
+        path = os.path.join(directory, 'compact.npy')
+        banded = type(
+            'Banded', (ArraySquareDiamondFractalGenerator,), {'band_size': 16}
+        )
+        compact = banded(6, 1, 4, dtype=numpy.int32, out=path)
+        assert (
+            compact.to_array()
+            == ArraySquareDiamondFractalGenerator(
+                6, 1, 4, dtype=numpy.int32
+            ).to_array()
+        ).all()
+        opened = open_heightmap(path, 'r+')
+        opened.transform(0, 100)
+        assert isinstance(opened._data, numpy.memmap)
+        assert opened.to_array().dtype == numpy.int32
+        assert abs(open_heightmap(path).statistics()['stdev'] - 100) < 1
+        # storage types other than float64 are generated in a work file
+        path = os.path.join(directory, 'short.raw')
+        short = ArrayHexFractalGenerator(6, 1, 4, dtype=numpy.int16, out=path)
+        assert (
+            short.to_array()
+            == ArrayHexFractalGenerator(6, 1, 4, dtype=numpy.int16).to_array()
+        ).all()
+        assert not os.path.exists(path + '.work')
+
+
+def test_array_square_diamond_threads():
+    from .fractal_array import ArraySquareDiamondFractalGenerator
+
+    banded = type(
+        'Banded', (ArraySquareDiamondFractalGenerator,), {'band_size': 64}
+    )
+    for island in (False, True):
+        serial = ArraySquareDiamondFractalGenerator(7, 0.9, 11, island=island)
+        threaded = banded(7, 0.9, 11, island=island, workers=4)
+        assert (threaded.to_array() == serial.to_array()).all()
+
+
+def test_counter_grain():
+    import numpy
+    from .fractal import HexFractalGenerator, SquareDiamondFractalGenerator
+    from .fractal_array import (
+        ArrayHexFractalGenerator,
+        ArraySquareDiamondFractalGenerator,
+    )
+    from .grain import CounterGrain
+
+    grain = CounterGrain(8)
+    xs = numpy.arange(-20, 300)
+    ys = xs * 7 % 101
+    values = grain.values(xs, ys)
+    assert list(values) == [
+        grain.value(x, y) for x, y in zip(xs.tolist(), ys.tolist())
+    ]
+    assert list(grain.values(xs[::-1], ys[::-1])) == list(values[::-1])
+    assert values.min() >= -100 and values.max() <= 100
+    assert (values != CounterGrain(9).values(xs, ys)).any()
+    # the same map from dict and array generators, serial or threaded
+    for island in (False, True):
+        reference = SquareDiamondFractalGenerator(
+            5, 1, 8, island=island, grain=grain
+        )
+        generator = ArraySquareDiamondFractalGenerator(
+            5, 1, 8, island=island, grain=grain, workers=3
+        )
+        for point in reference._point_iterator():
+            assert generator.get_value(point) == reference.get_value(point)
+        reference = HexFractalGenerator(5, 1, 8, island=island, grain=grain)
+        generator = ArrayHexFractalGenerator(
+            5, 1, 8, island=island, grain=grain
+        )
+        for point in reference._point_iterator():
+            assert generator.get_value(point) == reference.get_value(point)
+
+
+def test_array_square_diamond_progressive_levels():
+    import numpy
+    from .fractal_array import ArraySquareDiamondFractalGenerator
+
+    full = ArraySquareDiamondFractalGenerator(6, 1, 5, island=True)
+    progressive = ArraySquareDiamondFractalGenerator(
+        6, 1, 5, island=True, level=2
+    )
+    assert progressive.level == 2
+    assert progressive.level_array().shape == (5, 5)
+    assert (progressive.level_array() == full.level_array(2)).all()
+    assert progressive.coarse_value((30, 17), 2) == full.get_value((32, 16))
+    try:
+        progressive.level_array(3)
+        assert False, "level 3 is not generated yet"
+    except ValueError:
+        pass
+    progressive.refine(4)
+    assert (progressive.level_array() == full.level_array(4)).all()
+    progressive.refine()
+    assert (progressive.to_array() == full.to_array()).all()
+    assert [level.shape[0] for level in progressive.pyramid()] == [
+        2,
+        3,
+        5,
+        9,
+        17,
+        33,
+        65,
+    ]
+    assert progressive.statistics()['mean'] == full.statistics()['mean']
+    assert progressive.refine() is progressive
+
+
+def test_array_square_diamond_reopened_refine():
+    import os
+    import tempfile
+
+    from .fractal_array import (
+        ArraySquareDiamondFractalGenerator,
+        open_heightmap,
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'coarse.npy')
+        ArraySquareDiamondFractalGenerator(6, 1, 5, level=2, out=path)
+        opened = open_heightmap(path)
+        assert opened.level == 2
+        try:
+            opened.refine()
+            assert False, "reopened heightmap was refined"
+        except ValueError:
+            pass
+
+
+def test_heightmap_cache():
+    import os
+    import tempfile
+
+    import numpy
+    from .fractal_array import (
+        ArrayHexFractalGenerator,
+        ArraySquareDiamondFractalGenerator,
+    )
+    from .fractal_cache import HeightmapCache
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = HeightmapCache(directory)
+        generated = cache.get_or_generate(6, 1, 3, island=True)
+        cached = cache.get_or_generate(6, 1, 3, island=True)
+        assert cached.to_array().dtype == generated.to_array().dtype
+        assert cached.get_value((7, 9)) == generated.get_value((7, 9))
+        assert (cached.to_array() == generated.to_array()).all()
+        assert cache.get(type(generated), 6, 1, 4) is None
+        assert cache.get(type(generated), 6, 1, 3, True, True, None, 5) is None
+        # float32 maps are memory mapped and may be transformed
+        key = cache.put(
+            ArraySquareDiamondFractalGenerator(6, 1, 5, dtype=numpy.float32)
+        )
+        mapped = cache.load(key)
+        assert isinstance(mapped._data, numpy.memmap)
+        mapped.transform(0, 100)
+        assert abs(mapped.statistics()['stdev'] - 100) < 1
+        assert cache.load(key).statistics()['stdev'] != mapped.stdev
+        # changed maps are not stored
+        try:
+            cache.put(mapped)
+            assert False, "transformed heightmap was cached"
+        except ValueError:
+            pass
+        cache.remove(key)
+        hexagonal = cache.get_or_generate(5, 1, 3, cls=ArrayHexFractalGenerator)
+        cached = cache.get_or_generate(5, 1, 3, cls=ArrayHexFractalGenerator)
+        assert sorted(cached._point_iterator()) == sorted(
+            hexagonal._point_iterator()
+        )
+        assert (
+            abs(cached.get_value((3, 2)) - hexagonal.get_value((3, 2))) < 1e-3
+        )
+        # quantized and compressed entries are close to generated map
+        compact = HeightmapCache(directory, quantize=True, compress=True)
+        compact.get_or_generate(6, 1, 3, island=True)
+        values = compact.get_or_generate(6, 1, 3, island=True).to_array()
+        error = numpy.abs(values - generated.to_array()).max()
+        assert (
+            error
+            <= (generated.to_array().max() - generated.to_array().min()) / 65535
+        )
+        assert len(cache.entries()) == 3
+        # the oldest entry goes first
+        os.utime(
+            os.path.join(
+                directory,
+                cache.key(type(generated), 6, 1, 3, island=True) + '.json',
+            ),
+            (0, 0),
+        )
+        sizes = {key: size for key, (used, size) in cache.entries().items()}
+        cache.evict(sum(sizes.values()) - 1)
+        assert cache.get(type(generated), 6, 1, 3, island=True) is None
+        assert len(cache.entries()) == 2
+        cache.clear()
+        assert not os.listdir(directory)
+    # partial maps are not stored
+    try:
+        cache.put(ArraySquareDiamondFractalGenerator(6, 1, 3, level=2))
+        assert False, "partial heightmap was cached"
+    except ValueError:
+        pass
+
+
+def test_noise_terrain():
+    import numpy
+    from .noise import NoiseTerrain
+
+    terrain = NoiseTerrain(5, 0.8, 12)
+    xs = numpy.array([0.0, 0.5, 1e6, -3e5 + 0.25, 77.7])
+    ys = numpy.array([0.0, 2.0, -1e6, 4e4, 12.1])
+    values = terrain.values(xs, ys)
+    assert list(values) == [terrain.get_value(xy) for xy in zip(xs, ys)]
+    assert list(values) == list(NoiseTerrain(5, 0.8, 12).values(xs, ys))
+    assert list(values) != list(NoiseTerrain(5, 0.8, 13).values(xs, ys))
+    # values keep broadcast shape of coordinates
+    grid = terrain.values(xs[:, None], ys[None, :])
+    assert grid.shape == (5, 5)
+    assert grid[2, 4] == terrain.get_value((xs[2], ys[4]))
+    # coherent - close points have close heights
+    assert (
+        abs(terrain.get_value((77.7, 12.1)) - terrain.get_value((77.8, 12.1)))
+        < 10
+    )
+    terrain.transform(100, 20)
+    statistics = terrain.statistics()
+    assert (
+        abs(statistics['mean'] - 100) < 1e-6
+        and abs(statistics['stdev'] - 20) < 1e-6
+    )
+    assert list(terrain.values(xs, ys)) == [
+        terrain.get_value(xy) for xy in zip(xs, ys)
+    ]
+
+
+def test_hydrology():
+    import numpy
+    from .fractal_array import ArraySquareDiamondFractalGenerator
+    from .hydrology import (
+        fill_depressions,
+        flow_accumulation,
+        flow_directions,
+        terminals,
+    )
+
+    heights = numpy.array(
+        [
+            [9, 9, 9, 9, 9],
+            [9, 5, 6, 7, 9],
+            [9, 6, 2, 6, 9],
+            [9, 7, 6, 8, 9],
+            [9, 9, 4, 9, 9],
+        ]
+    )
+    filled = fill_depressions(heights, epsilon=0)
+    # pit is filled up to the pass towards the outlet at the bottom border
+    assert filled[2, 2] == 6 and filled[1, 1] == 6 and filled[1, 3] == 7
+    receivers = flow_directions(fill_depressions(heights), sea_level=4)
+    assert (terminals(receivers).ravel()[6:9] == 22).all()
+    accumulation = flow_accumulation(receivers)
+    assert accumulation.ravel()[22] == 10
+    # every cell of generated map drains to the border
+    heights = ArraySquareDiamondFractalGenerator(
+        6, 1, 2, wraped=False
+    ).to_array()
+    receivers = flow_directions(fill_depressions(heights))
+    ends = terminals(receivers)
+    border = numpy.zeros(heights.shape, dtype=bool)
+    border[0, :] = border[-1, :] = border[:, 0] = border[:, -1] = True
+    assert border.ravel()[ends.ravel()].all()
+    assert flow_accumulation(receivers)[border].sum() == heights.size
+    weighted = flow_directions(fill_depressions(heights), weighted=True, seed=3)
+    assert (
+        weighted
+        == flow_directions(fill_depressions(heights), weighted=True, seed=3)
+    ).all()
+    assert border.ravel()[terminals(weighted).ravel()].all()
+    # wraped maps repeat with period width - 1 - the last row and column
+    # mirror the first ones and are not counted twice
+    heights = ArraySquareDiamondFractalGenerator(6, 1, 2).to_array()
+    filled = fill_depressions(heights, wraped=True)
+    assert (filled[-1] == filled[0]).all()
+    assert (filled[:, -1] == filled[:, 0]).all()
+    receivers = flow_directions(filled, wraped=True)
+    assert (receivers[-1] == receivers[0]).all()
+    assert (receivers // heights.shape[1] < heights.shape[0] - 1).all()
+    accumulation = flow_accumulation(receivers, wraped=True)
+    assert (accumulation[-1] == accumulation[0]).all()
+    ends = numpy.unique(terminals(receivers))
+    assert accumulation.ravel()[ends].sum() == (heights.shape[0] - 1) ** 2
+
+
+def test_erosion():
+    import numpy
+    from .erosion import erode, hydraulic_erosion, thermal_erosion
+    from .fractal_array import ArraySquareDiamondFractalGenerator
+
+    for wraped in (False, True):
+        heights = ArraySquareDiamondFractalGenerator(
+            6, 1, 7, wraped=wraped
+        ).to_array()
+        # the last row and column of wraped maps repeat the first ones
+        cells = numpy.s_[:-1, :-1] if wraped else numpy.s_[:, :]
+        total = heights[cells].sum()
+        eroded = thermal_erosion(heights, 500, 5, wraped=wraped)
+        assert abs(eroded[cells].sum() - total) < 1e-6 * abs(heights).sum()
+        assert (
+            numpy.abs(numpy.diff(eroded)).max()
+            < numpy.abs(numpy.diff(heights)).max()
+        )
+        # bands of rows give the same result as whole map
+        assert (
+            thermal_erosion(heights, 500, 5, wraped=wraped, chunk_rows=8)
+            == eroded
+        ).all()
+        eroded = hydraulic_erosion(heights, 5, seed=3, rain=20, wraped=wraped)
+        assert abs(eroded[cells].sum() - total) < 1e-6 * abs(heights).sum()
+        assert (
+            hydraulic_erosion(
+                heights, 5, seed=3, rain=20, wraped=wraped, chunk_rows=8
+            )
+            == eroded
+        ).all()
+        assert (
+            hydraulic_erosion(heights, 5, seed=4, rain=20, wraped=wraped)
+            != eroded
+        ).any()
+    generator = ArraySquareDiamondFractalGenerator(6, 1, 7)
+    original = generator.to_array().copy()
+    erode(generator, talus=500, thermal=3, hydraulic=3, rain=20)
+    assert generator.to_array().shape == original.shape
+    assert (generator.to_array() != original).any()
+    # wraped map stays seamless
+    assert (generator.to_array()[0] == generator.to_array()[-1]).all()
+    assert (generator.to_array()[:, 0] == generator.to_array()[:, -1]).all()
+
+
+def test_get_values():
+    import numpy
+    from .fractal import HexFractalGenerator, SquareDiamondFractalGenerator
+    from .fractal_array import (
+        ArrayHexFractalGenerator,
+        ArraySquareDiamondFractalGenerator,
+    )
+
+    reference = SquareDiamondFractalGenerator(4, 0.8, 3)
+    generator = ArraySquareDiamondFractalGenerator(4, 0.8, 3)
+    points = len(reference._data)
+    assert reference.get_value((100, 100)) == 0
+    assert len(reference._data) == points
+    xs, ys = numpy.meshgrid(numpy.arange(17), numpy.arange(17))
+    for method in ('nearest', 'bilinear', 'bicubic'):
+        # grid points keep their values
+        assert (
+            generator.get_values(xs, ys, method) == generator.to_array()[xs, ys]
+        ).all()
+        assert (
+            reference.get_values(xs, ys, method)
+            == generator.get_values(xs, ys, method)
+        ).all()
+        # wraped map repeats with period width - 1
+        assert generator.get_values(-0.5, 3.25, method) == generator.get_values(
+            15.5, 3.25, method
+        )
+    assert (
+        generator.get_values(0.5, 0.5, 'bilinear')
+        == generator.to_array()[:2, :2].mean()
+    )
+    assert generator.get_values(0.4, 0.6).item() == generator.get_value((0, 1))
+    flat = ArraySquareDiamondFractalGenerator(4, 0.8, 3, wraped=False)
+    assert numpy.isnan(
+        flat.get_values([-0.5, 16.5], [1, 1], 'bicubic', fill=numpy.nan)
+    ).all()
+    reference.linear_transform(2, 0)
+    assert reference.get_values(1, 1) == 2 * generator.get_value((1, 1))
+
+    hexagonal = ArrayHexFractalGenerator(3, 0.8, 2)
+    xs, ys = numpy.random.default_rng(0).uniform(-1, 10, (2, 200))
+    for method in ('nearest', 'bilinear', 'bicubic'):
+        expected = HexFractalGenerator(3, 0.8, 2).get_values(xs, ys, method)
+        assert numpy.allclose(hexagonal.get_values(xs, ys, method), expected)
+    assert hexagonal.get_values(8, 0, 'bilinear') == 0
+
+
+def test_region_regeneration():
+    import numpy
+    from .fractal_array import (
+        ArrayHexFractalGenerator,
+        ArraySquareDiamondFractalGenerator,
+    )
+    from .fractal_regions import RegionEditor
+
+    generator = ArraySquareDiamondFractalGenerator(6, 0.8, 1)
+    assert (
+        generator.to_array()
+        == ArraySquareDiamondFractalGenerator(
+            6, 0.8, 1, amplitude=1000
+        ).to_array()
+    ).all()
+    original = generator.to_array().copy()
+    changes = []
+    editor = RegionEditor(
+        generator, [lambda changed, index: changes.append(index)]
+    )
+    region = editor.regenerate(20, 25, 30, 45, seed=5)
+    assert changes == [region]
+    changed = generator.to_array() != original
+    assert changed[region].all() and changed.sum() == changed[region].sum()
+    # roughness stays like of the rest of the map
+    roughness = numpy.abs(
+        numpy.diff(generator.to_array()[region], axis=0)
+    ).mean()
+    assert 0.5 < roughness / numpy.abs(numpy.diff(original, axis=0)).mean() < 2
+    # edges of wraped map are kept equal
+    editor.regenerate(0, 10, 5, 20, seed=3)
+    assert (generator.to_array()[0] == generator.to_array()[-1]).all()
+    assert changes[-1] == (slice(64, 65), slice(10, 20))
+    # regions at the corner take fixed points across the edges and only
+    # copied points are reported
+    original = generator.to_array().copy()
+    del changes[:]
+    editor.regenerate(60, 60, 65, 65, seed=4)
+    data = generator.to_array()
+    assert (data[0] == data[-1]).all() and (data[:, 0] == data[:, -1]).all()
+    reported = numpy.zeros(data.shape, dtype=bool)
+    for index in changes:
+        reported[index] = True
+    assert ((data != original) <= reported).all()
+    assert reported.sum() == 25 + 5 + 5 + 1
+    for region in ((0, 0, 65, 10), (3, 3, 67, 10)):
+        try:
+            editor.regenerate(*region)
+            assert False, "region %s was regenerated" % (region,)
+        except ValueError:
+            pass
+    try:
+        RegionEditor(
+            ArraySquareDiamondFractalGenerator(6, 0.8, 1, level=3)
+        ).regenerate(20, 25, 30, 45)
+        assert False, "partial heightmap was regenerated"
+    except ValueError:
+        pass
+
+    hexagonal = ArrayHexFractalGenerator(5, 0.8, 1)
+    original = hexagonal.to_array().copy()
+    index = RegionEditor(hexagonal).regenerate_hex(8, 8, 3, seed=2)
+    changed = hexagonal.to_array() != original
+    assert changed.sum() == 3 * 4 * 5 + 1 - 24
+    assert changed.sum() == changed[index].sum()
+
+
+def test_noise_volume():
+    import numpy
+    from .grain import CounterGrain
+    from .volume import NoiseVolume
+
+    grain = CounterGrain(5)
+    assert (
+        grain.value(3, 4, stream=7, z=0) == grain.values([3], [4], stream=7)[0]
+    )
+    assert (
+        grain.value(3, 4, z=2)
+        == grain.values([3], [4], zs=[2])[0]
+        != grain.value(3, 4)
+    )
+    volume = NoiseVolume(4, 0.8, 3)
+    xs, ys, zs = numpy.random.default_rng(1).uniform(-300, 300, (3, 50))
+    assert numpy.allclose(
+        volume.values(xs, ys, zs),
+        [volume.get_value(xyz) for xyz in zip(xs, ys, zs)],
+    )
+    assert volume.values(xs[:, None], ys[None, :], 0).shape == (50, 50)
+    assert volume.period == 64 and NoiseVolume(4, 0.8, 3, 32).period == 32
+    whole = volume.chunk((-10, 0, 5), (40, 33, 20))
+    assert numpy.isclose(whole[12, 3, 4], volume.get_value((2, 3, 9)))
+    for origin, values in volume.iter_chunks(
+        (40, 33, 20), (-10, 0, 5), (16, 16, 16), overlap=1
+    ):
+        assert values.shape[0] <= 17
+        x, y, z = origin[0] + 10, origin[1], origin[2] - 5
+        assert numpy.isclose(
+            whole[
+                x : x + values.shape[0],
+                y : y + values.shape[1],
+                z : z + values.shape[2],
+            ],
+            values,
+        ).all()
+    volume.transform(0, 1000)
+    assert abs(volume.statistics()['stdev'] - 1000) < 1e-6
+    out = volume.fill(
+        numpy.zeros((20, 10, 10), dtype=numpy.int16), chunk_shape=(8, 8, 8)
+    )
+    assert (out == numpy.rint(volume.chunk((0, 0, 0), (20, 10, 10)))).all()
@@ -92,8 +92,10 @@ def choose_lowest(elements, altitudes, rand=None):
     >>> random.seed(0)
     >>> choose_lowest(['a','b','c'], {'a':100,'b':-100,'c':-100})
     'c'
+    >>> choose_lowest(['a','b'], {'a':100,'b':50,'c':-100})
+    'b'
     """
     if rand is None:
         rand = random
-    min_alt = min(altitudes.values())
+    min_alt = min(altitudes[element] for element in elements)
     return rand.choice([element for element in elements if altitudes[element] == min_alt])
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+"""Fractal density volumes for voxel worlds.
+
+mallib: common library for mal projects
+@author: Paweł Sobkowiak
+@contact: pawel.sobkowiak@gmail.com
+Copyright © 2011 Paweł Sobkowiak
+
+"""
+
+import itertools
+import math
+
+import numpy
+
+from .fractal_transforms import fit
+from .noise import NOISE_STREAM, NoiseTerrain, _fade
+
+# gradients of Perlin's improved noise - middles of cube edges,
+# four of them twice to have 16 of them
+GRADIENTS = numpy.array(
+    [
+        (1, 1, 0),
+        (-1, 1, 0),
+        (1, -1, 0),
+        (-1, -1, 0),
+        (1, 0, 1),
+        (-1, 0, 1),
+        (1, 0, -1),
+        (-1, 0, -1),
+        (0, 1, 1),
+        (0, -1, 1),
+        (0, 1, -1),
+        (0, -1, -1),
+        (1, 1, 0),
+        (-1, 1, 0),
+        (0, -1, 1),
+        (0, -1, -1),
+    ],
+    dtype=numpy.float64,
+)
+_GRADIENTS = GRADIENTS.tolist()
+CORNERS = tuple(itertools.product((0, 1), repeat=3))
+CHUNK_SHAPE = (32, 32, 32)
+
+
+class NoiseVolume(NoiseTerrain):
+    """Octave gradient noise density of 3D points.
+
+    Like NoiseTerrain (same seeding, statistics on a fixed sample and
+    transforms) with a third coordinate z. Nothing is precomputed, so
+    any part of an unbounded volume can be produced on demand - chunk
+    gives a block of integer points and iter_chunks streams a large box
+    block by block.
+    """
+
+    period = 64
+
+    def _noise(self, xs, ys, zs, octave):
+        """Gradient noise of lattice with unit cells at points xs, ys, zs"""
+        x0, y0, z0 = numpy.floor(xs), numpy.floor(ys), numpy.floor(zs)
+        fx, fy, fz = xs - x0, ys - y0, zs - z0
+        x0, y0, z0 = (
+            x0.astype(numpy.int64),
+            y0.astype(numpy.int64),
+            z0.astype(numpy.int64),
+        )
+        corners = []
+        for dx, dy, dz in CORNERS:
+            index = self._grain.values(
+                x0 + dx,
+                y0 + dy,
+                0,
+                len(GRADIENTS) - 1,
+                NOISE_STREAM + octave,
+                z0 + dz,
+            )
+            gradient = GRADIENTS[index]
+            corners.append(
+                gradient[:, 0] * (fx - dx)
+                + gradient[:, 1] * (fy - dy)
+                + gradient[:, 2] * (fz - dz)
+            )
+        return self._trilinear(corners, _fade(fx), _fade(fy), _fade(fz))
+
+    @staticmethod
+    def _trilinear(corners, u, v, w):
+        """Interpolates values of 8 corners in CORNERS order"""
+        lows = [
+            corners[i] + u * (corners[i + 4] - corners[i]) for i in range(4)
+        ]
+        first = lows[0] + v * (lows[2] - lows[0])
+        second = lows[1] + v * (lows[3] - lows[1])
+        return first + w * (second - first)
+
+    def _raw_value(self, x, y, z):
+        """Density of single point - _raw_values without numpy overhead"""
+        total = 0.0
+        ratio = 2.0 ** (-self.chaos)
+        amplitude = float(self.amplitude)
+        frequency = 1.0 / self.period
+        last = len(GRADIENTS) - 1
+        for octave in range(self.octaves):
+            xs, ys, zs = x * frequency, y * frequency, z * frequency
+            x0, y0, z0 = math.floor(xs), math.floor(ys), math.floor(zs)
+            fx, fy, fz = xs - x0, ys - y0, zs - z0
+            corners = []
+            for dx, dy, dz in CORNERS:
+                stream = NOISE_STREAM + octave
+                gx, gy, gz = _GRADIENTS[
+                    self._grain.value(
+                        x0 + dx, y0 + dy, 0, last, stream, z0 + dz
+                    )
+                ]
+                corners.append(gx * (fx - dx) + gy * (fy - dy) + gz * (fz - dz))
+            total += amplitude * self._trilinear(
+                corners, _fade(fx), _fade(fy), _fade(fz)
+            )
+            amplitude *= ratio
+            frequency *= 2
+        return total
+
+    def _raw_values(self, xs, ys, zs):
+        """Densities of points xs, ys, zs - array of their broadcast shape"""
+        xs, ys, zs = numpy.broadcast_arrays(
+            numpy.asarray(xs, dtype=numpy.float64),
+            numpy.asarray(ys, dtype=numpy.float64),
+            numpy.asarray(zs, dtype=numpy.float64),
+        )
+        shape = xs.shape
+        xs, ys, zs = xs.ravel(), ys.ravel(), zs.ravel()
+        total = numpy.zeros(len(xs), dtype=numpy.float64)
+        ratio = 2.0 ** (-self.chaos)
+        amplitude = float(self.amplitude)
+        frequency = 1.0 / self.period
+        for octave in range(self.octaves):
+            total += amplitude * self._noise(
+                xs * frequency, ys * frequency, zs * frequency, octave
+            )
+            amplitude *= ratio
+            frequency *= 2
+        return total.reshape(shape)
+
+    def values(self, xs, ys, zs):
+        """Densities of points xs, ys, zs (any floats) - numpy.float64 array"""
+        return self._apply(self._raw_values(xs, ys, zs))
+
+    def get_value(self, xyz):
+        value = self._raw_value(float(xyz[0]), float(xyz[1]), float(xyz[2]))
+        if self._functions:
+            value = self._apply(numpy.array([value]))[0].item()
+        return value
+
+    def _sample_values(self):
+        if self._sample is None:
+            self._sample = self._raw_values(*self._sample_points(3))
+        return self._apply(self._sample.copy())
+
+    def chunk(self, origin, shape, dtype=numpy.float64):
+        """Densities of integer points origin + index for indices of shape.
+
+        Integer dtype values are rounded and clipped (see
+        fractal_transforms.fit).
+        """
+        axes = [
+            numpy.arange(start, start + length, dtype=numpy.float64)
+            for start, length in zip(origin, shape)
+        ]
+        xs, ys, zs = numpy.meshgrid(*axes, indexing='ij')
+        values = self.values(xs, ys, zs)
+        return fit(values, dtype).astype(dtype)
+
+    def iter_chunks(
+        self,
+        shape,
+        origin=(0, 0, 0),
+        chunk_shape=CHUNK_SHAPE,
+        overlap=0,
+        dtype=numpy.float64,
+    ):
+        """Yields (origin, array) of chunks covering box of shape at origin.
+
+        Only one chunk is kept in memory at a time. overlap adds points
+        of neighbouring chunks on the high sides (1 for meshers looking
+        at the next voxel); chunks still start every chunk_shape points.
+        """
+        starts = [
+            range(start, start + length, step)
+            for start, length, step in zip(origin, shape, chunk_shape)
+        ]
+        for corner in itertools.product(*starts):
+            size = [
+                min(step + overlap, start + length - first)
+                for first, start, length, step in zip(
+                    corner, origin, shape, chunk_shape
+                )
+            ]
+            yield corner, self.chunk(corner, size, dtype)
+
+    def fill(self, out, origin=(0, 0, 0), chunk_shape=CHUNK_SHAPE):
+        """Writes densities of box at origin into 3D array out chunk by chunk.
+
+        out may be memory mapped - only one chunk is kept in memory.
+        """
+        for corner, values in self.iter_chunks(
+            out.shape, origin, chunk_shape, dtype=out.dtype
+        ):
+            offsets = [first - start for first, start in zip(corner, origin)]
+            out[
+                tuple(
+                    slice(offset, offset + length)
+                    for offset, length in zip(offsets, values.shape)
+                )
+            ] = values
+        return out